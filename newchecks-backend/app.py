@@ -1,8 +1,7 @@
 import os
 from flask import Flask
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, firestore
+from startup import FAST_START, LazyFirestoreClient, create_firestore_client
 
 # --- Flask app setup
 app = Flask(__name__)
@@ -10,15 +9,87 @@ app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 CORS(app)  # allow React frontend
 
 # --- Firebase Admin setup
-cred = credentials.Certificate(
-    os.path.join(os.path.dirname(__file__), "checks-6fc3e-firebase-adminsdk-fbsvc-fd8e9f9a34.json")
-)
-firebase_admin.initialize_app(cred)
-firestore_db = firestore.client()
+# Every Firestore call made by the routes goes through the accounting wrapper.
+# With FAST_START=1 firebase_admin, the client and ReportLab load on first use
+# or in the warmup thread instead of here.
+from firestore_accounting import AccountingClient, configure_firestore_accounting
+if FAST_START:
+    firestore_db = AccountingClient(LazyFirestoreClient())
+else:
+    firestore_db = AccountingClient(create_firestore_client())
+    from pdf_generator import load_resources
+    load_resources()
+
+# --- Structured logging (request IDs, LOG_LEVEL)
+from log import configure_logging
+configure_logging(app)
+
+# --- Metrics (/metrics + per-request timing hooks)
+from metrics import configure_metrics
+configure_metrics(app)
+configure_firestore_accounting(app)
 
 # --- Import routes
 from routes import configure_routes
 configure_routes(app, firestore_db)
 
+from reports import configure_report_routes
+configure_report_routes(app, firestore_db)
+
+from dashboard import configure_dashboard_routes
+configure_dashboard_routes(app, firestore_db)
+
+from rollups import configure_rollup_routes
+configure_rollup_routes(app, firestore_db)
+
+from bulk_query import configure_bulk_query_routes
+configure_bulk_query_routes(app, firestore_db)
+
+from ledgers import configure_ledger_routes
+configure_ledger_routes(app, firestore_db)
+
+from checks import configure_check_routes
+configure_check_routes(app, firestore_db)
+
+from reviews import configure_review_routes
+configure_review_routes(app, firestore_db)
+
+from company_jobs import configure_company_job_routes
+configure_company_job_routes(app, firestore_db)
+
+from companies import configure_company_routes
+configure_company_routes(app, firestore_db)
+
+from banks import configure_bank_routes
+configure_bank_routes(app, firestore_db)
+
+from employees import configure_employee_routes
+configure_employee_routes(app, firestore_db)
+
+from check_numbers import configure_check_number_routes
+configure_check_number_routes(app, firestore_db)
+
+from duplicates import configure_duplicate_routes
+configure_duplicate_routes(app, firestore_db)
+
+from profiling import configure_profiling_routes
+configure_profiling_routes(app, firestore_db)
+
+# --- Local SQLite mirror (mirror-sync command, optional listeners)
+from mirror import configure_mirror
+configure_mirror(app, firestore_db)
+
+from search import configure_search_routes
+configure_search_routes(app, firestore_db)
+
+# --- /healthz, /readyz and the warmup thread
+from startup import configure_health_routes
+configure_health_routes(app, firestore_db)
+
+# --- Derived data (rebuild-projection command, optional checks listener)
+# Goes last so every projection registered by the modules above is active.
+from check_projections import configure_check_projections
+configure_check_projections(app, firestore_db)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5004, debug=True)
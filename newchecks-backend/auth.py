@@ -0,0 +1,43 @@
+from flask import g, request
+
+from log import get_logger
+
+log = get_logger("auth")
+
+# --- Request authentication
+# The frontend signs in with Firebase Auth; API calls that need to know who
+# is asking send the user's ID token as "Authorization: Bearer <token>".
+# The profile lives in users/{uid} (role, companyIds, ...).
+
+
+def current_user(firestore_db):
+    if "current_user" in g:
+        return g.current_user
+    g.current_user = None
+
+    header = request.headers.get("Authorization", "")
+    if not header.startswith("Bearer "):
+        return None
+    from firebase_admin import auth as firebase_auth
+    try:
+        decoded = firebase_auth.verify_id_token(header[len("Bearer "):])
+    except Exception as e:
+        log.info("Rejected ID token: %s", e)
+        return None
+
+    uid = decoded["uid"]
+    user_doc = firestore_db.collection("users").document(uid).get()
+    user = user_doc.to_dict() if user_doc.exists else {}
+    user["uid"] = uid
+    g.current_user = user
+    return user
+
+
+def is_admin(user):
+    return bool(user) and user.get("role") == "admin"
+
+
+def can_access_company(user, company_id):
+    if is_admin(user):
+        return True
+    return bool(user) and company_id in (user.get("companyIds") or [])
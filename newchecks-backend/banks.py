@@ -0,0 +1,196 @@
+import click
+from flask import jsonify, request
+
+from auth import can_access_company, current_user
+from bulk_query import json_value
+from check_fields import check_number_value, to_number
+from checks import BULK_WRITE_ATTEMPTS
+from firestore_accounting import stream_concurrently
+from log import get_logger
+from metrics import stage
+
+log = get_logger("banks")
+
+# --- Bank details
+# GET /api/banks/<bankId>/details?limit=20
+#
+# Served from the checks indexes on bankId (firestore.indexes.json):
+#   count / amount     the bank's checks streamed with an amount/paid
+#                      projection and reduced with to_number (the React app
+#                      writes amount as a string, which sum("amount") skips)
+#   number range       lowest and highest numeric checkNumber (one doc each)
+#   missing            numbers in that range without a check, i.e.
+#                      (highest - lowest + 1) - numbered checks; duplicates
+#                      hide gaps, so this is a lower bound
+#   latest             the newest checks, projected to the list columns
+# Besides the amounts, a few documents are read however many checks the
+# bank has.
+#
+# Checks written before bankId existed are assigned by
+# `flask --app app backfill-bank-ids`: a check naming a bank (bankName or
+# routingNumber) of its company gets that bank, otherwise the company's
+# first bank, the one the print routes use. The same pass turns string check
+# numbers into integers so they sort with the rest. It only writes checks
+# that change, so it is safe to rerun (cron it while the React app still
+# creates checks without bankId).
+DEFAULT_LATEST = 20
+MAX_LATEST = 200
+LATEST_FIELDS = ["checkNumber", "employeeName", "amount", "date", "companyId", "reviewed", "paid", "memo"]
+
+
+def count_checks(query):
+    for result in query.count(alias="count").get():
+        for item in result:
+            return int(item.value or 0)
+    return 0
+
+
+def sum_amounts(snaps):
+    # ({count, amount} of all checks, {count, amount} of the paid ones)
+    totals = {"count": 0, "amount": 0.0}
+    paid = {"count": 0, "amount": 0.0}
+    for snap in snaps:
+        data = snap.to_dict() or {}
+        amount = to_number(data.get("amount"))
+        totals["count"] += 1
+        totals["amount"] += amount
+        if data.get("paid") is True:
+            paid["count"] += 1
+            paid["amount"] += amount
+    for row in (totals, paid):
+        row["amount"] = round(row["amount"], 2)
+    return totals, paid
+
+
+def bank_details(firestore_db, bank_id, bank, latest):
+    checks = firestore_db.collection("checks").where("bankId", "==", bank_id)
+    # Range filters only match numbers, so legacy string numbers don't sort first
+    numbered = checks.where("checkNumber", ">=", 0)
+    queries = [
+        numbered.order_by("checkNumber").select(["checkNumber"]).limit(1),
+        numbered.order_by("checkNumber", direction="DESCENDING").select(["checkNumber"]).limit(1),
+        checks.order_by("date", direction="DESCENDING").select(LATEST_FIELDS).limit(latest),
+        checks.select(["amount", "paid"]),
+    ]
+    with stage("firestore_query"):
+        lowest, highest, newest, amounts = stream_concurrently(queries, len(queries))
+        numbered_count = count_checks(numbered) if lowest else 0
+    totals, paid = sum_amounts(amounts)
+
+    low = to_number(lowest[0].get("checkNumber")) if lowest else None
+    high = to_number(highest[0].get("checkNumber")) if highest else None
+    number_range = None
+    if low is not None and high is not None:
+        span = int(high) - int(low) + 1
+        number_range = {
+            "lowest": int(low),
+            "highest": int(high),
+            "numbered": numbered_count,
+            "missing": max(span - numbered_count, 0),
+        }
+    return {
+        "bank": {
+            "id": bank_id,
+            "bankName": bank.get("bankName", ""),
+            "routingNumber": bank.get("routingNumber", ""),
+            "accountNumber": bank.get("accountNumber", ""),
+            "companyId": bank.get("companyId"),
+            "startingCheckNumber": bank.get("startingCheckNumber"),
+            "nextCheckNumber": bank.get("nextCheckNumber"),
+        },
+        "totals": totals,
+        "paid": paid,
+        "unpaid": {
+            "count": totals["count"] - paid["count"],
+            "amount": round(totals["amount"] - paid["amount"], 2),
+        },
+        "checkNumbers": number_range,
+        "latest": [dict(json_value(snap.to_dict() or {}), id=snap.id) for snap in newest],
+    }
+
+
+def pick_bank(check, company_banks):
+    # company_banks: [(bank_id, bank)] of the check's company, in id order
+    if not company_banks:
+        return None
+    for bank_id, bank in company_banks:
+        if check.get("bankName") and check.get("bankName") == bank.get("bankName"):
+            return bank_id
+        if check.get("routingNumber") and check.get("routingNumber") == bank.get("routingNumber"):
+            return bank_id
+    return company_banks[0][0]
+
+
+def backfill_bank_ids(firestore_db, dry_run=False):
+    # Returns (checks scanned, checks updated, checks left without a bank)
+    banks_by_company = {}
+    for snap in firestore_db.collection("banks").order_by("__name__").stream():
+        bank = snap.to_dict() or {}
+        banks_by_company.setdefault(bank.get("companyId"), []).append((snap.id, bank))
+
+    failed = []
+
+    def on_write_error(error, _writer):
+        if error.attempts < BULK_WRITE_ATTEMPTS:
+            return True
+        failed.append(error.operation.reference.id)
+        return False
+
+    writer = None if dry_run else firestore_db.bulk_writer()
+    if writer is not None:
+        writer.on_write_error(on_write_error)
+    fields = ["bankId", "bankName", "routingNumber", "companyId", "checkNumber"]
+    scanned = updated = orphaned = 0
+    for snap in firestore_db.collection("checks").select(fields).stream():
+        scanned += 1
+        check = snap.to_dict() or {}
+        changes = {}
+        if not check.get("bankId"):
+            bank_id = pick_bank(check, banks_by_company.get(check.get("companyId")))
+            if bank_id is None:
+                orphaned += 1
+            else:
+                changes["bankId"] = bank_id
+        number = check_number_value(check.get("checkNumber"))
+        if number is not None and number != check.get("checkNumber"):
+            changes["checkNumber"] = number
+        if changes:
+            updated += 1
+            if writer is not None:
+                writer.update(firestore_db.collection("checks").document(snap.id), changes)
+    if writer is not None:
+        writer.close()
+    if failed:
+        log.error("Bank backfill: %d check updates failed", len(failed), extra={"fields": {"failed": failed[:100]}})
+    return scanned, updated - len(failed), orphaned
+
+
+def configure_bank_routes(app, firestore_db):
+
+    @app.cli.command("backfill-bank-ids")
+    @click.option("--dry-run", is_flag=True, help="Count the checks that would change without writing.")
+    def backfill_bank_ids_command(dry_run):
+        """Set bankId (and integer checkNumber) on checks that lack them."""
+        scanned, updated, orphaned = backfill_bank_ids(firestore_db, dry_run=dry_run)
+        verb = "would update" if dry_run else "updated"
+        click.echo(f"Scanned {scanned} checks, {verb} {updated}, {orphaned} have no bank for their company")
+
+    @app.route("/api/banks/<bank_id>/details", methods=["GET"])
+    def get_bank_details(bank_id):
+        try:
+            try:
+                latest = min(max(int(request.args.get("limit", DEFAULT_LATEST)), 1), MAX_LATEST)
+            except ValueError:
+                return jsonify({"error": "limit must be a number"}), 400
+            with stage("reference_lookup"):
+                snap = firestore_db.collection("banks").document(bank_id).get()
+            if not snap.exists:
+                return jsonify({"error": "Bank not found"}), 404
+            bank = snap.to_dict() or {}
+            if not can_access_company(current_user(firestore_db), bank.get("companyId")):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            return jsonify(bank_details(firestore_db, bank_id, bank, latest))
+
+        except Exception as e:
+            log.exception("Bank details failed")
+            return jsonify({"error": str(e)}), 500
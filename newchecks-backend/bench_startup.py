@@ -0,0 +1,61 @@
+"""Startup-time benchmark for the backend.
+
+Starts a fresh interpreter per run, imports app.py (which builds the Flask
+app and registers every route), then waits for the warmup thread to make
+/readyz pass. Reported per mode (FAST_START=0 vs 1):
+
+  import  - time until `import app` returns, i.e. until the server could listen
+  ready   - time until warmup has opened Firestore and rendered a dummy check
+
+Usage: python bench_startup.py [runs]
+Needs the service-account JSON and network access to Firestore.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+import startup
+startup.READY.wait(timeout=120)
+ready = time.perf_counter() - started
+print(json.dumps({"import": imported, "ready": ready if startup.READY.is_set() else None}))
+"""
+
+
+def run_once(fast_start):
+    env = dict(os.environ, FAST_START="1" if fast_start else "0", LOG_LEVEL="WARNING")
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return "n/a"
+    return f"median {statistics.median(samples):.3f}s  min {min(samples):.3f}s  max {max(samples):.3f}s"
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for fast_start in (False, True):
+        results = [run_once(fast_start) for _ in range(runs)]
+        print(f"FAST_START={int(fast_start)} ({runs} runs)")
+        print(f"  import: {summarize([r['import'] for r in results])}")
+        print(f"  ready:  {summarize([r['ready'] for r in results])}")
+
+
+if __name__ == "__main__":
+    main()
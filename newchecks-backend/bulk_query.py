@@ -0,0 +1,192 @@
+import heapq
+import json
+import os
+from datetime import datetime
+
+from flask import Response, jsonify, request, stream_with_context
+
+from auth import current_user, is_admin
+from firestore_accounting import stream_concurrently, unwrap
+from log import get_logger
+from metrics import stage
+
+log = get_logger("bulk_query")
+
+# --- `in` queries of any length
+# POST /api/query
+#   {"collection": "checks", "field": "companyId", "values": [...],
+#    "where": [["reviewed", "==", true]], "orderBy": "date", "direction": "desc",
+#    "fields": ["amount", "date"], "limit": 500}
+#
+# Firestore caps `in` at 30 values, so the list is split into chunks of
+# IN_CHUNK_SIZE and the chunk queries run concurrently (at most
+# IN_QUERY_PARALLELISM at a time). Each chunk is ordered by orderBy and then
+# document id, so the sorted chunks are merged with a heap, duplicates
+# dropped by id, and the documents streamed back as NDJSON, one per line.
+# Use field "__name__" to match document ids.
+#
+# "where" takes the Python client's operators (WHERE_OPERATORS); the JS SDK
+# spelling "array-contains" is accepted too. "in", "not-in" and
+# "array_contains_any" are excluded: each chunk is already an `in` query,
+# and Firestore caps a query's disjunctions at 30, which a second one would
+# exceed.
+#
+# Admins may query every QUERYABLE_COLLECTIONS entry. Everyone else may only
+# query the collections in COMPANY_SCOPED, by their company field, with
+# values from their own companyIds.
+IN_CHUNK_SIZE = 30
+IN_QUERY_PARALLELISM = int(os.environ.get("IN_QUERY_PARALLELISM", "8"))
+MAX_VALUES = 2000
+
+QUERYABLE_COLLECTIONS = ("checks", "employees", "clients", "banks", "companies", "users")
+COMPANY_SCOPED = {"checks": "companyId", "employees": "companyId", "banks": "companyId", "companies": "__name__"}
+WHERE_OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "array_contains")
+JS_OPERATORS = {"array-contains": "array_contains"}
+
+
+def chunked(values, size):
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_value(v) for v in value]
+    if hasattr(value, "path"):
+        return value.path
+    if hasattr(value, "latitude"):
+        return {"latitude": value.latitude, "longitude": value.longitude}
+    if isinstance(value, bytes):
+        return None
+    return value
+
+
+def _allowed(user, collection, field, values):
+    if is_admin(user):
+        return True
+    if not user:
+        return False
+    company_ids = set(user.get("companyIds") or [])
+    return COMPANY_SCOPED.get(collection) == field and set(values) <= company_ids
+
+
+def sort_value(value):
+    # Firestore's order across types (null, bool, number, timestamp, string,
+    # bytes, anything else), so a field holding mixed types merges in the
+    # order the chunks were sorted in instead of raising TypeError
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (3, value.timestamp())
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    return (6, str(value))
+
+
+def field_value(data, path):
+    # data's value at a dotted field path, None when missing
+    for part in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def merge_sorted(chunks, order_by, descending):
+    # Chunks are each sorted by (order value, id); dedupe by id while merging
+    def key(snap):
+        if not order_by:
+            return (sort_value(snap.id), snap.id)
+        return (sort_value(field_value(snap.to_dict() or {}, order_by)), snap.id)
+
+    seen = set()
+    for snap in heapq.merge(*chunks, key=key, reverse=descending):
+        if snap.id in seen:
+            continue
+        seen.add(snap.id)
+        yield snap
+
+
+def configure_bulk_query_routes(app, firestore_db):
+
+    @app.route("/api/query", methods=["POST"])
+    def bulk_query():
+        try:
+            body = request.get_json() or {}
+            collection = body.get("collection")
+            field = body.get("field")
+            values = list(dict.fromkeys(body.get("values") or []))
+            if collection not in QUERYABLE_COLLECTIONS:
+                return jsonify({"error": f"collection must be one of {', '.join(QUERYABLE_COLLECTIONS)}"}), 400
+            if not field or not values:
+                return jsonify({"error": "field and values are required"}), 400
+            if len(values) > MAX_VALUES:
+                return jsonify({"error": f"At most {MAX_VALUES} values"}), 400
+            if not _allowed(current_user(firestore_db), collection, field, values):
+                return jsonify({"error": "Not allowed for these values"}), 403
+
+            order_by = body.get("orderBy")
+            descending = (body.get("direction") or "asc").lower() == "desc"
+            direction = "DESCENDING" if descending else "ASCENDING"
+            fields = body.get("fields") or []
+            limit = body.get("limit")
+
+            base = firestore_db.collection(collection)
+            for clause in body.get("where") or []:
+                if not isinstance(clause, list) or len(clause) != 3:
+                    return jsonify({"error": f"Unsupported where clause: {clause!r}"}), 400
+                field_path, op, value = clause
+                op = JS_OPERATORS.get(op, op)
+                if op not in WHERE_OPERATORS:
+                    return jsonify({"error": f"Unsupported where clause: {clause!r}"}), 400
+                base = base.where(field_path, op, value)
+            if order_by:
+                base = base.order_by(order_by, direction=direction)
+            base = base.order_by("__name__", direction=direction)
+            if fields:
+                base = base.select(sorted(set(fields) | ({order_by} if order_by else set())))
+            if limit:
+                # Each chunk needs at most `limit` rows for the merged top `limit`
+                base = base.limit(int(limit))
+
+            chunks = chunked(values, IN_CHUNK_SIZE)
+            if field == "__name__":
+                coll = firestore_db.collection(collection)
+                queries = [base.where("__name__", "in", [unwrap(coll.document(v)) for v in chunk]) for chunk in chunks]
+            else:
+                queries = [base.where(field, "in", chunk) for chunk in chunks]
+
+            # All chunks are read before the response starts so the
+            # X-Firestore-* usage headers cover them
+            with stage("firestore_query"):
+                results = stream_concurrently(queries, IN_QUERY_PARALLELISM)
+            merged = list(merge_sorted(results, order_by, descending))
+            if limit:
+                merged = merged[:int(limit)]
+
+            def generate():
+                for snap in merged:
+                    data = snap.to_dict() or {}
+                    if fields:
+                        data = {k: data.get(k) for k in fields}
+                    data["id"] = snap.id
+                    yield json.dumps(json_value(data)) + "\n"
+
+            response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+            response.headers["X-Result-Count"] = str(len(merged))
+            response.headers["X-Query-Chunks"] = str(len(chunks))
+            response.headers["Access-Control-Expose-Headers"] = "X-Result-Count, X-Query-Chunks"
+            return response
+
+        except Exception as e:
+            log.exception("Bulk query failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,248 @@
+from datetime import datetime, timezone
+
+# --- Field helpers shared by everything that reads raw check documents
+# Check documents are written by the React app and carry loosely typed values
+# (numbers as strings, dates as Timestamps or ISO strings). These helpers give
+# the same answers the frontend does.
+
+
+def to_number(value):
+    # Same leniency as parseFloat(x?.toString() || '0') in the frontend
+    if value is None or value == "":
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def amount_cents(value):
+    return int(round(to_number(value) * 100))
+
+
+def as_datetime(raw):
+    # Firestore Timestamps arrive as (tz-aware) datetimes; older checks may hold ISO strings
+    if raw is None:
+        return None
+    if hasattr(raw, "to_datetime"):
+        return raw.to_datetime()
+    if isinstance(raw, datetime):
+        return raw
+    if isinstance(raw, str):
+        try:
+            return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return None
+
+
+def as_utc(dt):
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def check_number_value(value):
+    # Integer form of a check number, or None when it isn't one. Strings
+    # follow the same rule as numbers: "105266" and "105266.0" are 105266.
+    if isinstance(value, bool) or value in (None, ""):
+        return None
+    if isinstance(value, int):
+        return value
+    if not isinstance(value, float):
+        text = str(value).strip()
+        if text.isdigit():
+            return int(text)
+        try:
+            value = float(text)
+        except ValueError:
+            return None
+    return int(value) if value.is_integer() else None
+
+
+def check_status(check):
+    if check.get("paid"):
+        return "paid"
+    if check.get("reviewed"):
+        return "reviewed"
+    return "pending"
+
+
+# --- Pay components, as the check stub (pdf_generator) itemizes them
+# OT is paid at 1.5x and holiday at 2x the base rate. Checks with
+# relationshipDetails carry per-relationship values, read by
+# relationship_pay below; older checks only have the check-level fields and
+# their clientId.
+PAY_KINDS = ("hourly", "overtime", "holiday", "perdiem")
+PERDIEM_DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def perdiem_total(check, prefix=""):
+    if check.get(f"{prefix}perdiemBreakdown"):
+        return sum(to_number(check.get(f"{prefix}perdiem{day}")) for day in PERDIEM_DAYS)
+    return to_number(check.get(f"{prefix}perdiemAmount"))
+
+
+# --- Relationship pay, in either shape
+# Normalized:  relationshipPay.<relId> = {hours, otHours, holidayHours,
+#              perdiemAmount, perdiemBreakdown, perdiem: {Monday: ..., ...}}
+# Legacy:      "<relId>_hours", "<relId>_otHours", "<relId>_holidayHours",
+#              "<relId>_perdiemAmount", "<relId>_perdiemBreakdown",
+#              "<relId>_perdiem<Day>" at the top level, and hourly hours
+#              possibly only in relationshipHours.<relId>
+# The React app still reads and writes the legacy keys, so when a
+# relationship has any legacy key those win; relationshipPay is used for
+# relationships that have none (checks created by the backend or migrated
+# with --drop-legacy). Either way it is a fixed number of lookups per
+# relationship. Missing values are None so callers can apply their own
+# fallbacks.
+RELATIONSHIP_PAY_FIELDS = ("hours", "otHours", "holidayHours", "perdiemAmount")
+
+
+def _pay_entry(values, breakdown, days):
+    entry = {field: None if values[field] in (None, "") else to_number(values[field])
+             for field in RELATIONSHIP_PAY_FIELDS}
+    entry["perdiemBreakdown"] = None if breakdown is None else bool(breakdown)
+    entry["perdiem"] = {day: None if days.get(day) in (None, "") else to_number(days.get(day))
+                        for day in PERDIEM_DAYS}
+    return entry
+
+
+def _legacy_pay(check, rel_id):
+    prefix = f"{rel_id}_"
+    values = {field: check.get(prefix + field) for field in RELATIONSHIP_PAY_FIELDS}
+    breakdown = check.get(prefix + "perdiemBreakdown")
+    days = {day: check.get(f"{prefix}perdiem{day}") for day in PERDIEM_DAYS}
+    if breakdown is None and all(v is None for v in values.values()) and all(v is None for v in days.values()):
+        return None
+    return _pay_entry(values, breakdown, days)
+
+
+def relationship_pay(check):
+    # {relId: entry} for every relationship in relationshipDetails
+    stored = check.get("relationshipPay") or {}
+    relationship_hours = check.get("relationshipHours") or {}
+    pay = {}
+    for rel in check.get("relationshipDetails") or []:
+        rel_id = rel.get("id")
+        entry = _legacy_pay(check, rel_id)
+        if entry is None:
+            saved = stored.get(str(rel_id)) or {}
+            entry = _pay_entry(
+                {field: saved.get(field) for field in RELATIONSHIP_PAY_FIELDS},
+                saved.get("perdiemBreakdown"),
+                saved.get("perdiem") or {},
+            )
+        if entry["hours"] is None and relationship_hours.get(rel_id) not in (None, ""):
+            entry["hours"] = to_number(relationship_hours[rel_id])
+        pay[rel_id] = entry
+    return pay
+
+
+def stored_relationship_pay(check):
+    # The relationshipPay map to write for a check: present values only
+    stored = {}
+    for rel_id, entry in relationship_pay(check).items():
+        if rel_id is None:
+            continue
+        compact = {k: v for k, v in entry.items() if k != "perdiem" and v is not None}
+        days = {day: v for day, v in entry["perdiem"].items() if v is not None}
+        if days:
+            compact["perdiem"] = days
+        stored[str(rel_id)] = compact
+    return stored
+
+
+def legacy_relationship_keys(check):
+    # The "<relId>_<field>" keys present on the check
+    keys = []
+    for rel in check.get("relationshipDetails") or []:
+        prefix = f"{rel.get('id')}_"
+        for field in RELATIONSHIP_PAY_FIELDS + ("perdiemBreakdown",) + tuple(f"perdiem{day}" for day in PERDIEM_DAYS):
+            if prefix + field in check:
+                keys.append(prefix + field)
+    return keys
+
+
+def relationship_perdiem_total(entry):
+    if entry["perdiemBreakdown"]:
+        return sum(v or 0.0 for v in entry["perdiem"].values())
+    return entry["perdiemAmount"] or 0.0
+
+
+def _has_own_pay(rel, entry):
+    # Whether a relationship carries any pay values of its own
+    if rel.get("payRate") not in (None, "") or entry["perdiemBreakdown"] is not None:
+        return True
+    return any(entry[field] is not None for field in RELATIONSHIP_PAY_FIELDS) or \
+        any(v is not None for v in entry["perdiem"].values())
+
+
+def _check_line(check, client_id):
+    return (
+        client_id,
+        to_number(check.get("hours")),
+        to_number(check.get("otHours")),
+        to_number(check.get("holidayHours")),
+        to_number(check.get("payRate")),
+        perdiem_total(check),
+    )
+
+
+def _client_lines(check):
+    # (clientId, hours, otHours, holidayHours, payRate, perdiem) per pay line
+    relationships = check.get("relationshipDetails") or []
+    if not relationships:
+        yield _check_line(check, check.get("clientId") or "unassigned")
+        return
+
+    # Single-client checks from the React app carry one relationship
+    # ({id: 'default', clientId, clientName, payType}) with the hours, rate
+    # and per diem only at the top level of the check; those read the
+    # check-level fields, as the stub does.
+    pay = relationship_pay(check)
+    single = len(relationships) == 1
+    for rel in relationships:
+        entry = pay[rel.get("id")]
+        client_id = rel.get("clientId") or "unassigned"
+        rate = rel.get("payRate")
+        if single or rel.get("id") == "default":
+            if not _has_own_pay(rel, entry):
+                yield _check_line(check, rel.get("clientId") or check.get("clientId") or "unassigned")
+                continue
+            if rate in (None, ""):
+                rate = check.get("payRate")
+        if rel.get("payType") == "perdiem":
+            yield client_id, 0.0, 0.0, 0.0, 0.0, relationship_perdiem_total(entry)
+            continue
+        yield (
+            client_id,
+            entry["hours"] or 0.0,
+            entry["otHours"] or 0.0,
+            entry["holidayHours"] or 0.0,
+            to_number(rate),
+            0.0,
+        )
+
+
+def pay_cents_by_client(check):
+    # {clientId: {kind: cents}} for every client the check pays for
+    by_client = {}
+    for client_id, hours, ot_hours, holiday_hours, rate, perdiem in _client_lines(check):
+        totals = by_client.setdefault(client_id, dict.fromkeys(PAY_KINDS, 0))
+        totals["hourly"] += amount_cents(hours * rate)
+        totals["overtime"] += amount_cents(ot_hours * rate * 1.5)
+        totals["holiday"] += amount_cents(holiday_hours * rate * 2)
+        totals["perdiem"] += amount_cents(perdiem)
+    return by_client
+
+
+def hours_by_client(check):
+    # {clientId: {"hours", "overtimeHours", "holidayHours"}}
+    by_client = {}
+    for client_id, hours, ot_hours, holiday_hours, _rate, _perdiem in _client_lines(check):
+        totals = by_client.setdefault(client_id, {"hours": 0.0, "overtimeHours": 0.0, "holidayHours": 0.0})
+        totals["hours"] += hours
+        totals["overtimeHours"] += ot_hours
+        totals["holidayHours"] += holiday_hours
+    return by_client
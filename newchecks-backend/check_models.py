@@ -0,0 +1,103 @@
+from check_fields import as_datetime, check_number_value, relationship_pay, to_number
+
+# --- Print models
+# What pdf_generator.generate_clean_check draws from. The print routes build
+# one Company and Bank per job and one Check (with its Employee) per check
+# document through check_from_firestore, which does every type coercion once:
+# numbers are floats, the date a datetime, the per diem flag a bool, so the
+# renderer never parses strings. The classes use __slots__; a job of a few
+# thousand checks allocates no per-instance dicts. A check without an
+# integer checkNumber raises InvalidCheck rather than printing under a
+# made-up number.
+OVERTIME_MULTIPLIER = 1.5
+HOLIDAY_MULTIPLIER = 2
+
+
+class InvalidCheck(ValueError):
+    pass
+
+
+class Company:
+    __slots__ = ("name", "address", "logo")
+
+    def __init__(self, name="", address="", logo=""):
+        self.name = name
+        self.address = address
+        self.logo = logo
+
+    @classmethod
+    def from_firestore(cls, data):
+        data = data or {}
+        return cls(data.get("name", ""), data.get("address", ""), data.get("logoBase64", ""))
+
+
+class Bank:
+    __slots__ = ("name", "routing_number", "account_number")
+
+    def __init__(self, name="", routing_number="", account_number=""):
+        self.name = name
+        self.routing_number = routing_number
+        self.account_number = account_number
+
+    @classmethod
+    def from_firestore(cls, data):
+        data = data or {}
+        return cls(data.get("bankName", ""), data.get("routingNumber", ""), data.get("accountNumber", ""))
+
+
+class Employee:
+    __slots__ = ("name",)
+
+    def __init__(self, name=""):
+        self.name = name
+
+
+class Check:
+    __slots__ = (
+        "company", "bank", "employee", "check_number", "amount", "date", "memo", "work_week",
+        "hours_worked", "pay_rate", "overtime_hours", "overtime_rate", "holiday_hours", "holiday_rate",
+        "perdiem_amount", "perdiem_breakdown",
+        "perdiem_monday", "perdiem_tuesday", "perdiem_wednesday", "perdiem_thursday",
+        "perdiem_friday", "perdiem_saturday", "perdiem_sunday",
+        "client", "relationshipDetails", "relationshipHours", "relationship_pay", "created_by", "ytd",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+
+def check_from_firestore(d, company, bank, employee_name, created_by, default_date=None):
+    check_number = check_number_value(d.get("checkNumber"))
+    if check_number is None:
+        raise InvalidCheck(f"checkNumber {d.get('checkNumber')!r} is not a whole number")
+    pay_rate = to_number(d.get("payRate"))
+    return Check(
+        company=company,
+        bank=bank,
+        employee=Employee(employee_name),
+        check_number=check_number,
+        amount=to_number(d.get("amount")),
+        date=as_datetime(d.get("date")) or default_date,
+        memo=d.get("memo", ""),
+        work_week=d.get("workWeek", ""),
+        hours_worked=to_number(d.get("hours")),
+        pay_rate=pay_rate,
+        overtime_hours=to_number(d.get("otHours")),
+        overtime_rate=pay_rate * OVERTIME_MULTIPLIER,
+        holiday_hours=to_number(d.get("holidayHours")),
+        holiday_rate=pay_rate * HOLIDAY_MULTIPLIER,
+        perdiem_amount=to_number(d.get("perdiemAmount")),
+        perdiem_breakdown=bool(d.get("perdiemBreakdown")),
+        perdiem_monday=to_number(d.get("perdiemMonday")),
+        perdiem_tuesday=to_number(d.get("perdiemTuesday")),
+        perdiem_wednesday=to_number(d.get("perdiemWednesday")),
+        perdiem_thursday=to_number(d.get("perdiemThursday")),
+        perdiem_friday=to_number(d.get("perdiemFriday")),
+        perdiem_saturday=to_number(d.get("perdiemSaturday")),
+        perdiem_sunday=to_number(d.get("perdiemSunday")),
+        relationshipDetails=d.get("relationshipDetails") or [],
+        relationshipHours=d.get("relationshipHours") or {},
+        relationship_pay=relationship_pay(d),
+        created_by=created_by,
+    )
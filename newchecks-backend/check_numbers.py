@@ -0,0 +1,214 @@
+import time
+from datetime import date
+
+from flask import jsonify, request
+
+from auth import can_access_company, current_user
+from bulk_query import IN_CHUNK_SIZE, IN_QUERY_PARALLELISM, chunked
+from check_fields import as_datetime, as_utc, check_number_value, to_number
+from check_projections import delete_collection, register
+from firestore_accounting import stream_concurrently
+from log import get_logger
+from metrics import stage
+
+log = get_logger("check_numbers")
+
+# --- Check-number index per bank
+# Maintained by the "checkNumbers" check projection. The numbers of a bank
+# are cut into segments of SEGMENT_SIZE; each segment is one document,
+# checkNumberIndex/{bankId}_{segment:06d}:
+#   bankId, segment
+#   n.<offset>   how many checks carry number segment * SEGMENT_SIZE + offset
+#   s.<offset>   sum of those checks' dates, as day ordinals
+# Both are plain increments, so writes stay atomic with the check and a
+# batch of sequential numbers touches one document. For a number used once
+# s is its check's day, which is what the out-of-order test needs.
+#
+# GET /api/banks/<bankId>/check-numbers?from=&to=
+# reads only the segments covering the range (the whole bank by default)
+# and reports, in number order:
+#   gaps         [first, last] runs of numbers with no check
+#   duplicates   numbers used by more than one check, with the check ids
+#   outOfOrder   numbers dated before a lower number of the same bank
+# Checks without bankId or a numeric checkNumber aren't indexed; run
+# `flask --app app backfill-bank-ids` then `rebuild-projection checkNumbers`.
+INDEX_COLLECTION = "checkNumberIndex"
+SEGMENT_SIZE = 4096
+MAX_SEGMENTS = 500
+MAX_REPORTED = 1000
+MAX_DUPLICATE_LOOKUPS = 300
+
+
+def segment_id(bank_id, segment):
+    return f"{bank_id}_{segment:06d}"
+
+
+def check_number_contribution(check):
+    bank_id = check.get("bankId")
+    number = check_number_value(check.get("checkNumber"))
+    if not bank_id or number is None or number < 0:
+        return None
+    date = as_utc(as_datetime(check.get("date")))
+    return {"bankId": bank_id, "number": number, "day": date.toordinal() if date else 0}
+
+
+def apply_check_number(deltas, contribution, sign):
+    segment, offset = divmod(contribution["number"], SEGMENT_SIZE)
+    doc_id = segment_id(contribution["bankId"], segment)
+    deltas.put(INDEX_COLLECTION, doc_id, "bankId", contribution["bankId"])
+    deltas.put(INDEX_COLLECTION, doc_id, "segment", segment)
+    deltas.increment(INDEX_COLLECTION, doc_id, ("n", str(offset)), sign)
+    deltas.increment(INDEX_COLLECTION, doc_id, ("s", str(offset)), sign * contribution["day"])
+
+
+def reset_check_numbers(firestore_db):
+    delete_collection(firestore_db, INDEX_COLLECTION)
+
+
+register("checkNumbers", check_number_contribution, apply_check_number, reset_check_numbers)
+
+
+def load_segments(firestore_db, bank_id, first=None, last=None):
+    # {number: (count, day_sum)} for the bank, optionally within [first, last]
+    index = firestore_db.collection(INDEX_COLLECTION)
+    if first is not None and last is not None:
+        refs = [index.document(segment_id(bank_id, s))
+                for s in range(first // SEGMENT_SIZE, last // SEGMENT_SIZE + 1)]
+        snapshots = [snap for snap in firestore_db.get_all(refs) if snap.exists]
+    else:
+        snapshots = list(index.where("bankId", "==", bank_id).limit(MAX_SEGMENTS).stream())
+    numbers = {}
+    for snap in snapshots:
+        data = snap.to_dict() or {}
+        base = int(data.get("segment", 0)) * SEGMENT_SIZE
+        sums = data.get("s") or {}
+        for offset, count in (data.get("n") or {}).items():
+            if count:
+                numbers[base + int(offset)] = (int(count), sums.get(offset, 0))
+    if first is not None:
+        numbers = {n: v for n, v in numbers.items() if n >= first}
+    if last is not None:
+        numbers = {n: v for n, v in numbers.items() if n <= last}
+    return numbers, len(snapshots)
+
+
+def reconcile(numbers, first=None, last=None):
+    used = sorted(numbers)
+    if first is None:
+        first = used[0] if used else None
+    if last is None:
+        last = used[-1] if used else None
+
+    gaps = []
+    missing = 0
+    expected = first
+    for number in used:
+        if number > expected:
+            missing += number - expected
+            gaps.append([expected, number - 1])
+        expected = number + 1
+    if last is not None and expected is not None and expected <= last:
+        missing += last - expected + 1
+        gaps.append([expected, last])
+
+    duplicates = [{"number": n, "count": numbers[n][0]} for n in used if numbers[n][0] > 1]
+
+    out_of_order = []
+    latest = None
+    for number in used:
+        count, day_sum = numbers[number]
+        if count != 1 or not day_sum:
+            continue
+        if latest is not None and day_sum < latest[1]:
+            out_of_order.append({
+                "number": number,
+                "date": _day(day_sum),
+                "after": {"number": latest[0], "date": _day(latest[1])},
+            })
+        if latest is None or day_sum > latest[1]:
+            latest = (number, day_sum)
+
+    return {
+        "from": first,
+        "to": last,
+        "used": len(used),
+        "checks": sum(count for count, _ in numbers.values()),
+        "missing": missing,
+        "gapCount": len(gaps),
+        "gaps": gaps[:MAX_REPORTED],
+        "duplicateCount": len(duplicates),
+        "duplicates": duplicates[:MAX_REPORTED],
+        "outOfOrderCount": len(out_of_order),
+        "outOfOrder": out_of_order[:MAX_REPORTED],
+    }
+
+
+def _day(ordinal):
+    return date.fromordinal(int(ordinal)).isoformat()
+
+
+def attach_duplicate_ids(firestore_db, bank_id, duplicates):
+    wanted = [d["number"] for d in duplicates[:MAX_DUPLICATE_LOOKUPS]]
+    if not wanted:
+        return
+    base = firestore_db.collection("checks").where("bankId", "==", bank_id).select(["checkNumber"])
+    queries = [base.where("checkNumber", "in", chunk) for chunk in chunked(wanted, IN_CHUNK_SIZE)]
+    ids = {}
+    for snapshots in stream_concurrently(queries, IN_QUERY_PARALLELISM):
+        for snap in snapshots:
+            ids.setdefault(snap.get("checkNumber"), []).append(snap.id)
+    for duplicate in duplicates[:MAX_DUPLICATE_LOOKUPS]:
+        duplicate["checkIds"] = sorted(ids.get(duplicate["number"], []))
+
+
+def configure_check_number_routes(app, firestore_db):
+
+    @app.route("/api/banks/<bank_id>/check-numbers", methods=["GET"])
+    def reconcile_check_numbers(bank_id):
+        try:
+            started = time.perf_counter()
+            try:
+                first = int(request.args["from"]) if request.args.get("from") else None
+                last = int(request.args["to"]) if request.args.get("to") else None
+            except ValueError:
+                return jsonify({"error": "from and to must be numbers"}), 400
+            if (first is None) != (last is None):
+                return jsonify({"error": "Send both from and to, or neither"}), 400
+            if first is not None and (first < 0 or last < first):
+                return jsonify({"error": "from must be >= 0 and not after to"}), 400
+            if first is not None and last // SEGMENT_SIZE - first // SEGMENT_SIZE >= MAX_SEGMENTS:
+                return jsonify({"error": f"Range too large; at most {MAX_SEGMENTS * SEGMENT_SIZE} numbers"}), 400
+
+            with stage("reference_lookup"):
+                snap = firestore_db.collection("banks").document(bank_id).get()
+            if not snap.exists:
+                return jsonify({"error": "Bank not found"}), 404
+            bank = snap.to_dict() or {}
+            if not can_access_company(current_user(firestore_db), bank.get("companyId")):
+                return jsonify({"error": "Not allowed for this company"}), 403
+
+            with stage("firestore_query"):
+                numbers, segments = load_segments(firestore_db, bank_id, first, last)
+            report = reconcile(numbers, first, last)
+            with stage("reference_lookup"):
+                attach_duplicate_ids(firestore_db, bank_id, report["duplicates"])
+
+            next_number = int(to_number(bank.get("nextCheckNumber"))) or None
+            report.update({
+                "bankId": bank_id,
+                "nextCheckNumber": next_number,
+                # Reserved by batch_create or the app but never written
+                "unusedAfterHighest": (
+                    [report["to"] + 1, next_number - 1]
+                    if first is None and report["to"] is not None and next_number and next_number - 1 > report["to"]
+                    else None
+                ),
+                "segmentsRead": segments,
+                "truncated": first is None and segments >= MAX_SEGMENTS,
+                "tookMs": round((time.perf_counter() - started) * 1000, 2),
+            })
+            return jsonify(report)
+
+        except Exception as e:
+            log.exception("Check number reconciliation failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,406 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+
+from log import get_logger
+
+log = get_logger("check_projections")
+
+# --- Derived data kept in step with `checks`
+# Dashboard counters, rollups and ledgers are projections of the checks
+# collection. Each one registers:
+#   contribution(check) -> small dict describing what one check adds (or None)
+#   apply(deltas, contribution, sign) -> stages +/- increments for it
+#   reset(firestore_db) -> deletes its derived documents (used by rebuild)
+#
+# The contributions last applied are stamped on the check itself under
+# PROJECTION_FIELD. A write is then projected as "remove the stamped
+# contribution, add the new one" without reading any other document, all
+# increments land in the same batch/transaction as the check write, and
+# projecting an unchanged check is a no-op.
+#
+# Writes made by the backend go through stage_check_set/update/delete.
+# Writes the React app makes directly are picked up by the snapshot listener
+# (CHECK_LISTENER=1, run it in one process only), which reconciles any check
+# whose stamp doesn't match its data. `flask --app app rebuild-projection NAME`
+# backfills a projection from history.
+#
+# A copy of every stamp is kept in checkStamps/{checkId}, written with the
+# check. A setDoc from the React app replaces the whole check and drops
+# its stamp; everything that projects a check it has read (the listener and
+# the backend's own updates and deletes) first restores the copy with
+# with_stored_stamps, so it diffs against what was counted instead of
+# counting the check a second time.
+#
+# While a rebuild runs it holds projectionState/rebuild, and the listener
+# queues the changes it sees until the document is gone, then reconciles
+# them against fresh reads. A rebuild killed midway leaves the document
+# behind; delete it (or rerun the rebuild) to resume the listener.
+#
+# Backend deletes leave a tombstone in checkTombstones so the listener
+# doesn't project them twice. The listener removes each tombstone it
+# consumes and, when it starts, those older than its initial snapshot.
+# `flask --app app prune-tombstones` clears old ones when no listener runs.
+PROJECTION_FIELD = "_projections"
+TOMBSTONES = "checkTombstones"
+STAMPS = "checkStamps"
+STATE_COLLECTION = "projectionState"
+REBUILD_LOCK = "rebuild"
+# How long a rebuild waits after taking the lock, so a listener
+# transaction already under way lands before the reset
+REBUILD_GRACE_SECONDS = 5
+TOMBSTONE_TTL_DAYS = 1
+LISTENER_ENABLED = os.environ.get("CHECK_LISTENER") == "1"
+
+_projections = {}
+# Fields the backend derives on the check itself (e.g. weekKey, see
+# weeks.py): name -> compute(firestore_db, check). The backend's own writes
+# set them; the listener fills them in on checks written elsewhere.
+_check_fields = {}
+
+
+class Projection:
+    def __init__(self, name, contribution, apply, reset=None):
+        self.name = name
+        self.contribution = contribution
+        self.apply = apply
+        self.reset = reset
+
+
+def register(name, contribution, apply, reset=None):
+    _projections[name] = Projection(name, contribution, apply, reset)
+
+
+def register_check_field(name, compute):
+    _check_fields[name] = compute
+
+
+class Deltas:
+    # Increments are merged per document so a batch touching many checks
+    # writes each derived document once (Firestore allows ~1 write/s/doc).
+
+    def __init__(self):
+        self._increments = {}
+        self._values = {}
+        # (collection, doc id) -> whole document, or None to delete it
+        self._documents = {}
+
+    def increment(self, collection, doc_id, field_path, amount):
+        if not amount:
+            return
+        fields = self._increments.setdefault((collection, doc_id), {})
+        fields[field_path] = fields.get(field_path, 0) + amount
+
+    def put(self, collection, doc_id, field, value):
+        # Plain fields written alongside the increments (e.g. the keys a
+        # derived document is queried by)
+        self._values.setdefault((collection, doc_id), {})[field] = value
+
+    def replace(self, collection, doc_id, data):
+        # Overwrites (or with None deletes) a whole document
+        self._documents[(collection, doc_id)] = data
+
+    def merge(self, other):
+        for key, fields in other._increments.items():
+            mine = self._increments.setdefault(key, {})
+            for path, amount in fields.items():
+                mine[path] = mine.get(path, 0) + amount
+        for key, values in other._values.items():
+            self._values.setdefault(key, {}).update(values)
+        self._documents.update(other._documents)
+
+    def documents(self):
+        # The (collection, doc id) pairs flush would write
+        return set(self._increments) | set(self._values) | set(self._documents)
+
+    def flush(self, firestore_db, writer):
+        from google.cloud.firestore import Increment
+
+        for collection, doc_id in dict.fromkeys(list(self._increments) + list(self._values)):
+            fields = self._increments.get((collection, doc_id), {})
+            payload = dict(self._values.get((collection, doc_id), {}))
+            for path, amount in fields.items():
+                if isinstance(amount, float):
+                    amount = round(amount, 6)
+                if not amount:
+                    continue
+                node = payload
+                for key in path[:-1]:
+                    node = node.setdefault(key, {})
+                node[path[-1]] = Increment(amount)
+            if payload:
+                writer.set(firestore_db.collection(collection).document(doc_id), payload, merge=True)
+        for (collection, doc_id), data in self._documents.items():
+            ref = firestore_db.collection(collection).document(doc_id)
+            if data is None:
+                writer.delete(ref)
+            else:
+                writer.set(ref, data)
+        self._increments = {}
+        self._values = {}
+        self._documents = {}
+
+
+def project_check(deltas, old_data, new_data):
+    old_stamp = (old_data or {}).get(PROJECTION_FIELD) or {}
+    stamp = {}
+    for name, projection in _projections.items():
+        before = old_stamp.get(name)
+        after = projection.contribution(new_data) if new_data is not None else None
+        if before != after:
+            if before is not None:
+                projection.apply(deltas, before, -1)
+            if after is not None:
+                projection.apply(deltas, after, 1)
+        stamp[name] = after
+    return stamp
+
+
+def stage_stamp(deltas, check_id, stamp):
+    # The checkStamps copy of a stamp; None when the check is deleted
+    deltas.replace(STAMPS, check_id, None if stamp is None else {PROJECTION_FIELD: stamp})
+
+
+def stage_check_set(deltas, writer, ref, old_data, new_data):
+    data = dict(new_data)
+    data[PROJECTION_FIELD] = project_check(deltas, old_data, data)
+    stage_stamp(deltas, ref.id, data[PROJECTION_FIELD])
+    writer.set(ref, data)
+    return data
+
+
+def stage_check_update(deltas, writer, ref, old_data, changes, option=None):
+    # option: a write precondition (e.g. last_update_time of old_data's snapshot)
+    merged = dict(old_data)
+    merged.update(changes)
+    update = dict(changes)
+    update[PROJECTION_FIELD] = project_check(deltas, old_data, merged)
+    stage_stamp(deltas, ref.id, update[PROJECTION_FIELD])
+    if option is None:
+        writer.update(ref, update)
+    else:
+        writer.update(ref, update, option=option)
+    merged[PROJECTION_FIELD] = update[PROJECTION_FIELD]
+    return merged
+
+
+def stage_check_delete(deltas, writer, firestore_db, ref, old_data):
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    project_check(deltas, old_data, None)
+    stage_stamp(deltas, ref.id, None)
+    writer.delete(ref)
+    # Tells the listener this deletion has already been projected
+    writer.set(firestore_db.collection(TOMBSTONES).document(ref.id), {"deletedAt": SERVER_TIMESTAMP})
+
+
+def with_stored_stamps(reader, firestore_db, checks):
+    # checks: {checkId: data}. Gives each check that lost its stamp its
+    # checkStamps copy, in place, with one get_all; reader is the client or
+    # the transaction the write goes through. Call it on checks read before
+    # any stage_check_update/delete of them.
+    missing = [doc_id for doc_id, data in checks.items() if data is not None and PROJECTION_FIELD not in data]
+    if not missing:
+        return checks
+    refs = [firestore_db.collection(STAMPS).document(doc_id) for doc_id in missing]
+    for stored in reader.get_all(refs):
+        if stored.exists:
+            checks[stored.id][PROJECTION_FIELD] = (stored.to_dict() or {}).get(PROJECTION_FIELD) or {}
+    return checks
+
+
+# --- Listener for writes made outside the backend
+
+def _stamp_matches(data):
+    stamp = data.get(PROJECTION_FIELD) or {}
+    return all(stamp.get(name) == p.contribution(data) for name, p in _projections.items())
+
+
+def _reconcile(firestore_db, doc_id, data, removed):
+    from google.cloud.firestore import transactional
+
+    ref = firestore_db.collection("checks").document(doc_id)
+
+    if removed:
+        tombstone_ref = firestore_db.collection(TOMBSTONES).document(doc_id)
+
+        @transactional
+        def remove(transaction):
+            if transaction.get(tombstone_ref).exists:
+                # Already projected by the backend's delete
+                transaction.delete(tombstone_ref)
+                return
+            old = with_stored_stamps(transaction, firestore_db, {doc_id: dict(data)})[doc_id]
+            if not any(v is not None for v in (old.get(PROJECTION_FIELD) or {}).values()):
+                return
+            deltas = Deltas()
+            project_check(deltas, old, None)
+            stage_stamp(deltas, doc_id, None)
+            deltas.flush(firestore_db, transaction)
+
+        remove(firestore_db.transaction())
+        return
+
+    # Projections may read the derived fields, so they're computed first
+    fields = {name: compute(firestore_db, data) for name, compute in _check_fields.items()}
+    fields = {name: value for name, value in fields.items() if data.get(name) != value}
+    if not fields and _stamp_matches(data):
+        return
+
+    @transactional
+    def reproject(transaction):
+        snapshot = transaction.get(ref)
+        if not snapshot.exists:
+            return
+        current = with_stored_stamps(transaction, firestore_db, {doc_id: snapshot.to_dict()})[doc_id]
+        update = {name: compute(firestore_db, current) for name, compute in _check_fields.items()}
+        deltas = Deltas()
+        update[PROJECTION_FIELD] = project_check(deltas, current, dict(current, **update))
+        stage_stamp(deltas, doc_id, update[PROJECTION_FIELD])
+        deltas.flush(firestore_db, transaction)
+        transaction.update(ref, update)
+
+    reproject(firestore_db.transaction())
+
+
+class CheckListener:
+    # Reconciles check changes as they arrive, or queues them (latest per
+    # check) while projectionState/rebuild exists and replays them after
+
+    def __init__(self, firestore_db):
+        self.firestore_db = firestore_db
+        self.lock = threading.Lock()
+        self.paused = False
+        self.queued = {}
+        self.watches = []
+
+    def _handle(self, doc_id, data, removed):
+        try:
+            _reconcile(self.firestore_db, doc_id, data, removed)
+        except Exception:
+            log.exception("Failed to project check %s", doc_id)
+
+    def on_checks(self, _snapshots, changes, _read_time):
+        for change in changes:
+            doc = change.document
+            removed = change.type.name == "REMOVED"
+            with self.lock:
+                if self.paused:
+                    self.queued[doc.id] = (doc.to_dict() or {}) if removed else None
+                    continue
+            self._handle(doc.id, doc.to_dict() or {}, removed)
+
+    def on_lock(self, snapshots, _changes, _read_time):
+        running = any(snap.exists for snap in snapshots)
+        with self.lock:
+            was_paused, self.paused = self.paused, running
+            queued = {} if running else self.queued
+            if not running:
+                self.queued = {}
+        if running and not was_paused:
+            log.info("Projection rebuild running; queueing check changes")
+        if was_paused and not running:
+            log.info("Projection rebuild finished; replaying %d queued checks", len(queued))
+            for doc_id, removed_data in queued.items():
+                if removed_data is not None:
+                    self._handle(doc_id, removed_data, True)
+                    continue
+                snapshot = self.firestore_db.collection("checks").document(doc_id).get()
+                if snapshot.exists:
+                    self._handle(doc_id, snapshot.to_dict() or {}, False)
+
+    def start(self):
+        started = datetime.now(timezone.utc)
+        lock_ref = self.firestore_db.collection(STATE_COLLECTION).document(REBUILD_LOCK)
+        self.paused = lock_ref.get().exists
+        self.watches.append(lock_ref.on_snapshot(self.on_lock))
+        self.watches.append(self.firestore_db.collection("checks").on_snapshot(self.on_checks))
+        # Deletions from before the initial snapshot will never be delivered
+        pruned = prune_tombstones(self.firestore_db, started - timedelta(minutes=1))
+        log.info("Starting checks listener for projections: %s (pruned %d tombstones)",
+                 ", ".join(_projections), pruned)
+        return self
+
+    def unsubscribe(self):
+        for watch in self.watches:
+            watch.unsubscribe()
+
+
+def start_check_listener(firestore_db):
+    return CheckListener(firestore_db).start()
+
+
+def prune_tombstones(firestore_db, before):
+    # Deletes the tombstones written before `before`; returns how many
+    query = firestore_db.collection(TOMBSTONES).where("deletedAt", "<", before)
+    writer = firestore_db.bulk_writer()
+    count = 0
+    for snapshot in query.stream():
+        writer.delete(firestore_db.collection(TOMBSTONES).document(snapshot.id))
+        count += 1
+    writer.close()
+    return count
+
+
+# --- Backfill
+
+def rebuild(firestore_db, name):
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    projection = _projections[name]
+    lock_ref = firestore_db.collection(STATE_COLLECTION).document(REBUILD_LOCK)
+    lock_ref.create({"projection": name, "startedAt": SERVER_TIMESTAMP})
+    try:
+        time.sleep(REBUILD_GRACE_SECONDS)
+        if projection.reset:
+            projection.reset(firestore_db)
+
+        deltas = Deltas()
+        writer = firestore_db.bulk_writer()
+        count = 0
+        for snapshot in firestore_db.collection("checks").stream():
+            data = snapshot.to_dict()
+            contribution = projection.contribution(data)
+            if contribution is not None:
+                projection.apply(deltas, contribution, 1)
+            stamp = dict(data.get(PROJECTION_FIELD) or {}, **{name: contribution})
+            writer.update(snapshot.reference, {f"{PROJECTION_FIELD}.{name}": contribution})
+            writer.set(firestore_db.collection(STAMPS).document(snapshot.id), {PROJECTION_FIELD: stamp})
+            count += 1
+        deltas.flush(firestore_db, writer)
+        writer.close()
+    finally:
+        lock_ref.delete()
+    return count
+
+
+def delete_collection(firestore_db, collection):
+    writer = firestore_db.bulk_writer()
+    for ref in firestore_db.collection(collection).list_documents():
+        writer.delete(ref)
+    writer.close()
+
+
+def configure_check_projections(app, firestore_db):
+
+    @app.cli.command("rebuild-projection")
+    @click.argument("name")
+    def rebuild_projection(name):
+        """Recompute a check projection from the whole checks collection."""
+        if name not in _projections:
+            raise click.BadParameter(f"unknown projection {name!r}; choose from {', '.join(_projections)}")
+        count = rebuild(firestore_db, name)
+        click.echo(f"Rebuilt {name} from {count} checks")
+
+    @app.cli.command("prune-tombstones")
+    @click.option("--days", default=TOMBSTONE_TTL_DAYS, show_default=True, help="Keep tombstones younger than this.")
+    def prune_tombstones_command(days):
+        """Delete check tombstones the listener no longer needs."""
+        count = prune_tombstones(firestore_db, datetime.now(timezone.utc) - timedelta(days=days))
+        click.echo(f"Deleted {count} tombstones")
+
+    if LISTENER_ENABLED:
+        app.extensions["check_listener"] = start_check_listener(firestore_db)
@@ -0,0 +1,677 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import click
+from flask import jsonify, request
+
+from auth import can_access_company, current_user, is_admin
+from check_fields import as_datetime, legacy_relationship_keys, stored_relationship_pay
+from check_projections import PROJECTION_FIELD, Deltas, stage_check_set, stage_check_update, with_stored_stamps
+from duplicates import DUPLICATE_MODES, find_duplicates
+from log import get_logger
+from metrics import observe_checks, stage
+from reports import parse_bool
+from weeks import DEFAULT_RULE, RULE_FIELDS, WEEK_KEY_FIELD, stamp_week_keys, week_key_of, week_rule, week_rule_for
+
+log = get_logger("checks")
+
+# --- Check writes made through the backend
+# POST /api/checks creates a check, PATCH /api/checks/<id> edits one. Each
+# runs in a Firestore transaction together with the increments of every
+# registered projection, so the dashboard and weekly rollups move
+# atomically with the check. weekKey is always derived from the date and
+# the company's week rule (weeks.py), never taken from the payload.
+# ADMIN_FIELDS can only be written by admins: review and payment go through
+# POST /api/checks/transition, and check numbers come from the bank's
+# counter. Non-admins get 403 for a PATCH touching them, or a create
+# marking a check reviewed, paid or numbered. A check created without a
+# number gets the next one of its bank (POST /api/checks and batch_create).
+PROTECTED_FIELDS = ("id", "createdBy", PROJECTION_FIELD, WEEK_KEY_FIELD)
+REQUIRED_FIELDS = ("companyId", "employeeId", "amount")
+ADMIN_FIELDS = ("reviewed", "paid", "checkNumber", "bankId")
+
+
+# --- Paginated listing
+# GET /api/checks?companyId=&startWeek=&endWeek=&employeeId=&clientId=
+#                &reviewed=&paid=&orderBy=date|checkNumber&direction=desc|asc
+#                &pageSize=&cursor=&fields=a,b,c
+#
+# Everything but clientId is pushed into the Firestore query (see the checks
+# indexes in firestore.indexes.json). clientId can't be: relationship checks
+# keep their clients inside relationshipDetails, so those pages are filled by
+# scanning forward in batches. The cursor is opaque to the caller; it holds
+# the sort value and id of the last document scanned.
+ORDER_FIELDS = ("date", "checkNumber")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_SCAN_BATCHES = 10
+CLIENT_FIELDS = ("clientId", "relationshipDetails")
+
+
+# --- Bulk creation
+# POST /api/checks/batch_create
+#   {"companyId": ..., "bankId": optional, "checks": [{employeeId, amount, ...}],
+#    "duplicates": "flag" | "reject" | "allow"}
+# A block of check numbers is reserved with one transaction on the bank
+# document (nextCheckNumber += n), so concurrent runs never share a number.
+# The checks are then written with a bulk writer, which parallelises and
+# retries the writes, and the projection increments of the checks that were
+# written are flushed afterwards in a second pass; a check whose write
+# failed is listed under "failed" (with its index and reserved number) and
+# adds nothing to the projections.
+# Likely duplicates (same employee, week and relationships as an existing
+# check or another check of the batch, see duplicates.py) are marked with
+# "duplicate" in the response by default; "reject" refuses the whole batch
+# with 409 before any number is reserved.
+MAX_BATCH_CREATE = 1000
+BULK_WRITE_ATTEMPTS = 5
+BACKFILL_PAGE_SIZE = 500
+
+
+# --- Relationship pay
+# Checks with relationshipDetails keep each relationship's hours and per diem
+# in relationshipPay.<relId> (see check_fields.relationship_pay). Checks
+# created here get it from their payload; older checks get it from
+# `flask --app app migrate-relationship-pay`, which also removes the flat
+# "<relId>_<field>" keys with --drop-legacy. Leave those in place while the
+# React app still reads them: the reader prefers them when present.
+
+
+class CheckAccessDenied(Exception):
+    pass
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order_by, value, doc_id, state=None):
+    # `state` carries whatever a listing accumulates across pages
+    if isinstance(value, datetime):
+        value = {"date": as_datetime(value).isoformat()}
+    payload = {"o": order_by, "v": value, "id": doc_id}
+    if state:
+        payload["s"] = state
+    raw = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _load_cursor(cursor, order_by):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(data, dict):
+            raise TypeError
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    if data.get("o") != order_by:
+        raise InvalidCursor("Cursor was issued for a different orderBy")
+    return data
+
+
+def decode_cursor(cursor, order_by):
+    data = _load_cursor(cursor, order_by)
+    try:
+        value = data["v"]
+        if isinstance(value, dict):
+            value = as_datetime(value["date"])
+        doc_id = data["id"]
+    except (KeyError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+    return value, doc_id
+
+
+def cursor_state(cursor, order_by):
+    state = _load_cursor(cursor, order_by).get("s") or {}
+    if not isinstance(state, dict):
+        raise InvalidCursor("Invalid cursor")
+    return state
+
+
+def matches_client(check, client_id):
+    if check.get("clientId") == client_id:
+        return True
+    return any(rel.get("clientId") == client_id for rel in check.get("relationshipDetails") or [])
+
+
+def week_range(start_week, end_week, rule=DEFAULT_RULE):
+    # Whole weeks under the company's week rule: from the first day of
+    # startWeek's week up to the end of endWeek's week
+    start = end = None
+    if start_week:
+        start = rule.bounds(rule.normalize(start_week))[0]
+    if end_week:
+        end = rule.bounds(rule.normalize(end_week))[1]
+    return start, end
+
+
+def clean_check_fields(payload):
+    data = {k: v for k, v in payload.items() if k not in PROTECTED_FIELDS}
+    if "date" in data:
+        date = as_datetime(data["date"])
+        if date is None:
+            raise ValueError("date must be an ISO timestamp")
+        data["date"] = date
+    return data
+
+
+def admin_fields_denied(user, data, creating=False):
+    # The ADMIN_FIELDS a non-admin may not write; a create may pick its
+    # bank and leave the flags false
+    if is_admin(user):
+        return []
+    if creating:
+        return [f for f in ADMIN_FIELDS if f != "bankId" and data.get(f)]
+    return [f for f in ADMIN_FIELDS if f in data]
+
+
+def find_bank_ref(firestore_db, company_id, bank_id=None):
+    if bank_id:
+        return firestore_db.collection("banks").document(bank_id)
+    for snap in firestore_db.collection("banks").where("companyId", "==", company_id).limit(1).stream():
+        return firestore_db.collection("banks").document(snap.id)
+    return None
+
+
+def reserve_check_numbers(firestore_db, bank_ref, company_id, count):
+    # Returns the first number of a contiguous block of `count`
+    from google.cloud.firestore import transactional
+
+    @transactional
+    def reserve(transaction):
+        snapshot = transaction.get(bank_ref)
+        if not snapshot.exists:
+            raise ValueError("Bank not found")
+        bank = snapshot.to_dict()
+        if bank.get("companyId") != company_id:
+            raise ValueError("Bank belongs to another company")
+        start = int(bank.get("nextCheckNumber") or 1)
+        transaction.update(bank_ref, {"nextCheckNumber": start + count})
+        return start
+
+    return reserve(firestore_db.transaction())
+
+
+def with_relationship_pay(data):
+    if data.get("relationshipDetails"):
+        data["relationshipPay"] = stored_relationship_pay(data)
+    return data
+
+
+def migrate_relationship_pay(firestore_db, dry_run=False, drop_legacy=False):
+    # Returns (checks scanned, checks updated). Writes bypass the projections:
+    # the values they read are unchanged.
+    from google.cloud.firestore import DELETE_FIELD
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    failed = []
+
+    def on_write_error(error, _writer):
+        if error.attempts < BULK_WRITE_ATTEMPTS:
+            return True
+        failed.append(error.operation.reference.id)
+        return False
+
+    writer = None if dry_run else firestore_db.bulk_writer()
+    if writer is not None:
+        writer.on_write_error(on_write_error)
+    scanned = updated = 0
+    for snap in firestore_db.collection("checks").stream():
+        scanned += 1
+        check = snap.to_dict() or {}
+        if not check.get("relationshipDetails"):
+            continue
+        changes = {}
+        pay = stored_relationship_pay(check)
+        if pay != check.get("relationshipPay"):
+            changes["relationshipPay"] = pay
+        if drop_legacy:
+            # Relationship ids start with digits, so the keys need quoting
+            for key in legacy_relationship_keys(check):
+                changes[FieldPath(key).to_api_repr()] = DELETE_FIELD
+        if changes:
+            updated += 1
+            if writer is not None:
+                writer.update(firestore_db.collection("checks").document(snap.id), changes)
+    if writer is not None:
+        writer.close()
+    if failed:
+        log.error("Relationship pay migration: %d check updates failed", len(failed),
+                  extra={"fields": {"failed": failed[:100]}})
+    return scanned, updated - len(failed)
+
+
+def backfill_week_keys(firestore_db, dry_run=False):
+    # Returns (checks scanned, checks updated). Only checks whose weekKey
+    # differs are written, so it is safe to rerun. The rollups, dashboard
+    # and duplicate keys are counted by weekKey, so the checks are
+    # reprojected, in pages of BACKFILL_PAGE_SIZE so the checks that lost
+    # their stamp get it back with one read per page; the increments of the
+    # checks whose update went through are flushed after the check writes.
+    failed = []
+
+    def on_write_error(error, _writer):
+        if error.attempts < BULK_WRITE_ATTEMPTS:
+            return True
+        failed.append(error.operation.reference.id)
+        return False
+
+    rules = {
+        snap.id: week_rule(snap.to_dict())
+        for snap in firestore_db.collection("companies").select(RULE_FIELDS).stream()
+    }
+    writer = None if dry_run else firestore_db.bulk_writer()
+    if writer is not None:
+        writer.on_write_error(on_write_error)
+    scanned = 0
+    rekeyed = {}
+    pending = {}
+
+    def rekey():
+        with_stored_stamps(firestore_db, firestore_db, {check_id: check for check_id, (check, _) in pending.items()})
+        for check_id, (check, key) in pending.items():
+            ref = firestore_db.collection("checks").document(check_id)
+            check_deltas = Deltas()
+            stage_check_update(check_deltas, writer, ref, check, {WEEK_KEY_FIELD: key})
+            rekeyed[check_id] = check_deltas
+        pending.clear()
+
+    for snap in firestore_db.collection("checks").stream():
+        scanned += 1
+        check = snap.to_dict() or {}
+        key = rules.get(check.get("companyId"), DEFAULT_RULE).key(check.get("date"))
+        if key != check.get(WEEK_KEY_FIELD):
+            if writer is None:
+                rekeyed[snap.id] = None
+                continue
+            pending[snap.id] = (check, key)
+            if len(pending) >= BACKFILL_PAGE_SIZE:
+                rekey()
+    if pending:
+        rekey()
+    updated = len(rekeyed)
+    if writer is not None:
+        writer.close()
+        deltas = Deltas()
+        for check_id, check_deltas in rekeyed.items():
+            if check_id not in failed:
+                deltas.merge(check_deltas)
+        writer = firestore_db.bulk_writer()
+        deltas.flush(firestore_db, writer)
+        writer.close()
+    if failed:
+        log.error("Week key backfill: %d check updates failed", len(failed),
+                  extra={"fields": {"failed": failed[:100]}})
+    return scanned, updated - len(failed)
+
+
+def serialize_check(doc_id, data):
+    out = {k: v for k, v in data.items() if k != PROJECTION_FIELD}
+    date = as_datetime(out.get("date"))
+    out["date"] = date.isoformat() if date else None
+    out["id"] = doc_id
+    return out
+
+
+def configure_check_routes(app, firestore_db):
+
+    @app.cli.command("migrate-relationship-pay")
+    @click.option("--dry-run", is_flag=True, help="Count the checks that would change without writing.")
+    @click.option("--drop-legacy", is_flag=True, help="Also delete the flat <relId>_<field> keys.")
+    def migrate_relationship_pay_command(dry_run, drop_legacy):
+        """Write relationshipPay on checks that have relationshipDetails."""
+        scanned, updated = migrate_relationship_pay(firestore_db, dry_run=dry_run, drop_legacy=drop_legacy)
+        verb = "would update" if dry_run else "updated"
+        click.echo(f"Scanned {scanned} checks, {verb} {updated}")
+
+    @app.cli.command("backfill-week-keys")
+    @click.option("--dry-run", is_flag=True, help="Count the checks that would change without writing.")
+    def backfill_week_keys_command(dry_run):
+        """Set weekKey on checks from their date and company week rule."""
+        scanned, updated = backfill_week_keys(firestore_db, dry_run=dry_run)
+        verb = "would update" if dry_run else "updated"
+        click.echo(f"Scanned {scanned} checks, {verb} {updated}")
+
+    @app.route("/api/checks", methods=["GET"])
+    def list_checks():
+        try:
+            args = request.args
+            user = current_user(firestore_db)
+            company_id = args.get("companyId")
+            if company_id:
+                if not can_access_company(user, company_id):
+                    return jsonify({"error": "Not allowed for this company"}), 403
+            elif not is_admin(user):
+                return jsonify({"error": "companyId is required"}), 400
+
+            order_by = args.get("orderBy", "date")
+            if order_by not in ORDER_FIELDS:
+                return jsonify({"error": f"orderBy must be one of {', '.join(ORDER_FIELDS)}"}), 400
+            direction = "ASCENDING" if args.get("direction", "desc").lower() == "asc" else "DESCENDING"
+            try:
+                page_size = min(max(int(args.get("pageSize", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                rule = week_rule_for(firestore_db, company_id) if company_id else DEFAULT_RULE
+                start, end = week_range(args.get("startWeek"), args.get("endWeek"), rule)
+            except ValueError:
+                return jsonify({"error": "pageSize must be a number and weeks YYYY-MM-DD"}), 400
+            if (start or end) and order_by != "date":
+                # Firestore orders by the range field first
+                return jsonify({"error": "A week range can only be ordered by date"}), 400
+
+            query = firestore_db.collection("checks")
+            if company_id:
+                query = query.where("companyId", "==", company_id)
+            if args.get("employeeId"):
+                query = query.where("employeeId", "==", args["employeeId"])
+            for flag in ("reviewed", "paid"):
+                if args.get(flag) is not None:
+                    query = query.where(flag, "==", parse_bool(args[flag], False))
+            if start:
+                query = query.where("date", ">=", start)
+            if end:
+                query = query.where("date", "<", end)
+            query = query.order_by(order_by, direction=direction).order_by("__name__", direction=direction)
+
+            fields = [f for f in (args.get("fields") or "").split(",") if f]
+            client_id = args.get("clientId")
+            if fields:
+                selected = set(fields) | {order_by}
+                if client_id:
+                    selected |= set(CLIENT_FIELDS)
+                query = query.select(sorted(selected))
+
+            if args.get("cursor"):
+                try:
+                    value, doc_id = decode_cursor(args["cursor"], order_by)
+                except InvalidCursor as e:
+                    return jsonify({"error": str(e)}), 400
+                query = query.start_after({order_by: value, "__name__": doc_id})
+
+            page = []
+            last = None
+            exhausted = False
+            with stage("firestore_query"):
+                if client_id:
+                    batches = 0
+                    while len(page) < page_size and batches < MAX_SCAN_BATCHES:
+                        batch = list(query.limit(page_size * 2).stream())
+                        batches += 1
+                        for snap in batch:
+                            last = snap
+                            d = snap.to_dict()
+                            if matches_client(d, client_id):
+                                page.append((snap.id, d))
+                                if len(page) == page_size:
+                                    break
+                        if not batch or (len(batch) < page_size * 2 and last is batch[-1]):
+                            exhausted = True
+                            break
+                        query = query.start_after(last)
+                else:
+                    batch = list(query.limit(page_size + 1).stream())
+                    exhausted = len(batch) <= page_size
+                    batch = batch[:page_size]
+                    page = [(snap.id, snap.to_dict()) for snap in batch]
+                    last = batch[-1] if batch else None
+
+            checks = []
+            for doc_id, d in page:
+                out = serialize_check(doc_id, d)
+                if fields:
+                    out = {k: out.get(k) for k in ["id"] + fields}
+                checks.append(out)
+            observe_checks(len(checks))
+
+            next_cursor = None
+            if not exhausted and last is not None:
+                next_cursor = encode_cursor(order_by, last.get(order_by), last.id)
+            return jsonify({"checks": checks, "nextCursor": next_cursor})
+
+        except Exception as e:
+            log.exception("List checks failed")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/checks", methods=["POST"])
+    def create_check():
+        from google.cloud.firestore import transactional
+
+        try:
+            user = current_user(firestore_db)
+            if not user:
+                return jsonify({"error": "Sign-in required"}), 401
+            try:
+                data = clean_check_fields(request.get_json() or {})
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            missing = [f for f in REQUIRED_FIELDS if data.get(f) in (None, "")]
+            if missing:
+                return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
+            if not can_access_company(user, data["companyId"]):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            denied = admin_fields_denied(user, data, creating=True)
+            if denied:
+                return jsonify({"error": f"Only admins can set {', '.join(denied)}"}), 403
+
+            data.setdefault("date", datetime.now(timezone.utc))
+            data.setdefault("reviewed", False)
+            data.setdefault("paid", False)
+            data["createdBy"] = user["uid"]
+            with_relationship_pay(data)
+            with stage("reference_lookup"):
+                stamp_week_keys(firestore_db, [data])
+            if data.get("checkNumber") in (None, ""):
+                # Numbered from the bank's sequence, like batch_create; the
+                # print routes refuse checks without a number
+                with stage("reference_lookup"):
+                    bank_ref = find_bank_ref(firestore_db, data["companyId"], data.get("bankId"))
+                if bank_ref is None:
+                    return jsonify({"error": f"No bank found for company {data['companyId']}"}), 400
+                try:
+                    with stage("firestore_write"):
+                        data["checkNumber"] = reserve_check_numbers(firestore_db, bank_ref, data["companyId"], 1)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
+                data["bankId"] = bank_ref.id
+            elif not data.get("bankId"):
+                with stage("reference_lookup"):
+                    bank_ref = find_bank_ref(firestore_db, data["companyId"])
+                if bank_ref is not None:
+                    data["bankId"] = bank_ref.id
+            ref = firestore_db.collection("checks").document()
+
+            @transactional
+            def create(transaction):
+                deltas = Deltas()
+                written = stage_check_set(deltas, transaction, ref, None, data)
+                deltas.flush(firestore_db, transaction)
+                return written
+
+            with stage("firestore_write"):
+                written = create(firestore_db.transaction())
+            log.info("Created check %s", ref.id, extra={"fields": {"companyId": data["companyId"]}})
+            return jsonify(serialize_check(ref.id, written)), 201
+
+        except Exception as e:
+            log.exception("Create check failed")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/checks/<check_id>", methods=["PATCH"])
+    def update_check(check_id):
+        from google.cloud.firestore import transactional
+
+        try:
+            user = current_user(firestore_db)
+            if not user:
+                return jsonify({"error": "Sign-in required"}), 401
+            try:
+                changes = clean_check_fields(request.get_json() or {})
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if not changes:
+                return jsonify({"error": "No fields to update"}), 400
+            if "companyId" in changes and not can_access_company(user, changes["companyId"]):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            denied = admin_fields_denied(user, changes)
+            if denied:
+                return jsonify({
+                    "error": f"Only admins can change {', '.join(denied)}; "
+                             "use POST /api/checks/transition to review or pay checks",
+                }), 403
+            ref = firestore_db.collection("checks").document(check_id)
+
+            @transactional
+            def update(transaction):
+                snapshot = transaction.get(ref)
+                if not snapshot.exists:
+                    return None
+                old = with_stored_stamps(transaction, firestore_db, {check_id: snapshot.to_dict()})[check_id]
+                if not can_access_company(user, old.get("companyId")):
+                    raise CheckAccessDenied()
+                if "date" in changes or "companyId" in changes:
+                    changes[WEEK_KEY_FIELD] = week_key_of(firestore_db, dict(old, **changes))
+                deltas = Deltas()
+                merged = stage_check_update(deltas, transaction, ref, old, changes)
+                deltas.flush(firestore_db, transaction)
+                return merged
+
+            try:
+                with stage("firestore_write"):
+                    merged = update(firestore_db.transaction())
+            except CheckAccessDenied:
+                return jsonify({"error": "Not allowed for this company"}), 403
+            if merged is None:
+                return jsonify({"error": "Check not found"}), 404
+            return jsonify(serialize_check(check_id, merged))
+
+        except Exception as e:
+            log.exception("Update check failed")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/checks/batch_create", methods=["POST"])
+    def batch_create_checks():
+        try:
+            user = current_user(firestore_db)
+            if not user:
+                return jsonify({"error": "Sign-in required"}), 401
+            body = request.get_json() or {}
+            company_id = body.get("companyId")
+            items = body.get("checks") or []
+            if not company_id or not items:
+                return jsonify({"error": "companyId and checks are required"}), 400
+            if len(items) > MAX_BATCH_CREATE:
+                return jsonify({"error": f"At most {MAX_BATCH_CREATE} checks per batch"}), 400
+            if not can_access_company(user, company_id):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            duplicate_mode = body.get("duplicates", "flag")
+            if duplicate_mode not in DUPLICATE_MODES:
+                return jsonify({"error": f"duplicates must be one of {', '.join(DUPLICATE_MODES)}"}), 400
+
+            now = datetime.now(timezone.utc)
+            checks = []
+            for index, item in enumerate(items):
+                try:
+                    data = clean_check_fields(item)
+                except ValueError as e:
+                    return jsonify({"error": f"checks[{index}]: {e}"}), 400
+                data["companyId"] = company_id
+                missing = [f for f in REQUIRED_FIELDS if data.get(f) in (None, "")]
+                if missing:
+                    return jsonify({"error": f"checks[{index}]: missing {', '.join(missing)}"}), 400
+                denied = admin_fields_denied(user, data, creating=True)
+                if denied:
+                    return jsonify({"error": f"checks[{index}]: only admins can set {', '.join(denied)}"}), 403
+                data.setdefault("date", now)
+                data.setdefault("reviewed", False)
+                data.setdefault("paid", False)
+                data["createdBy"] = user["uid"]
+                checks.append(with_relationship_pay(data))
+
+            with stage("reference_lookup"):
+                stamp_week_keys(firestore_db, checks)
+            duplicates = {}
+            if duplicate_mode != "allow":
+                with stage("reference_lookup"):
+                    duplicates = find_duplicates(firestore_db, checks)
+            if duplicates and duplicate_mode == "reject":
+                return jsonify({
+                    "error": "Likely duplicate checks",
+                    "duplicates": [dict(info, index=index) for index, info in sorted(duplicates.items())],
+                }), 409
+
+            with stage("reference_lookup"):
+                bank_ref = find_bank_ref(firestore_db, company_id, body.get("bankId"))
+            if bank_ref is None:
+                return jsonify({"error": f"No bank found for company {company_id}"}), 400
+            try:
+                with stage("firestore_write"):
+                    first_number = reserve_check_numbers(firestore_db, bank_ref, company_id, len(checks))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            failed = set()
+
+            def on_write_error(error, _writer):
+                if error.attempts < BULK_WRITE_ATTEMPTS:
+                    return True
+                failed.add(error.operation.reference.id)
+                return False
+
+            created = []
+            written = []
+            writer = firestore_db.bulk_writer()
+            writer.on_write_error(on_write_error)
+            with stage("firestore_write"):
+                for offset, data in enumerate(checks):
+                    data["checkNumber"] = first_number + offset
+                    data["bankId"] = bank_ref.id
+                    ref = firestore_db.collection("checks").document()
+                    # Increments are flushed below, once the write is known to have landed
+                    check_deltas = Deltas()
+                    stage_check_set(check_deltas, writer, ref, None, data)
+                    written.append((ref.id, check_deltas))
+                    created.append({"id": ref.id, "index": offset, "checkNumber": data["checkNumber"],
+                                    "employeeId": data["employeeId"]})
+                    if offset in duplicates:
+                        created[-1]["duplicate"] = duplicates[offset]
+                writer.close()
+
+            failed_projections = []
+
+            def on_projection_error(error, _writer):
+                if error.attempts < BULK_WRITE_ATTEMPTS:
+                    return True
+                failed_projections.append(error.operation.reference.path)
+                return False
+
+            deltas = Deltas()
+            for check_id, check_deltas in written:
+                if check_id not in failed:
+                    deltas.merge(check_deltas)
+            writer = firestore_db.bulk_writer()
+            writer.on_write_error(on_projection_error)
+            with stage("firestore_write"):
+                deltas.flush(firestore_db, writer)
+                writer.close()
+
+            if failed:
+                log.error("Batch create: %d of %d check writes failed", len(failed), len(checks),
+                          extra={"fields": {"failed": sorted(failed)}})
+            if failed_projections:
+                # The checks are stamped as projected, so only a rebuild repairs these
+                log.error("Batch create: %d projection writes failed; run rebuild-projection",
+                          len(failed_projections), extra={"fields": {"documents": failed_projections[:100]}})
+            log.info("Batch created %d checks", len(created) - len(failed),
+                     extra={"fields": {"companyId": company_id, "bankId": bank_ref.id,
+                                       "firstNumber": first_number}})
+            return jsonify({
+                "bankId": bank_ref.id,
+                "firstCheckNumber": first_number,
+                "lastCheckNumber": first_number + len(checks) - 1,
+                "checks": [c for c in created if c["id"] not in failed],
+                "failed": [c for c in created if c["id"] in failed],
+                "projectionErrors": len(failed_projections),
+            }), (201 if not failed and not failed_projections else 207)
+
+        except Exception as e:
+            log.exception("Batch create failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+
+from flask import jsonify, request
+
+from auth import can_access_company, current_user
+from bulk_query import json_value
+from check_fields import PAY_KINDS
+from checks import InvalidCursor, decode_cursor, encode_cursor
+from firestore_accounting import stream_concurrently, unwrap
+from log import get_logger
+from metrics import record_cache, stage
+from rollups import MAX_WEEKS, ROLLUP_COLLECTION
+
+log = get_logger("companies")
+
+# --- Company profile
+# GET /api/companies/<companyId>/profile?pageSize=&cursor=&weeks=
+#
+# Everything the profile modal shows, in one response:
+#   company     name and address
+#   employees   count and one page ordered by name (cursor for the next)
+#   weeks       check totals per week, newest first, from weeklyRollups
+#   creators    users who wrote the company's checks, from the rollups'
+#               byCreator counters, with names fetched in one get_all
+#   banks, clients
+# The company, employee page, rollups, banks and clients are five projected
+# queries run concurrently; the creators and (only when there is more than
+# one page) the employee count follow. Responses are cached per page for
+# PROFILE_CACHE_TTL seconds.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_WEEKS = 26
+PROFILE_CACHE_TTL = float(os.environ.get("PROFILE_CACHE_TTL", "30"))
+
+COMPANY_FIELDS = ["name", "address"]
+EMPLOYEE_FIELDS = ["name", "position", "payType", "payTypes", "payRate", "active", "startDate"]
+ROLLUP_FIELDS = ["weekKey", "count", "grossCents", "byStatus", "byCreator"] + [f"{kind}Cents" for kind in PAY_KINDS]
+BANK_FIELDS = ["bankName", "routingNumber", "accountNumber", "startingCheckNumber", "nextCheckNumber"]
+CLIENT_FIELDS = ["name", "address", "contactPerson", "contactEmail", "contactPhone", "active"]
+USER_FIELDS = ["username", "email"]
+
+
+class TTLCache:
+    # Small in-process cache; entries expire after `ttl` seconds and the
+    # oldest are dropped beyond `max_entries`
+
+    def __init__(self, name, ttl, max_entries=256):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry[0] > time.monotonic()
+            if entry is not None and not hit:
+                del self._entries[key]
+        record_cache(self.name, hit)
+        return entry[1] if hit else None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+
+PROFILE_CACHE = TTLCache("company_profile", PROFILE_CACHE_TTL)
+
+
+def _row(snap, fields):
+    data = snap.to_dict() or {}
+    row = {field: json_value(data.get(field)) for field in fields if field in data}
+    row["id"] = snap.id
+    return row
+
+
+def _dollars(counter):
+    counter = counter or {}
+    return {"count": int(counter.get("count", 0)), "gross": round(counter.get("grossCents", 0) / 100, 2)}
+
+
+def load_profile(firestore_db, company_id, page_size, cursor, weeks):
+    companies = firestore_db.collection("companies")
+    employees = (
+        firestore_db.collection("employees")
+        .where("companyId", "==", company_id)
+        .order_by("name")
+        .order_by("__name__")
+    )
+    page_query = employees.select(EMPLOYEE_FIELDS)
+    if cursor:
+        name, doc_id = decode_cursor(cursor, "name")
+        page_query = page_query.start_after({"name": name, "__name__": doc_id})
+    queries = [
+        companies.where("__name__", "==", unwrap(companies.document(company_id))).select(COMPANY_FIELDS),
+        page_query.limit(page_size + 1),
+        firestore_db.collection(ROLLUP_COLLECTION)
+        .where("companyId", "==", company_id)
+        .order_by("weekKey", direction="DESCENDING")
+        .select(ROLLUP_FIELDS)
+        .limit(MAX_WEEKS),
+        firestore_db.collection("banks").where("companyId", "==", company_id).select(BANK_FIELDS),
+        firestore_db.collection("clients").where("companyId", "array_contains", company_id).select(CLIENT_FIELDS),
+    ]
+    with stage("firestore_query"):
+        company, page, rollups, banks, clients = stream_concurrently(queries, len(queries))
+    if not company:
+        return None
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor("name", page[-1].get("name"), page[-1].id)
+    if cursor or next_cursor:
+        with stage("firestore_query"):
+            employee_count = 0
+            for result in employees.count(alias="count").get():
+                for item in result:
+                    employee_count = int(item.value or 0)
+    else:
+        employee_count = len(page)
+
+    rollups = [r.to_dict() or {} for r in rollups]
+    rollups = [r for r in rollups if r.get("count")]
+    creators = {}
+    for rollup in rollups:
+        for uid, counter in (rollup.get("byCreator") or {}).items():
+            total = creators.setdefault(uid, {"count": 0, "grossCents": 0})
+            total["count"] += counter.get("count", 0)
+            total["grossCents"] += counter.get("grossCents", 0)
+    creators = {uid: total for uid, total in creators.items() if total["count"]}
+    with stage("reference_lookup"):
+        refs = [firestore_db.collection("users").document(uid) for uid in creators]
+        users = {
+            snap.id: snap.to_dict() or {}
+            for snap in (firestore_db.get_all(refs, field_paths=USER_FIELDS) if refs else [])
+            if snap.exists
+        }
+
+    week_rows = []
+    for rollup in rollups[:weeks]:
+        row = _dollars(rollup)
+        row["weekKey"] = rollup.get("weekKey")
+        row["byStatus"] = {
+            status: _dollars((rollup.get("byStatus") or {}).get(status))
+            for status in ("pending", "reviewed", "paid")
+        }
+        week_rows.append(row)
+    creator_rows = [
+        dict(_dollars(total), id=uid, **{f: users.get(uid, {}).get(f, "") for f in USER_FIELDS})
+        for uid, total in creators.items()
+    ]
+    creator_rows.sort(key=lambda row: row["count"], reverse=True)
+
+    return {
+        "company": _row(company[0], COMPANY_FIELDS),
+        "employees": {
+            "count": employee_count,
+            "items": [_row(snap, EMPLOYEE_FIELDS) for snap in page],
+            "nextCursor": next_cursor,
+        },
+        "weeks": week_rows,
+        "totals": _dollars({
+            "count": sum(r.get("count", 0) for r in rollups),
+            "grossCents": sum(r.get("grossCents", 0) for r in rollups),
+        }),
+        "creators": creator_rows,
+        "banks": [_row(snap, BANK_FIELDS) for snap in banks],
+        "clients": sorted((_row(snap, CLIENT_FIELDS) for snap in clients), key=lambda c: c.get("name") or ""),
+    }
+
+
+def configure_company_routes(app, firestore_db):
+
+    @app.route("/api/companies/<company_id>/profile", methods=["GET"])
+    def company_profile(company_id):
+        try:
+            if not can_access_company(current_user(firestore_db), company_id):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            try:
+                page_size = min(max(int(request.args.get("pageSize", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+                weeks = min(max(int(request.args.get("weeks", DEFAULT_WEEKS)), 0), MAX_WEEKS)
+            except ValueError:
+                return jsonify({"error": "pageSize and weeks must be numbers"}), 400
+            cursor = request.args.get("cursor") or None
+
+            key = (company_id, page_size, cursor, weeks)
+            profile = PROFILE_CACHE.get(key)
+            if profile is None:
+                try:
+                    profile = load_profile(firestore_db, company_id, page_size, cursor, weeks)
+                except InvalidCursor as e:
+                    return jsonify({"error": str(e)}), 400
+                if profile is None:
+                    return jsonify({"error": "Company not found"}), 404
+                PROFILE_CACHE.put(key, profile)
+            return jsonify(profile)
+
+        except Exception as e:
+            log.exception("Company profile failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,350 @@
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from flask import jsonify, request
+
+from auth import current_user, is_admin
+from check_projections import Deltas, stage_check_delete, with_stored_stamps
+from log import get_logger
+
+log = get_logger("company_jobs")
+
+# --- Cascading company delete / archive
+# POST /api/companies/<companyId>/cascade   {"mode": "delete" | "archive"}
+# GET  /api/company-jobs/<jobId>
+# POST /api/company-jobs/<jobId>/resume
+#
+# Removes a company and everything hanging off it, in PHASES order:
+#   checks         deleted with their projection increments (stage_check_delete)
+#   reviewRequest  the company's review requests
+#   employees, banks
+#   clients        the company is removed from their companyId list
+#   company        the company document itself, last
+# "archive" first copies every document into
+# companyArchives/{companyId}/{collection}/{docId} (and the company into
+# companyArchives/{companyId}); a document is only removed once its copy
+# has been written.
+#
+# The job runs on a background thread and its state lives in
+# companyJobs/{jobId}. Each phase is read in pages of PAGE_SIZE ordered by
+# document id; a page is written through a bulk writer capped at
+# MAX_OPS_PER_SECOND, flushed, and only then is the checkpoint (phase + last
+# id) and the progress saved. A job whose thread died (restart, deploy) stops
+# heartbeating and can be resumed from its checkpoint; re-running a page is
+# harmless since deleted documents are simply gone.
+JOB_COLLECTION = "companyJobs"
+ARCHIVE_COLLECTION = "companyArchives"
+MODES = ("delete", "archive")
+PHASES = ("checks", "reviewRequest", "employees", "banks", "clients", "company")
+PAGE_SIZE = 300
+MAX_OPS_PER_SECOND = int(os.environ.get("COMPANY_JOB_MAX_OPS", "500"))
+BULK_WRITE_ATTEMPTS = 5
+# A running job that hasn't saved a checkpoint for this long is considered dead
+STALE_AFTER = timedelta(minutes=5)
+MAX_FAILED_IDS = 100
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def phase_query(firestore_db, phase, company_id):
+    collection = firestore_db.collection(phase)
+    if phase == "clients":
+        return collection.where("companyId", "array_contains", company_id)
+    return collection.where("companyId", "==", company_id)
+
+
+def count_related(firestore_db, company_id):
+    totals = {}
+    for phase in PHASES[:-1]:
+        totals[phase] = 0
+        for result in phase_query(firestore_db, phase, company_id).count(alias="count").get():
+            for item in result:
+                totals[phase] = int(item.value or 0)
+    totals["company"] = 1
+    return totals
+
+
+def is_stale(job):
+    heartbeat = job.get("heartbeatAt")
+    return heartbeat is None or _now() - heartbeat > STALE_AFTER
+
+
+def claim_job(firestore_db, job_ref):
+    # Marks the job running for this process; None if it is finished or
+    # another process is still working on it
+    from google.cloud.firestore import transactional
+
+    @transactional
+    def claim(transaction):
+        snapshot = transaction.get(job_ref)
+        if not snapshot.exists:
+            return None
+        job = snapshot.to_dict()
+        if job.get("status") == "completed":
+            return None
+        if job.get("status") == "running" and not is_stale(job):
+            return None
+        now = _now()
+        changes = {"status": "running", "heartbeatAt": now, "error": None}
+        if not job.get("startedAt"):
+            changes["startedAt"] = now
+        transaction.update(job_ref, changes)
+        job.update(changes)
+        return job
+
+    return claim(firestore_db.transaction())
+
+
+def _bulk_writer(firestore_db, failed):
+    from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+
+    def on_write_error(error, _writer):
+        if error.attempts < BULK_WRITE_ATTEMPTS:
+            return True
+        failed.append(error.operation.reference.id)
+        return False
+
+    writer = firestore_db.bulk_writer(options=BulkWriterOptions(
+        initial_ops_per_second=min(MAX_OPS_PER_SECOND, 500),
+        max_ops_per_second=MAX_OPS_PER_SECOND,
+    ))
+    writer.on_write_error(on_write_error)
+    return writer
+
+
+def _archive_page(firestore_db, job, phase, snapshots):
+    # Returns the ids whose archive copy could not be written
+    failed = []
+    writer = _bulk_writer(firestore_db, failed)
+    archive = firestore_db.collection(ARCHIVE_COLLECTION).document(job["companyId"]).collection(phase)
+    for snap in snapshots:
+        writer.set(archive.document(snap.id), snap.to_dict() or {})
+    writer.close()
+    return set(failed)
+
+
+def _remove_page(firestore_db, job, phase, snapshots):
+    # Returns the ids whose delete (or client update) failed
+    from google.cloud.firestore import ArrayRemove
+
+    failed = []
+    deltas = Deltas()
+    checks = {}
+    if phase == "checks":
+        checks = with_stored_stamps(firestore_db, firestore_db, {snap.id: snap.to_dict() or {} for snap in snapshots})
+    writer = _bulk_writer(firestore_db, failed)
+    for snap in snapshots:
+        ref = firestore_db.collection(phase).document(snap.id)
+        if phase == "checks":
+            stage_check_delete(deltas, writer, firestore_db, ref, checks[snap.id])
+        elif phase == "clients":
+            writer.update(ref, {"companyId": ArrayRemove([job["companyId"]])})
+        else:
+            writer.delete(ref)
+    deltas.flush(firestore_db, writer)
+    writer.close()
+    ids = {snap.id for snap in snapshots}
+    if any(i not in ids for i in failed):
+        # A tombstone or projection write; the checks listener or
+        # rebuild-projection repairs those
+        log.warning("Company job: %d derived writes failed in %s", sum(i not in ids for i in failed), phase)
+    return {i for i in failed if i in ids}
+
+
+def _run_phase(firestore_db, job_ref, job, phase):
+    company_id = job["companyId"]
+    checkpoint = job.get("checkpoint") or {}
+    last_id = checkpoint.get("lastId") if checkpoint.get("phase") == phase else None
+
+    while True:
+        query = phase_query(firestore_db, phase, company_id).order_by("__name__").limit(PAGE_SIZE)
+        if last_id:
+            query = query.start_after({"__name__": last_id})
+        snapshots = list(query.stream())
+        if not snapshots:
+            return
+
+        failed = set()
+        if job["mode"] == "archive":
+            # Copies are flushed before anything is removed, and a document
+            # whose copy failed is left in place
+            failed = _archive_page(firestore_db, job, phase, snapshots)
+        failed |= _remove_page(firestore_db, job, phase, [s for s in snapshots if s.id not in failed])
+
+        last_id = snapshots[-1].id
+        job["counts"][phase] = job["counts"].get(phase, 0) + len(snapshots) - len(failed)
+        job["failed"] = job.get("failed", 0) + len(failed)
+        job["failedIds"] = (job.get("failedIds") or []) + [f"{phase}/{i}" for i in sorted(failed)]
+        job["checkpoint"] = {"phase": phase, "lastId": last_id}
+        job_ref.update({
+            "counts": job["counts"],
+            "failed": job["failed"],
+            "failedIds": job["failedIds"][:MAX_FAILED_IDS],
+            "checkpoint": job["checkpoint"],
+            "heartbeatAt": _now(),
+        })
+        if len(snapshots) < PAGE_SIZE:
+            return
+
+
+def _finish_company(firestore_db, job_ref, job):
+    company_id = job["companyId"]
+    ref = firestore_db.collection("companies").document(company_id)
+    snapshot = ref.get()
+    if snapshot.exists:
+        batch = firestore_db.batch()
+        if job["mode"] == "archive":
+            batch.set(firestore_db.collection(ARCHIVE_COLLECTION).document(company_id), dict(
+                snapshot.to_dict() or {},
+                archivedAt=_now(),
+                archivedBy=job.get("createdBy"),
+                jobId=job_ref.id,
+                counts=job["counts"],
+            ))
+        batch.delete(ref)
+        batch.commit()
+        job["counts"]["company"] = 1
+
+
+def run_job(firestore_db, job_id):
+    job_ref = firestore_db.collection(JOB_COLLECTION).document(job_id)
+    job = claim_job(firestore_db, job_ref)
+    if job is None:
+        log.info("Company job %s is finished or running elsewhere", job_id)
+        return
+    job.setdefault("counts", {})
+    checkpoint = job.get("checkpoint") or {}
+    start = PHASES.index(checkpoint["phase"]) if checkpoint.get("phase") in PHASES else 0
+    started = _now()
+    try:
+        for phase in PHASES[start:]:
+            job_ref.update({"phase": phase, "heartbeatAt": _now()})
+            if phase == "company":
+                _finish_company(firestore_db, job_ref, job)
+            else:
+                _run_phase(firestore_db, job_ref, job, phase)
+
+        summary = {
+            "mode": job["mode"],
+            "counts": job["counts"],
+            "failed": job.get("failed", 0),
+            "seconds": round((_now() - (job.get("startedAt") or started)).total_seconds(), 1),
+        }
+        job_ref.update({
+            "status": "completed",
+            "phase": None,
+            "finishedAt": _now(),
+            "heartbeatAt": _now(),
+            "summary": summary,
+        })
+        log.info("Company job %s completed", job_id, extra={"fields": dict(summary, companyId=job["companyId"])})
+    except Exception as e:
+        log.exception("Company job %s failed", job_id)
+        job_ref.update({"status": "failed", "error": str(e), "heartbeatAt": None})
+
+
+def start_job(firestore_db, job_id):
+    thread = threading.Thread(target=run_job, args=(firestore_db, job_id), name=f"company-job-{job_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def serialize_job(job_id, job):
+    totals = job.get("totals") or {}
+    counts = job.get("counts") or {}
+    total = sum(totals.values())
+    done = sum(min(counts.get(p, 0), totals.get(p, 0)) for p in PHASES)
+    out = {k: v for k, v in job.items() if k not in ("heartbeatAt",)}
+    out["id"] = job_id
+    out["progress"] = 1.0 if job.get("status") == "completed" else round(done / total, 4) if total else 0.0
+    out["resumable"] = job.get("status") == "failed" or (job.get("status") == "running" and is_stale(job))
+    for field in ("createdAt", "startedAt", "finishedAt"):
+        if job.get(field):
+            out[field] = job[field].isoformat()
+    return out
+
+
+def configure_company_job_routes(app, firestore_db):
+
+    @app.route("/api/companies/<company_id>/cascade", methods=["POST"])
+    def start_company_cascade(company_id):
+        try:
+            user = current_user(firestore_db)
+            if not is_admin(user):
+                return jsonify({"error": "Admin only"}), 403
+            mode = (request.get_json(silent=True) or {}).get("mode", "delete")
+            if mode not in MODES:
+                return jsonify({"error": f"mode must be one of {', '.join(MODES)}"}), 400
+
+            company = firestore_db.collection("companies").document(company_id).get()
+            if not company.exists:
+                return jsonify({"error": "Company not found"}), 404
+            open_jobs = (
+                firestore_db.collection(JOB_COLLECTION)
+                .where("companyId", "==", company_id)
+                .where("status", "in", ["queued", "running", "failed"])
+                .limit(1)
+                .stream()
+            )
+            for snap in open_jobs:
+                return jsonify({"error": "An unfinished job exists for this company", "job": serialize_job(snap.id, snap.to_dict())}), 409
+
+            ref = firestore_db.collection(JOB_COLLECTION).document()
+            job = {
+                "companyId": company_id,
+                "companyName": (company.to_dict() or {}).get("name", ""),
+                "mode": mode,
+                "status": "queued",
+                "phase": None,
+                "checkpoint": None,
+                "counts": {},
+                "totals": count_related(firestore_db, company_id),
+                "failed": 0,
+                "failedIds": [],
+                "createdBy": user["uid"],
+                "createdAt": _now(),
+            }
+            ref.set(job)
+            start_job(firestore_db, ref.id)
+            log.info("Company %s job %s queued", mode, ref.id,
+                     extra={"fields": {"companyId": company_id, "totals": job["totals"]}})
+            return jsonify(serialize_job(ref.id, job)), 202
+
+        except Exception as e:
+            log.exception("Company cascade failed to start")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/company-jobs/<job_id>", methods=["GET"])
+    def get_company_job(job_id):
+        try:
+            if not is_admin(current_user(firestore_db)):
+                return jsonify({"error": "Admin only"}), 403
+            snap = firestore_db.collection(JOB_COLLECTION).document(job_id).get()
+            if not snap.exists:
+                return jsonify({"error": "Job not found"}), 404
+            return jsonify(serialize_job(snap.id, snap.to_dict()))
+        except Exception as e:
+            log.exception("Company job lookup failed")
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/company-jobs/<job_id>/resume", methods=["POST"])
+    def resume_company_job(job_id):
+        try:
+            if not is_admin(current_user(firestore_db)):
+                return jsonify({"error": "Admin only"}), 403
+            snap = firestore_db.collection(JOB_COLLECTION).document(job_id).get()
+            if not snap.exists:
+                return jsonify({"error": "Job not found"}), 404
+            job = serialize_job(snap.id, snap.to_dict())
+            if job["status"] == "completed":
+                return jsonify({"error": "Job already completed", "job": job}), 409
+            if job["status"] == "running" and not job["resumable"]:
+                return jsonify({"error": "Job is still running", "job": job}), 409
+            start_job(firestore_db, job_id)
+            return jsonify(job), 202
+        except Exception as e:
+            log.exception("Company job resume failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,126 @@
+from flask import jsonify, request
+
+from auth import current_user, is_admin
+from check_fields import amount_cents, as_datetime, check_status
+from check_projections import delete_collection, register
+from log import get_logger
+from metrics import stage
+from weeks import check_week_key
+
+log = get_logger("dashboard")
+
+# --- Dashboard summary
+# dashboard/summary holds running counters maintained by the "dashboard"
+# check projection:
+#   totals                  {count, amountCents}
+#   byCompany.<companyId>   {count, amountCents}
+#   byWeek.<weekKey>        {count, amountCents}
+#   byStatus.<status>       {count, amountCents}   pending / reviewed / paid
+# GET /api/dashboard/summary reads that one document, the company names and
+# the most recent checks (an indexed date-ordered query with a limit), so its
+# cost doesn't grow with the size of the checks collection.
+SUMMARY_COLLECTION = "dashboard"
+SUMMARY_DOC = "summary"
+RECENT_LIMIT = 6
+MAX_RECENT_LIMIT = 50
+RECENT_FIELDS = ["checkNumber", "employeeName", "companyId", "amount", "date", "reviewed", "paid"]
+
+
+def dashboard_contribution(check):
+    return {
+        "companyId": check.get("companyId") or "unassigned",
+        "week": check_week_key(check) or "undated",
+        "status": check_status(check),
+        "cents": amount_cents(check.get("amount")),
+    }
+
+
+def apply_dashboard(deltas, contribution, sign):
+    for path in (
+        ("totals",),
+        ("byCompany", contribution["companyId"]),
+        ("byWeek", contribution["week"]),
+        ("byStatus", contribution["status"]),
+    ):
+        deltas.increment(SUMMARY_COLLECTION, SUMMARY_DOC, path + ("count",), sign)
+        deltas.increment(SUMMARY_COLLECTION, SUMMARY_DOC, path + ("amountCents",), sign * contribution["cents"])
+
+
+def reset_dashboard(firestore_db):
+    delete_collection(firestore_db, SUMMARY_COLLECTION)
+
+
+register("dashboard", dashboard_contribution, apply_dashboard, reset_dashboard)
+
+
+def _bucket(counter):
+    counter = counter or {}
+    return {
+        "count": int(counter.get("count", 0)),
+        "amount": round(counter.get("amountCents", 0) / 100, 2),
+    }
+
+
+def configure_dashboard_routes(app, firestore_db):
+
+    @app.route("/api/dashboard/summary", methods=["GET"])
+    def dashboard_summary():
+        try:
+            if not is_admin(current_user(firestore_db)):
+                return jsonify({"error": "Admin only"}), 403
+            recent_limit = min(int(request.args.get("recent", RECENT_LIMIT)), MAX_RECENT_LIMIT)
+
+            with stage("firestore_query"):
+                summary_doc = firestore_db.collection(SUMMARY_COLLECTION).document(SUMMARY_DOC).get()
+                summary = summary_doc.to_dict() if summary_doc.exists else {}
+                recent = list(
+                    firestore_db.collection("checks")
+                    .order_by("date", direction="DESCENDING")
+                    .limit(recent_limit)
+                    .select(RECENT_FIELDS)
+                    .stream()
+                )
+            with stage("reference_lookup"):
+                company_names = {
+                    snap.id: (snap.to_dict() or {}).get("name", "")
+                    for snap in firestore_db.collection("companies").select(["name"]).stream()
+                }
+
+            by_company = [
+                dict(_bucket(counter), companyId=company_id, companyName=company_names.get(company_id, ""))
+                for company_id, counter in (summary.get("byCompany") or {}).items()
+            ]
+            by_company.sort(key=lambda row: row["amount"], reverse=True)
+            by_week = [
+                dict(_bucket(counter), weekKey=week)
+                for week, counter in sorted((summary.get("byWeek") or {}).items(), reverse=True)
+            ]
+            recent_checks = []
+            for snap in recent:
+                d = snap.to_dict()
+                date = as_datetime(d.get("date"))
+                recent_checks.append({
+                    "id": snap.id,
+                    "checkNumber": d.get("checkNumber"),
+                    "employeeName": d.get("employeeName", ""),
+                    "companyId": d.get("companyId"),
+                    "companyName": company_names.get(d.get("companyId"), ""),
+                    "amount": d.get("amount"),
+                    "date": date.isoformat() if date else None,
+                    "status": check_status(d),
+                })
+
+            return jsonify({
+                "totals": _bucket(summary.get("totals")),
+                "byCompany": by_company,
+                "byWeek": by_week,
+                "byStatus": {
+                    status: _bucket((summary.get("byStatus") or {}).get(status))
+                    for status in ("pending", "reviewed", "paid")
+                },
+                "recentChecks": recent_checks,
+            })
+
+        except Exception as e:
+            log.exception("Dashboard summary failed")
+            return jsonify({"error": str(e)}), 500
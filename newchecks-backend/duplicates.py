@@ -0,0 +1,194 @@
+import hashlib
+from flask import jsonify, request
+
+from auth import can_access_company, current_user
+from bulk_query import IN_QUERY_PARALLELISM
+from check_fields import amount_cents
+from check_projections import delete_collection, register
+from firestore_accounting import stream_concurrently
+from log import get_logger
+from metrics import stage
+from weeks import check_week_key, week_rule_for
+
+log = get_logger("duplicates")
+
+# --- Duplicate-check index
+# Maintained by the "checkKeys" check projection: one document per
+# (companyId, employeeId, week, relationship set) in
+# checkKeys/{sha1 of the key}:
+#   companyId, employeeId, weekKey, relationships
+#   count, amountCents
+# The relationship set is the sorted ids in relationshipDetails, or the
+# clientId for single-client checks (including React checks whose one
+# relationship is {id: 'default'}). A key with count > 1 is a likely
+# duplicate; amountCents / count tells whether the amounts agree.
+#
+# POST /api/checks/batch_create looks up the keys of a whole batch with one
+# get_all (see find_duplicates) and flags or rejects the matches.
+# GET /api/checks/duplicates?companyId=&startWeek=&endWeek= lists the keys
+# with count > 1 and the checks behind them, newest week first. The week
+# range and the count are both filtered in Firestore (the checkKeys
+# companyId + weekKey + count index), so MAX_SCAN_KEYS applies to the
+# requested weeks only.
+KEY_COLLECTION = "checkKeys"
+DUPLICATE_MODES = ("flag", "reject", "allow")
+MAX_SCAN_KEYS = 200
+
+
+def relationship_set(check):
+    relationships = check.get("relationshipDetails") or []
+    keys = set()
+    for rel in relationships:
+        # Single-client React checks all carry {id: 'default'}; those are
+        # told apart by client
+        if len(relationships) == 1 or rel.get("id") == "default":
+            client_id = rel.get("clientId") or check.get("clientId")
+            if client_id:
+                keys.add(f"client:{client_id}")
+        elif rel.get("id"):
+            keys.add(rel["id"])
+    if keys:
+        return sorted(keys)
+    return [f"client:{check['clientId']}"] if check.get("clientId") else []
+
+
+def duplicate_key(check):
+    # (doc id, key fields) or None when the check can't be keyed
+    company_id = check.get("companyId")
+    employee_id = check.get("employeeId")
+    week = check_week_key(check)
+    if not company_id or not employee_id or not week:
+        return None
+    relationships = relationship_set(check)
+    raw = "|".join([company_id, employee_id, week, ",".join(relationships)])
+    fields = {"companyId": company_id, "employeeId": employee_id, "weekKey": week, "relationships": relationships}
+    return hashlib.sha1(raw.encode()).hexdigest(), fields
+
+
+def key_contribution(check):
+    keyed = duplicate_key(check)
+    if keyed is None:
+        return None
+    doc_id, fields = keyed
+    return dict(fields, key=doc_id, cents=amount_cents(check.get("amount")))
+
+
+def apply_key(deltas, contribution, sign):
+    doc_id = contribution["key"]
+    for field in ("companyId", "employeeId", "weekKey", "relationships"):
+        deltas.put(KEY_COLLECTION, doc_id, field, contribution[field])
+    deltas.increment(KEY_COLLECTION, doc_id, ("count",), sign)
+    deltas.increment(KEY_COLLECTION, doc_id, ("amountCents",), sign * contribution["cents"])
+
+
+def reset_keys(firestore_db):
+    delete_collection(firestore_db, KEY_COLLECTION)
+
+
+register("checkKeys", key_contribution, apply_key, reset_keys)
+
+
+def find_duplicates(firestore_db, checks):
+    # {index in checks: {"existing": n, "existingAmount": avg, "sameAmount": bool,
+    #                    "inBatch": [other indexes]}} for every likely duplicate
+    keys = [duplicate_key(check) for check in checks]
+    ids = list(dict.fromkeys(k[0] for k in keys if k))
+    refs = [firestore_db.collection(KEY_COLLECTION).document(i) for i in ids]
+    existing = {
+        snap.id: snap.to_dict() or {}
+        for snap in (firestore_db.get_all(refs, field_paths=["count", "amountCents"]) if refs else [])
+        if snap.exists
+    }
+    by_key = {}
+    for index, keyed in enumerate(keys):
+        if keyed:
+            by_key.setdefault(keyed[0], []).append(index)
+
+    found = {}
+    for index, keyed in enumerate(keys):
+        if not keyed:
+            continue
+        known = existing.get(keyed[0]) or {}
+        count = int(known.get("count") or 0)
+        siblings = [i for i in by_key[keyed[0]] if i != index]
+        if not count and not siblings:
+            continue
+        cents = amount_cents(checks[index].get("amount"))
+        average = round(known.get("amountCents", 0) / count) if count else None
+        found[index] = {
+            "existing": count,
+            "existingAmount": round(average / 100, 2) if average is not None else None,
+            "sameAmount": average == cents if average is not None else None,
+            "inBatch": siblings,
+        }
+    return found
+
+
+def configure_duplicate_routes(app, firestore_db):
+
+    @app.route("/api/checks/duplicates", methods=["GET"])
+    def scan_duplicates():
+        try:
+            company_id = request.args.get("companyId")
+            if not company_id:
+                return jsonify({"error": "companyId is required"}), 400
+            if not can_access_company(current_user(firestore_db), company_id):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            rule = week_rule_for(firestore_db, company_id)
+            try:
+                start_week = rule.normalize(request.args["startWeek"]) if request.args.get("startWeek") else None
+                end_week = rule.normalize(request.args["endWeek"]) if request.args.get("endWeek") else None
+            except ValueError:
+                return jsonify({"error": "startWeek and endWeek must be in format YYYY-MM-DD"}), 400
+
+            query = firestore_db.collection(KEY_COLLECTION).where("companyId", "==", company_id)
+            if start_week:
+                query = query.where("weekKey", ">=", start_week)
+            if end_week:
+                query = query.where("weekKey", "<=", end_week)
+            query = (
+                query.where("count", ">", 1)
+                .order_by("weekKey", direction="DESCENDING")
+                .order_by("count", direction="DESCENDING")
+                .limit(MAX_SCAN_KEYS)
+            )
+            with stage("firestore_query"):
+                keys = [(snap.id, snap.to_dict() or {}) for snap in query.stream()]
+            truncated = len(keys) >= MAX_SCAN_KEYS
+
+            queries = []
+            for _key_id, key in keys:
+                start, end = rule.bounds(key["weekKey"])
+                queries.append(
+                    firestore_db.collection("checks")
+                    .where("companyId", "==", company_id)
+                    .where("employeeId", "==", key["employeeId"])
+                    .where("date", ">=", start)
+                    .where("date", "<", end)
+                    .select(["checkNumber", "amount", "date", "employeeName", "clientId", "relationshipDetails"])
+                )
+            with stage("reference_lookup"):
+                results = stream_concurrently(queries, IN_QUERY_PARALLELISM) if queries else []
+
+            groups = []
+            for (key_id, key), snapshots in zip(keys, results):
+                checks = [(s.id, s.to_dict() or {}) for s in snapshots]
+                matching = [(i, c) for i, c in checks if relationship_set(c) == key.get("relationships")]
+                groups.append({
+                    "key": key_id,
+                    "employeeId": key.get("employeeId"),
+                    "weekKey": key.get("weekKey"),
+                    "relationships": key.get("relationships"),
+                    "count": int(key.get("count") or 0),
+                    "amount": round((key.get("amountCents") or 0) / 100, 2),
+                    "checks": [
+                        {"id": i, "checkNumber": c.get("checkNumber"), "employeeName": c.get("employeeName"),
+                         "amount": c.get("amount")}
+                        for i, c in matching
+                    ],
+                })
+            return jsonify({"companyId": company_id, "groups": groups, "truncated": truncated})
+
+        except Exception as e:
+            log.exception("Duplicate scan failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,148 @@
+from flask import jsonify, request
+
+from auth import current_user, is_admin
+from bulk_query import IN_CHUNK_SIZE, IN_QUERY_PARALLELISM, chunked, merge_sorted
+from check_fields import amount_cents
+from checks import InvalidCursor, cursor_state, decode_cursor, encode_cursor, serialize_check, week_range
+from firestore_accounting import stream_concurrently
+from log import get_logger
+from metrics import observe_checks, stage
+from weeks import week_rule_for
+
+log = get_logger("employees")
+
+# --- An employee's checks
+# GET /api/employees/<employeeId>/checks?startWeek=&endWeek=&pageSize=&cursor=
+#
+# Newest first. Non-admins only get checks of their own companyIds: the
+# filter is employeeId == X, companyId in [their companies] ordered by date
+# (the employeeId + companyId + date index), one query per IN_CHUNK_SIZE
+# companies, merged. Admins get every check of the employee (employeeId +
+# date index).
+#
+# Each page carries:
+#   totals          count and amount of every matching check; the amounts
+#                   are streamed with a field projection and reduced with
+#                   amount_cents like the page, since sum("amount") skips
+#                   the string amounts the React app writes
+#   pageTotals      count and amount of this page
+#   runningTotals   count and amount from the first check through this page;
+#                   each check also has runningCount / runningAmount
+# The running figures travel in the cursor, so page N doesn't re-read 1..N-1.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+ORDER_BY = "date"
+
+
+def _amounts(snaps):
+    count, cents = 0, 0
+    for snap in snaps:
+        count += 1
+        cents += amount_cents((snap.to_dict() or {}).get("amount"))
+    return count, cents
+
+
+def _dollars(count, cents):
+    return {"count": count, "amount": round(cents / 100, 2)}
+
+
+def employee_check_queries(firestore_db, employee_id, company_ids, start, end):
+    # company_ids None means every company (admins)
+    base = firestore_db.collection("checks").where("employeeId", "==", employee_id)
+    if start:
+        base = base.where("date", ">=", start)
+    if end:
+        base = base.where("date", "<", end)
+    if company_ids is None:
+        return [base]
+    return [base.where("companyId", "in", chunk) for chunk in chunked(sorted(company_ids), IN_CHUNK_SIZE)]
+
+
+def configure_employee_routes(app, firestore_db):
+
+    @app.route("/api/employees/<employee_id>/checks", methods=["GET"])
+    def employee_checks(employee_id):
+        try:
+            user = current_user(firestore_db)
+            if not user:
+                return jsonify({"error": "Sign-in required"}), 401
+            args = request.args
+            try:
+                page_size = min(max(int(args.get("pageSize", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+            except ValueError:
+                return jsonify({"error": "pageSize must be a number"}), 400
+
+            with stage("reference_lookup"):
+                emp_doc = firestore_db.collection("employees").document(employee_id).get()
+            if not emp_doc.exists:
+                return jsonify({"error": "Employee not found"}), 404
+            employee = emp_doc.to_dict() or {}
+            try:
+                # Weeks follow the rule of the employee's company
+                rule = week_rule_for(firestore_db, employee.get("companyId"))
+                start, end = week_range(args.get("startWeek"), args.get("endWeek"), rule)
+            except ValueError:
+                return jsonify({"error": "startWeek and endWeek must be in format YYYY-MM-DD"}), 400
+
+            company_ids = None
+            if not is_admin(user):
+                company_ids = set(user.get("companyIds") or [])
+                employee_companies = {employee.get("companyId"), *(employee.get("companyIds") or [])}
+                if not company_ids & employee_companies:
+                    return jsonify({"error": "Not allowed for this employee"}), 403
+
+            queries = employee_check_queries(firestore_db, employee_id, company_ids, start, end)
+            ordered = [q.order_by(ORDER_BY, direction="DESCENDING").order_by("__name__", direction="DESCENDING")
+                       for q in queries]
+            running_count, running_cents = 0, 0
+            if args.get("cursor"):
+                try:
+                    value, doc_id = decode_cursor(args["cursor"], ORDER_BY)
+                    state = cursor_state(args["cursor"], ORDER_BY)
+                    running_count, running_cents = int(state.get("count", 0)), int(state.get("cents", 0))
+                except InvalidCursor as e:
+                    return jsonify({"error": str(e)}), 400
+                except (TypeError, ValueError):
+                    return jsonify({"error": "Invalid cursor"}), 400
+                ordered = [q.start_after({ORDER_BY: value, "__name__": doc_id}) for q in ordered]
+
+            with stage("firestore_query"):
+                pages = [q.limit(page_size + 1) for q in ordered]
+                amounts = [q.select(["amount"]) for q in queries]
+                results = stream_concurrently(pages + amounts, IN_QUERY_PARALLELISM)
+                merged = list(merge_sorted(results[:len(pages)], ORDER_BY, True))
+                total_count, total_cents = _amounts(snap for snaps in results[len(pages):] for snap in snaps)
+
+            page = merged[:page_size]
+            checks = []
+            page_cents = 0
+            for snap in page:
+                data = snap.to_dict() or {}
+                cents = amount_cents(data.get("amount"))
+                page_cents += cents
+                running_count += 1
+                running_cents += cents
+                out = serialize_check(snap.id, data)
+                out["runningCount"] = running_count
+                out["runningAmount"] = round(running_cents / 100, 2)
+                checks.append(out)
+            observe_checks(len(checks))
+
+            next_cursor = None
+            if len(merged) > page_size:
+                last = page[-1]
+                next_cursor = encode_cursor(ORDER_BY, last.get(ORDER_BY), last.id,
+                                            state={"count": running_count, "cents": running_cents})
+            return jsonify({
+                "employeeId": employee_id,
+                "employeeName": employee.get("name", ""),
+                "checks": checks,
+                "totals": _dollars(total_count, total_cents),
+                "pageTotals": _dollars(len(checks), page_cents),
+                "runningTotals": _dollars(running_count, running_cents),
+                "nextCursor": next_cursor,
+            })
+
+        except Exception as e:
+            log.exception("Employee checks failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,268 @@
+import datetime
+import os
+
+from flask import g, has_request_context, jsonify
+
+from log import get_logger
+from metrics import current_route, observe_firestore_usage
+
+log = get_logger("firestore_accounting")
+
+# --- Firestore read accounting
+# AccountingClient wraps the firestore client handed to configure_routes and
+# counts, for the current request, billed document reads, queries, round
+# trips and (estimated) bytes returned. The totals are sent back as
+# X-Firestore-* response headers and exported through /metrics per route.
+#
+# FIRESTORE_READ_BUDGET caps the reads of a single request (0 = no cap).
+# FIRESTORE_READ_BUDGET_MODE decides what happens when a request goes over:
+#   "log"    - log a warning once and carry on (default)
+#   "reject" - stop the request and answer 429
+READ_BUDGET = int(os.environ.get("FIRESTORE_READ_BUDGET", "0"))
+BUDGET_MODE = os.environ.get("FIRESTORE_READ_BUDGET_MODE", "log")
+
+USAGE_HEADERS = {
+    "reads": "X-Firestore-Reads",
+    "queries": "X-Firestore-Queries",
+    "round_trips": "X-Firestore-Round-Trips",
+    "bytes": "X-Firestore-Bytes",
+}
+
+# Firestore storage-size rules: https://firebase.google.com/docs/firestore/storage-size
+DOCUMENT_OVERHEAD_BYTES = 32
+
+
+class ReadBudgetExceeded(Exception):
+    def __init__(self, reads, budget):
+        super().__init__(f"Firestore read budget exceeded: {reads} reads (budget {budget})")
+        self.reads = reads
+        self.budget = budget
+
+
+def _usage():
+    if not has_request_context():
+        return None
+    if "firestore_usage" not in g:
+        g.firestore_usage = {
+            "reads": 0, "queries": 0, "round_trips": 0, "bytes": 0,
+            "over_budget": False, "rejected": False,
+        }
+    return g.firestore_usage
+
+
+def _record(reads=0, queries=0, round_trips=0, size=0):
+    usage = _usage()
+    if usage is None:
+        return
+    usage["reads"] += reads
+    usage["queries"] += queries
+    usage["round_trips"] += round_trips
+    usage["bytes"] += size
+
+    if READ_BUDGET and usage["reads"] > READ_BUDGET and not usage["over_budget"]:
+        usage["over_budget"] = True
+        log.warning(
+            "Firestore read budget exceeded on %s: %d reads (budget %d)",
+            current_route(), usage["reads"], READ_BUDGET,
+        )
+        if BUDGET_MODE == "reject":
+            usage["rejected"] = True
+            raise ReadBudgetExceeded(usage["reads"], READ_BUDGET)
+
+
+def _value_size(value):
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime.datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(k) + 1 + _value_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_value_size(v) for v in value)
+    # GeoPoint, DocumentReference, ...
+    return 16
+
+
+def _snapshot_size(snapshot):
+    # _data avoids the deep copy that to_dict() makes
+    data = getattr(snapshot, "_data", None)
+    if data is None:
+        data = snapshot.to_dict() or {}
+    return DOCUMENT_OVERHEAD_BYTES + len(snapshot.id) + _value_size(data)
+
+
+def _count_snapshots(snapshots):
+    # A query returning nothing is still billed one read
+    returned = 0
+    for snapshot in snapshots:
+        returned += 1
+        _record(reads=1, size=_snapshot_size(snapshot) if snapshot.exists else 0)
+        yield snapshot
+    if returned == 0:
+        _record(reads=1)
+
+
+def unwrap(obj):
+    return obj._target if isinstance(obj, _Accounted) else obj
+
+
+def _wrap(result):
+    from google.cloud.firestore_v1.base_aggregation import BaseAggregationQuery
+    from google.cloud.firestore_v1.base_collection import BaseCollectionReference
+    from google.cloud.firestore_v1.base_document import BaseDocumentReference
+    from google.cloud.firestore_v1.base_query import BaseQuery
+
+    if isinstance(result, BaseCollectionReference):
+        return AccountingCollection(result)
+    if isinstance(result, BaseQuery):
+        return AccountingQuery(result)
+    if isinstance(result, BaseDocumentReference):
+        return AccountingDocument(result)
+    if isinstance(result, BaseAggregationQuery):
+        return AccountingAggregation(result)
+    return result
+
+
+class _Accounted:
+    # Delegates everything to the wrapped object and re-wraps any reference,
+    # query or aggregation it hands back, so chained calls stay accounted.
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return _wrap(attr(*[unwrap(a) for a in args], **kwargs))
+        return call
+
+    def __eq__(self, other):
+        return self._target == unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+
+class AccountingQuery(_Accounted):
+
+    def stream(self, *args, **kwargs):
+        _record(queries=1, round_trips=1)
+        return _count_snapshots(self._target.stream(*args, **kwargs))
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class AccountingCollection(AccountingQuery):
+    pass
+
+
+class AccountingAggregation(_Accounted):
+    # count()/sum()/avg() are billed one read per batch of up to 1000 index entries;
+    # we record the minimum of one read per aggregation.
+
+    def get(self, *args, **kwargs):
+        _record(reads=1, queries=1, round_trips=1)
+        return self._target.get(*args, **kwargs)
+
+    def stream(self, *args, **kwargs):
+        _record(reads=1, queries=1, round_trips=1)
+        return self._target.stream(*args, **kwargs)
+
+
+class AccountingDocument(_Accounted):
+
+    def get(self, *args, **kwargs):
+        _record(round_trips=1)
+        snapshot = self._target.get(*args, **kwargs)
+        _record(reads=1, size=_snapshot_size(snapshot) if snapshot.exists else 0)
+        return snapshot
+
+
+class AccountingTransaction(_Accounted):
+    # Transactions and batches check argument types, so refs are unwrapped by
+    # _Accounted; reads made inside a transaction are counted here.
+
+    def get(self, ref_or_query, *args, **kwargs):
+        target = unwrap(ref_or_query)
+        if isinstance(ref_or_query, AccountingDocument):
+            _record(round_trips=1)
+            snapshot = self._target.get(target, *args, **kwargs)
+            # Transaction.get on a document returns a snapshot on recent clients,
+            # a one-item generator on older ones; always hand back the snapshot
+            if not hasattr(snapshot, "exists"):
+                snapshot = next(iter(snapshot))
+            _record(reads=1, size=_snapshot_size(snapshot) if snapshot.exists else 0)
+            return snapshot
+        _record(queries=1, round_trips=1)
+        return _count_snapshots(self._target.get(target, *args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        _record(round_trips=1)
+        return _count_snapshots(self._target.get_all([unwrap(r) for r in references], *args, **kwargs))
+
+
+class AccountingClient(_Accounted):
+
+    def get_all(self, references, *args, **kwargs):
+        _record(round_trips=1)
+        return _count_snapshots(self._target.get_all([unwrap(r) for r in references], *args, **kwargs))
+
+    def transaction(self, *args, **kwargs):
+        return AccountingTransaction(self._target.transaction(*args, **kwargs))
+
+    # Writes aren't metered, but batches need raw references
+    def batch(self, *args, **kwargs):
+        return _Accounted(self._target.batch(*args, **kwargs))
+
+    def bulk_writer(self, *args, **kwargs):
+        return _Accounted(self._target.bulk_writer(*args, **kwargs))
+
+
+def stream_concurrently(queries, max_workers):
+    # Runs the queries on a thread pool and returns their results in order.
+    # Worker threads have no request context, so they stream the raw queries
+    # and the reads are recorded here, against the calling request.
+    from concurrent.futures import ThreadPoolExecutor
+
+    for _ in queries:
+        _record(queries=1, round_trips=1)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(queries) or 1))) as pool:
+        results = list(pool.map(lambda q: list(unwrap(q).stream()), queries))
+    return [list(_count_snapshots(snapshots)) for snapshots in results]
+
+
+def configure_firestore_accounting(app):
+
+    @app.after_request
+    def _report_firestore_usage(response):
+        usage = g.get("firestore_usage")
+        if usage is None:
+            return response
+        if usage["rejected"]:
+            # The route may have swallowed ReadBudgetExceeded in a broad except
+            response = jsonify({
+                "error": "Firestore read budget exceeded",
+                "reads": usage["reads"],
+                "budget": READ_BUDGET,
+            })
+            response.status_code = 429
+        for kind, header in USAGE_HEADERS.items():
+            response.headers[header] = str(usage[kind])
+        exposed = response.headers.get("Access-Control-Expose-Headers")
+        response.headers["Access-Control-Expose-Headers"] = ", ".join(
+            filter(None, [exposed, *USAGE_HEADERS.values()])
+        )
+        observe_firestore_usage(current_route(), usage)
+        return response
+
+    @app.errorhandler(ReadBudgetExceeded)
+    def _read_budget_exceeded(e):
+        return jsonify({"error": str(e), "reads": e.reads, "budget": e.budget}), 429
@@ -0,0 +1,207 @@
+from datetime import datetime
+
+from flask import jsonify, request
+
+from auth import can_access_company, current_user
+from check_fields import PAY_KINDS, amount_cents, as_datetime, as_utc, hours_by_client, pay_cents_by_client
+from check_projections import delete_collection, register
+from log import get_logger
+from metrics import stage
+
+log = get_logger("ledgers")
+
+# --- Year-to-date earnings ledgers
+# One document per (employee, calendar year) in
+# employeeLedgers/{employeeId}_{year}, maintained by the "employeeLedgers"
+# check projection:
+#   employeeId, companyId, year
+#   count, grossCents, hourlyCents, overtimeCents, holidayCents, perdiemCents
+#   hours, overtimeHours, holidayHours
+#   byClient.<clientId> {count, grossCents, <kind>Cents, hours, ...}
+#   byDay.<YYYY-MM-DD>  {count, grossCents, <kind>Cents, hours, ...}
+# The print routes fetch the ledgers of a whole job with one get_all
+# (attach_ytd) so the stub can print YTD figures without querying per check.
+# A stub shows the year to date as of its own check's date (the byDay
+# counters up to that day), so reprinting an old check doesn't include
+# later earnings. Per-client pay and hours come from check_fields, which
+# reads single-client React checks (one 'default' relationship) from the
+# check-level fields. Ledgers written before byDay existed, or before that
+# fallback, need `flask --app app rebuild-projection employeeLedgers`.
+LEDGER_COLLECTION = "employeeLedgers"
+HOUR_FIELDS = ("hours", "overtimeHours", "holidayHours")
+
+
+def ledger_id(employee_id, year):
+    return f"{employee_id}_{year}"
+
+
+def check_year(check):
+    date = as_utc(as_datetime(check.get("date")))
+    return date.year if date else None
+
+
+def check_day(check):
+    date = as_utc(as_datetime(check.get("date")))
+    return date.date().isoformat() if date else None
+
+
+def ledger_id_for(check):
+    employee_id = check.get("employeeId")
+    year = check_year(check)
+    if not employee_id or not year:
+        return None
+    return ledger_id(employee_id, year)
+
+
+def ledger_contribution(check):
+    employee_id = check.get("employeeId")
+    year = check_year(check)
+    if not employee_id or not year:
+        return None
+    cents = amount_cents(check.get("amount"))
+    pay = pay_cents_by_client(check)
+    hours = hours_by_client(check)
+    clients = {}
+    for client_id, parts in pay.items():
+        client = dict(parts, grossCents=cents if len(pay) == 1 else sum(parts.values()))
+        client.update({field: round(value, 4) for field, value in hours[client_id].items()})
+        clients[client_id] = client
+    contribution = {
+        "employeeId": employee_id,
+        "companyId": check.get("companyId"),
+        "year": year,
+        "day": check_day(check),
+        "grossCents": cents,
+        "clients": clients,
+    }
+    for kind in PAY_KINDS:
+        contribution[f"{kind}Cents"] = sum(parts[kind] for parts in pay.values())
+    for field in HOUR_FIELDS:
+        contribution[field] = round(sum(h[field] for h in hours.values()), 4)
+    return contribution
+
+
+def apply_ledger(deltas, contribution, sign):
+    doc_id = ledger_id(contribution["employeeId"], contribution["year"])
+
+    def add(path, value):
+        deltas.increment(LEDGER_COLLECTION, doc_id, path, sign * value)
+
+    deltas.put(LEDGER_COLLECTION, doc_id, "employeeId", contribution["employeeId"])
+    deltas.put(LEDGER_COLLECTION, doc_id, "year", contribution["year"])
+    if contribution["companyId"]:
+        deltas.put(LEDGER_COLLECTION, doc_id, "companyId", contribution["companyId"])
+    for prefix in ((), ("byDay", contribution["day"])):
+        add(prefix + ("count",), 1)
+        add(prefix + ("grossCents",), contribution["grossCents"])
+        for kind in PAY_KINDS:
+            add(prefix + (f"{kind}Cents",), contribution[f"{kind}Cents"])
+        for field in HOUR_FIELDS:
+            add(prefix + (field,), contribution[field])
+    for client_id, parts in contribution["clients"].items():
+        add(("byClient", client_id, "count"), 1)
+        for field, value in parts.items():
+            if field in PAY_KINDS:
+                field = f"{field}Cents"
+            add(("byClient", client_id, field), value)
+
+
+def reset_ledgers(firestore_db):
+    delete_collection(firestore_db, LEDGER_COLLECTION)
+
+
+register("employeeLedgers", ledger_contribution, apply_ledger, reset_ledgers)
+
+
+def ledger_totals(ledger):
+    ledger = ledger or {}
+    row = {
+        "count": int(ledger.get("count", 0)),
+        "gross": round(ledger.get("grossCents", 0) / 100, 2),
+    }
+    for kind in PAY_KINDS:
+        row[kind] = round(ledger.get(f"{kind}Cents", 0) / 100, 2)
+    for field in HOUR_FIELDS:
+        row[field] = round(ledger.get(field, 0), 2)
+    return row
+
+
+def ledger_as_of(ledger, day):
+    # The ledger's counters summed over its days up to and including `day`
+    totals = {}
+    for key, counter in ((ledger or {}).get("byDay") or {}).items():
+        if key <= day:
+            for field, value in counter.items():
+                totals[field] = totals.get(field, 0) + value
+    return totals
+
+
+def attach_ytd(firestore_db, check_docs, check_objects):
+    # Sets check.ytd (totals as of the check's date + year) on each check
+    # object for the stub
+    checks = [doc.to_dict() or {} for doc in check_docs]
+    keys = [ledger_id_for(check) for check in checks]
+    refs = [firestore_db.collection(LEDGER_COLLECTION).document(k) for k in dict.fromkeys(k for k in keys if k)]
+    ledgers = {snap.id: snap.to_dict() for snap in firestore_db.get_all(refs) if snap.exists} if refs else {}
+    for key, data, check in zip(keys, checks, check_objects):
+        ledger = ledgers.get(key)
+        if ledger and "byDay" not in ledger:
+            log.warning("Ledger %s has no byDay counters; rebuild employeeLedgers", key)
+            ledger = None
+        if ledger is None:
+            check.ytd = None
+        else:
+            check.ytd = dict(ledger_totals(ledger_as_of(ledger, check_day(data))), year=ledger.get("year"))
+
+
+def configure_ledger_routes(app, firestore_db):
+
+    # GET /api/employees/<employeeId>/ytd?year=YYYY
+    @app.route("/api/employees/<employee_id>/ytd", methods=["GET"])
+    def employee_ytd(employee_id):
+        try:
+            try:
+                year = int(request.args.get("year") or datetime.utcnow().year)
+            except ValueError:
+                return jsonify({"error": "year must be a number"}), 400
+
+            with stage("firestore_query"):
+                snap = firestore_db.collection(LEDGER_COLLECTION).document(ledger_id(employee_id, year)).get()
+                ledger = snap.to_dict() if snap.exists else None
+            company_id = (ledger or {}).get("companyId")
+            if company_id is None:
+                with stage("reference_lookup"):
+                    emp_doc = firestore_db.collection("employees").document(employee_id).get()
+                if not emp_doc.exists:
+                    return jsonify({"error": "Employee not found"}), 404
+                company_id = (emp_doc.to_dict() or {}).get("companyId")
+            if not can_access_company(current_user(firestore_db), company_id):
+                return jsonify({"error": "Not allowed for this company"}), 403
+
+            clients = (ledger or {}).get("byClient") or {}
+            client_ids = [c for c, counter in clients.items() if counter.get("count") and c != "unassigned"]
+            with stage("reference_lookup"):
+                refs = [firestore_db.collection("clients").document(c) for c in client_ids]
+                client_names = {
+                    s.id: (s.to_dict() or {}).get("name", "")
+                    for s in (firestore_db.get_all(refs, field_paths=["name"]) if refs else [])
+                    if s.exists
+                }
+
+            by_client = [
+                dict(ledger_totals(counter), clientId=client_id, clientName=client_names.get(client_id, ""))
+                for client_id, counter in clients.items()
+                if counter.get("count")
+            ]
+            by_client.sort(key=lambda row: row["gross"], reverse=True)
+            return jsonify({
+                "employeeId": employee_id,
+                "companyId": company_id,
+                "year": year,
+                "totals": ledger_totals(ledger),
+                "byClient": by_client,
+            })
+
+        except Exception as e:
+            log.exception("YTD request failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+# --- Structured logging
+# One JSON object per line on stdout:
+#   {"ts": ..., "level": "INFO", "logger": "newchecks.routes", "msg": ...,
+#    "request_id": "...", "route": "/api/print_week", ...extra fields}
+# LOG_LEVEL picks the level (default INFO). Per-check debug records are
+# sampled with LOG_CHECK_SAMPLE_RATE (0.0-1.0, default 1.0) once DEBUG is on.
+# Messages use %-style arguments so nothing is formatted unless emitted.
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+CHECK_SAMPLE_RATE = float(os.environ.get("LOG_CHECK_SAMPLE_RATE", "1.0"))
+REQUEST_ID_HEADER = "X-Request-ID"
+
+ROOT_LOGGER = "newchecks"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+            entry["route"] = record.route
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.route = request.url_rule.rule if request.url_rule is not None else request.path
+        return True
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def sample_check(logger):
+    # Decide once per check whether its debug records are written
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    return CHECK_SAMPLE_RATE >= 1.0 or random.random() < CHECK_SAMPLE_RATE
+
+
+def _setup_root():
+    root = logging.getLogger(ROOT_LOGGER)
+    if root.handlers:
+        return root
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    return root
+
+
+_setup_root()
+
+
+def configure_logging(app):
+
+    @app.before_request
+    def _assign_request_id():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+
+    @app.after_request
+    def _return_request_id(response):
+        if "request_id" in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
@@ -0,0 +1,154 @@
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# --- Prometheus metrics
+# When the app runs under several worker processes (gunicorn etc.) set
+# PROMETHEUS_MULTIPROC_DIR to an empty, writable directory shared by the
+# workers; every process then writes its samples there and /metrics
+# aggregates them. Without it the metrics are those of the current process.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+
+# Stages of a print request, in pipeline order
+STAGES = (
+    "firestore_query",
+    "reference_lookup",
+    "model_build",
+    "render",
+    "merge",
+    "response_write",
+)
+
+REQUEST_LATENCY = Histogram(
+    "newchecks_request_duration_seconds",
+    "End-to-end request latency",
+    ["route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "newchecks_stage_duration_seconds",
+    "Time spent in one stage of a request",
+    ["route", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+CHECKS_PER_REQUEST = Histogram(
+    "newchecks_checks_per_request",
+    "Number of checks rendered by a request",
+    ["route"],
+    buckets=COUNT_BUCKETS,
+)
+OUTPUT_BYTES = Histogram(
+    "newchecks_output_bytes",
+    "Size of the generated response body",
+    ["route"],
+    buckets=BYTES_BUCKETS,
+)
+FIRESTORE_OPERATIONS = Counter(
+    "newchecks_firestore_operations_total",
+    "Firestore usage by route; kind is reads, queries, round_trips or bytes",
+    ["route", "kind"],
+)
+FIRESTORE_READS_PER_REQUEST = Histogram(
+    "newchecks_firestore_reads_per_request",
+    "Billed Firestore document reads per request",
+    ["route"],
+    buckets=COUNT_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "newchecks_cache_lookups_total",
+    "Cache lookups by result; hit ratio = hit / (hit + miss)",
+    ["cache", "result"],
+)
+
+
+def current_route():
+    # Use the URL rule rather than the raw path so IDs don't explode label cardinality
+    if request and request.url_rule is not None:
+        return request.url_rule.rule
+    return "unmatched"
+
+
+@contextmanager
+def stage(name):
+    # Stages can be entered many times per request (once per check); the time
+    # is summed and observed once per request in the after_request hook.
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        totals = g.setdefault("metrics_stages", {})
+        totals[name] = totals.get(name, 0.0) + time.perf_counter() - start
+
+
+def observe_checks(count):
+    CHECKS_PER_REQUEST.labels(current_route()).observe(count)
+
+
+def observe_output(num_bytes):
+    OUTPUT_BYTES.labels(current_route()).observe(num_bytes)
+
+
+def observe_firestore_usage(route, usage):
+    for kind in ("reads", "queries", "round_trips", "bytes"):
+        if usage[kind]:
+            FIRESTORE_OPERATIONS.labels(route, kind).inc(usage[kind])
+    FIRESTORE_READS_PER_REQUEST.labels(route).observe(usage["reads"])
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def _collect():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def configure_metrics(app):
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, "metrics_start", None)
+        if start is None or request.path == "/metrics":
+            return response
+        route = current_route()
+        for name, seconds in g.get("metrics_stages", {}).items():
+            STAGE_DURATION.labels(route, name).observe(seconds)
+        REQUEST_LATENCY.labels(route, request.method, str(response.status_code)).observe(
+            time.perf_counter() - start
+        )
+        # Writing the body happens after this hook (send_file streams it);
+        # time it from here until the WSGI server closes the response.
+        write_start = time.perf_counter()
+        response.call_on_close(
+            lambda: STAGE_DURATION.labels(route, "response_write").observe(
+                time.perf_counter() - write_start
+            )
+        )
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(_collect(), mimetype=CONTENT_TYPE_LATEST)
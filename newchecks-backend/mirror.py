@@ -0,0 +1,272 @@
+import os
+import threading
+from datetime import datetime
+
+import click
+from flask import jsonify
+
+from auth import current_user, is_admin
+from bulk_query import json_value
+from check_fields import as_datetime, as_utc, to_number
+from extensions import db, migrate
+from log import get_logger
+from weeks import check_week_key
+
+log = get_logger("mirror")
+
+# --- Local SQLite read mirror
+# checks, employees, clients, companies and banks are copied into
+# instance/check_management.db (models.Mirror*) so reports, search and print
+# queries can run on indexed local SQL without per-read cost.
+#
+# Every row keeps the Firestore update_time it was copied at, and
+# mirror_sync_state keeps the newest update_time seen per collection (the
+# watermark). An upsert only touches a row when the incoming update_time is
+# newer, so replays and overlapping syncs are harmless.
+#
+# Firestore can't query by update_time, so catching up is a full stream of
+# the collection: `flask --app app mirror-sync` (cron it), or the snapshot
+# listeners (MIRROR_LISTENER=1, one process only), whose initial snapshot is
+# that catch-up and whose later events keep the mirror current.
+# GET /api/mirror/status reports how stale each table is.
+#
+# The tables are created by `flask --app app mirror-init` (run it once
+# before the first sync or listener start), never at app start.
+MIRROR_DATABASE_URI = os.environ.get("MIRROR_DATABASE_URI", "sqlite:///check_management.db")
+LISTENER_ENABLED = os.environ.get("MIRROR_LISTENER") == "1"
+
+_write_lock = threading.Lock()
+# Called as subscriber(collection, upserted, removed_ids, version) after each
+# commit, upserted being [(doc_id, data)] and version the collection's
+# mirror_sync_state.version after it; lets in-memory indexes follow the mirror
+_subscribers = []
+
+
+def subscribe(callback):
+    _subscribers.append(callback)
+
+
+def _publish(collection, version, upserted=(), removed=()):
+    for callback in _subscribers:
+        try:
+            callback(collection, list(upserted), list(removed), version)
+        except Exception:
+            log.exception("Mirror subscriber failed for %s", collection)
+
+
+def _check_columns(d):
+    date = as_utc(as_datetime(d.get("date")))
+    check_number = d.get("checkNumber")
+    return {
+        "company_id": d.get("companyId"),
+        "employee_id": d.get("employeeId"),
+        "client_id": d.get("clientId"),
+        "bank_id": d.get("bankId"),
+        "employee_name": d.get("employeeName"),
+        "check_number": int(to_number(check_number)) if check_number not in (None, "") else None,
+        "amount": to_number(d.get("amount")),
+        "date": date,
+        "week_key": check_week_key(d),
+        "reviewed": bool(d.get("reviewed")),
+        "paid": bool(d.get("paid")),
+        "created_by": d.get("createdBy"),
+    }
+
+
+def _named(d):
+    return {"name": d.get("name")}
+
+
+def _company_scoped(d):
+    company_id = d.get("companyId")
+    return {"name": d.get("name"), "company_id": company_id if isinstance(company_id, str) else None}
+
+
+def _bank_columns(d):
+    company_id = d.get("companyId")
+    return {
+        "company_id": company_id if isinstance(company_id, str) else None,
+        "bank_name": d.get("bankName"),
+        "next_check_number": int(to_number(d.get("nextCheckNumber"))) or None,
+    }
+
+
+def mirrored_collections():
+    from models import MirrorBank, MirrorCheck, MirrorClient, MirrorCompany, MirrorEmployee
+
+    return {
+        "checks": (MirrorCheck, _check_columns),
+        "employees": (MirrorEmployee, _company_scoped),
+        "clients": (MirrorClient, _named),
+        "companies": (MirrorCompany, _named),
+        "banks": (MirrorBank, _bank_columns),
+    }
+
+
+def _sync_state(collection):
+    from models import MirrorSyncState
+
+    state = db.session.get(MirrorSyncState, collection)
+    if state is None:
+        state = MirrorSyncState(collection=collection)
+        db.session.add(state)
+    return state
+
+
+def upsert_snapshots(collection, snapshots):
+    # Returns how many rows changed
+    model, columns = mirrored_collections()[collection]
+    changed = []
+    with _write_lock:
+        state = _sync_state(collection)
+        for snap in snapshots:
+            update_time = as_utc(as_datetime(snap.update_time))
+            row = db.session.get(model, snap.id)
+            if row is not None and row.update_time >= update_time:
+                continue
+            data = snap.to_dict() or {}
+            if row is None:
+                row = model(id=snap.id)
+                db.session.add(row)
+            row.data = json_value(data)
+            row.update_time = update_time
+            for column, value in columns(data).items():
+                setattr(row, column, value)
+            if state.watermark is None or update_time > state.watermark:
+                state.watermark = update_time
+            changed.append((snap.id, row.data))
+        state.last_event_at = datetime.utcnow()
+        if changed:
+            state.version = (state.version or 0) + 1
+        version = state.version
+        db.session.commit()
+    if changed:
+        _publish(collection, version, upserted=changed)
+    return len(changed)
+
+
+def delete_rows(collection, doc_ids):
+    model, _ = mirrored_collections()[collection]
+    with _write_lock:
+        model.query.filter(model.id.in_(list(doc_ids))).delete(synchronize_session=False)
+        state = _sync_state(collection)
+        state.last_event_at = datetime.utcnow()
+        state.version = (state.version or 0) + 1
+        version = state.version
+        db.session.commit()
+    _publish(collection, version, removed=doc_ids)
+
+
+def full_sync(firestore_db, collection, batch_size=500):
+    model, _ = mirrored_collections()[collection]
+    seen = set()
+    changed = 0
+    batch = []
+    for snap in firestore_db.collection(collection).stream():
+        seen.add(snap.id)
+        batch.append(snap)
+        if len(batch) >= batch_size:
+            changed += upsert_snapshots(collection, batch)
+            batch = []
+    changed += upsert_snapshots(collection, batch)
+
+    stale = {row_id for (row_id,) in db.session.query(model.id)} - seen
+    if stale:
+        delete_rows(collection, stale)
+    with _write_lock:
+        _sync_state(collection).last_full_sync_at = datetime.utcnow()
+        db.session.commit()
+    return changed, len(stale)
+
+
+def start_mirror_listeners(app, firestore_db):
+    watches = {}
+    for collection in mirrored_collections():
+        def on_snapshot(_snapshots, changes, _read_time, collection=collection):
+            with app.app_context():
+                try:
+                    upserts = [c.document for c in changes if c.type.name != "REMOVED"]
+                    removed = [c.document.id for c in changes if c.type.name == "REMOVED"]
+                    if upserts:
+                        upsert_snapshots(collection, upserts)
+                    if removed:
+                        delete_rows(collection, removed)
+                except Exception:
+                    db.session.rollback()
+                    log.exception("Mirror update failed for %s", collection)
+
+        watches[collection] = firestore_db.collection(collection).on_snapshot(on_snapshot)
+    log.info("Mirror listeners started for %s", ", ".join(mirrored_collections()))
+    return watches
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def mirror_status(watches):
+    # A table fed by a live listener is current; otherwise it is as old as
+    # its last full sync or listener event
+    from models import MirrorSyncState
+
+    now = datetime.utcnow()
+    states = {s.collection: s for s in MirrorSyncState.query.all()}
+    status = {}
+    for collection, (model, _) in mirrored_collections().items():
+        state = states.get(collection) or MirrorSyncState(collection=collection)
+        watch = watches.get(collection)
+        live = watch is not None and getattr(watch, "is_active", True)
+        synced_at = max(filter(None, [state.last_full_sync_at, state.last_event_at]), default=None)
+        if live:
+            staleness = 0.0
+        elif synced_at:
+            staleness = round((now - synced_at).total_seconds(), 1)
+        else:
+            staleness = None
+        status[collection] = {
+            "rows": model.query.count(),
+            "live": live,
+            "watermark": _iso(state.watermark),
+            "lastFullSyncAt": _iso(state.last_full_sync_at),
+            "lastEventAt": _iso(state.last_event_at),
+            "stalenessSeconds": staleness,
+        }
+    return status
+
+
+def configure_mirror(app, firestore_db):
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", MIRROR_DATABASE_URI)
+    db.init_app(app)
+    migrate.init_app(app, db)
+
+    @app.cli.command("mirror-init")
+    def mirror_init():
+        """Create the local SQLite mirror tables that don't exist yet."""
+        mirrored_collections()  # imports models, registering the tables
+        db.create_all()
+        click.echo(f"Mirror tables ready in {app.config['SQLALCHEMY_DATABASE_URI']}")
+
+    @app.cli.command("mirror-sync")
+    @click.argument("collections", nargs=-1)
+    def mirror_sync(collections):
+        """Copy Firestore collections into the local SQLite mirror."""
+        known = mirrored_collections()
+        for collection in collections or known:
+            if collection not in known:
+                raise click.BadParameter(f"unknown collection {collection!r}; choose from {', '.join(known)}")
+            changed, removed = full_sync(firestore_db, collection)
+            click.echo(f"{collection}: {changed} rows updated, {removed} removed")
+
+    @app.route("/api/mirror/status", methods=["GET"])
+    def get_mirror_status():
+        try:
+            if not is_admin(current_user(firestore_db)):
+                return jsonify({"error": "Admin only"}), 403
+            watches = app.extensions.get("mirror_listeners") or {}
+            return jsonify({"listening": LISTENER_ENABLED, "collections": mirror_status(watches)})
+        except Exception as e:
+            log.exception("Mirror status failed")
+            return jsonify({"error": str(e)}), 500
+
+    if LISTENER_ENABLED:
+        app.extensions["mirror_listeners"] = start_mirror_listeners(app, firestore_db)
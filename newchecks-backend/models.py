@@ -4,3 +4,72 @@ from extensions import db
 class Example(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100))
+
+
+# --- Local read mirror of Firestore (see mirror.py)
+# Each mirrored document keeps the columns we filter/sort on plus the whole
+# document as JSON, and the Firestore update_time it was copied at.
+
+class MirroredDocument:
+    id = db.Column(db.String(128), primary_key=True)
+    data = db.Column(db.JSON, nullable=False, default=dict)
+    update_time = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class MirrorCheck(MirroredDocument, db.Model):
+    __tablename__ = "mirror_checks"
+    company_id = db.Column(db.String(128))
+    employee_id = db.Column(db.String(128))
+    client_id = db.Column(db.String(128))
+    bank_id = db.Column(db.String(128))
+    employee_name = db.Column(db.String(255))
+    check_number = db.Column(db.Integer)
+    amount = db.Column(db.Float)
+    date = db.Column(db.DateTime)
+    week_key = db.Column(db.String(10))
+    reviewed = db.Column(db.Boolean, default=False)
+    paid = db.Column(db.Boolean, default=False)
+    created_by = db.Column(db.String(128))
+
+    __table_args__ = (
+        db.Index("ix_mirror_checks_company_date", "company_id", "date"),
+        db.Index("ix_mirror_checks_company_week", "company_id", "week_key"),
+        db.Index("ix_mirror_checks_employee_date", "employee_id", "date"),
+        db.Index("ix_mirror_checks_bank_number", "bank_id", "check_number"),
+    )
+
+
+class MirrorEmployee(MirroredDocument, db.Model):
+    __tablename__ = "mirror_employees"
+    company_id = db.Column(db.String(128), index=True)
+    name = db.Column(db.String(255), index=True)
+
+
+class MirrorClient(MirroredDocument, db.Model):
+    # Clients belong to several companies (companyId holds a list); it stays in data
+    __tablename__ = "mirror_clients"
+    name = db.Column(db.String(255), index=True)
+
+
+class MirrorCompany(MirroredDocument, db.Model):
+    __tablename__ = "mirror_companies"
+    name = db.Column(db.String(255), index=True)
+
+
+class MirrorBank(MirroredDocument, db.Model):
+    __tablename__ = "mirror_banks"
+    company_id = db.Column(db.String(128), index=True)
+    bank_name = db.Column(db.String(255))
+    next_check_number = db.Column(db.Integer)
+
+
+class MirrorSyncState(db.Model):
+    __tablename__ = "mirror_sync_state"
+    collection = db.Column(db.String(64), primary_key=True)
+    # Newest Firestore update_time copied so far
+    watermark = db.Column(db.DateTime)
+    last_full_sync_at = db.Column(db.DateTime)
+    last_event_at = db.Column(db.DateTime)
+    # Bumped by every commit that changes the collection's rows, so other
+    # processes can tell their in-memory copies (search.py) are behind
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -1,25 +1,86 @@
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from io import BytesIO
 import base64
 import os
-from num2words import num2words
+import threading
+from check_fields import PERDIEM_DAYS
+from log import get_logger, sample_check
+
+log = get_logger("pdf_generator")
+
+# === Lazy ReportLab / num2words / MICR font loading ===
+# Importing ReportLab and registering the MICR TTF is a noticeable part of
+# startup. load_resources() does it once, either eagerly (app.py in normal
+# mode), during warmup, or on the first render.
+canvas = None
+letter = None
+inch = None
+ImageReader = None
+num2words = None
 
-# === MICR Font Registration ===
 micr_font_path = os.path.join(os.path.dirname(__file__), "CovixMICRU copy.ttf")
 MICR_REGISTERED = False
-if os.path.exists(micr_font_path):
-    try:
-        pdfmetrics.registerFont(TTFont("MICR", micr_font_path))
-        MICR_REGISTERED = True
-    except Exception as e:
-        print("⚠️ Failed to register MICR font:", e)
+
+_resources_loaded = False
+_resources_lock = threading.Lock()
+
+
+def load_resources():
+    global canvas, letter, inch, ImageReader, num2words, MICR_REGISTERED, _resources_loaded
+    if _resources_loaded:
+        return
+    with _resources_lock:
+        if _resources_loaded:
+            return
+        from reportlab.pdfgen import canvas as reportlab_canvas
+        from reportlab.lib.pagesizes import letter as letter_size
+        from reportlab.lib.units import inch as inch_unit
+        from reportlab.lib.utils import ImageReader as ReportLabImageReader
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from num2words import num2words as number_to_words
+
+        # === MICR Font Registration ===
+        if os.path.exists(micr_font_path):
+            try:
+                pdfmetrics.registerFont(TTFont("MICR", micr_font_path))
+                MICR_REGISTERED = True
+            except Exception as e:
+                log.warning("Failed to register MICR font: %s", e)
+
+        canvas = reportlab_canvas
+        letter = letter_size
+        inch = inch_unit
+        ImageReader = ReportLabImageReader
+        num2words = number_to_words
+        _resources_loaded = True
+
+
+def _relationship_pay(check, relationship_id):
+    # (hours, per diem amount, per diem breakdown flag, [(Day, amount)]) for one
+    # relationship, from check.relationship_pay (check_fields.relationship_pay).
+    # Per diem values the relationship doesn't set fall back to the check's own.
+    pay = check.relationship_pay.get(relationship_id) or {}
+    hours = pay.get('hours') or 0
+    perdiem_amount = pay.get('perdiemAmount')
+    if perdiem_amount is None:
+        perdiem_amount = check.perdiem_amount
+    perdiem_breakdown = pay.get('perdiemBreakdown')
+    if perdiem_breakdown is None:
+        perdiem_breakdown = check.perdiem_breakdown
+    days = pay.get('perdiem') or {}
+    daily_amounts = []
+    for day in PERDIEM_DAYS:
+        amount = days.get(day)
+        if amount is None:
+            amount = getattr(check, f'perdiem_{day.lower()}')
+        daily_amounts.append((day, amount))
+    return hours, perdiem_amount, perdiem_breakdown, daily_amounts
+
 
 def generate_clean_check(check):
+    load_resources()
+    # Per-check debug records are sampled; when DEBUG is off this is one level check
+    debug = sample_check(log)
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
@@ -30,6 +91,27 @@ def generate_clean_check(check):
         left = 0.75 * inch
         right = 7.75 * inch
 
+        def draw_ytd(y):
+            # Year-to-date column; routes prefetch check.ytd from the employee ledger
+            ytd = check.ytd
+            if not ytd:
+                return
+            label_x = 6.0 * inch
+            c.setFont("Helvetica-Bold", 9)
+            c.drawString(label_x, y, f"YTD {ytd.get('year', '')}".strip())
+            rows = [("Gross", f"${ytd['gross']:,.2f}"), ("Hours", f"{ytd['hours']:,.2f}")]
+            if ytd.get('overtimeHours'):
+                rows.append(("OT Hours", f"{ytd['overtimeHours']:,.2f}"))
+            if ytd.get('holidayHours'):
+                rows.append(("Holiday Hours", f"{ytd['holidayHours']:,.2f}"))
+            if ytd.get('perdiem'):
+                rows.append(("Per Diem", f"${ytd['perdiem']:,.2f}"))
+            c.setFont("Helvetica", 8)
+            for label, value in rows:
+                y -= 10
+                c.drawString(label_x, y, label)
+                c.drawRightString(right, y, value)
+
         if top_section:
             # === Company Logo + Name & Address ===
             logo_width = 60
@@ -39,9 +121,6 @@ def generate_clean_check(check):
 
             if check.company.logo:
                 try:
-                    print(f"🖼️ Attempting to load logo for {check.company.name}")
-                    print(f"📏 Logo data length: {len(check.company.logo)}")
-                    
                     # Check if logo data looks like base64
                     if not check.company.logo.startswith('data:image/'):
                         # Assume it's raw base64
@@ -56,7 +135,8 @@ def generate_clean_check(check):
                             raise ValueError("Invalid data URL format")
                     
                     logo_image = ImageReader(BytesIO(logo_data))
-                    print(f"✅ Logo loaded successfully, dimensions: {logo_image.getSize()}")
+                    if debug:
+                        log.debug("Logo for %s loaded: %d bytes, %s", check.company.name, len(logo_data), logo_image.getSize())
                     
                     c.drawImage(logo_image, left, top - logo_height + 10, width=logo_width, height=logo_height, mask='auto')
                     c.setFont("Helvetica-Bold", 10)
@@ -64,7 +144,7 @@ def generate_clean_check(check):
                     c.setFont("Helvetica", 8)
                     c.drawString(text_x, text_y - 14, check.company.address or "")
                 except Exception as e:
-                    print(f"❌ Logo error for {check.company.name}: {str(e)}")
+                    log.warning("Logo error for %s: %s", check.company.name, e)
                     c.setFont("Helvetica-Bold", 10)
                     c.drawString(left, top, check.company.name)
                     c.setFont("Helvetica", 8)
@@ -89,7 +169,7 @@ def generate_clean_check(check):
 
             # === ISO Week ===
             # Use work_week if available, otherwise calculate from date
-            if hasattr(check, 'work_week') and check.work_week:
+            if check.work_week:
                 week_label = check.work_week
             else:
                 iso_year, iso_week, _ = check.date.isocalendar()
@@ -238,7 +318,7 @@ def generate_clean_check(check):
             c.drawString(left, y, check.employee.name)
             
             # Show client information from relationships or single client
-            if hasattr(check, 'relationshipDetails') and check.relationshipDetails:
+            if check.relationshipDetails:
                 # Multiple relationships - show combined client names with better formatting
                 client_names = [rel.get('clientName', 'Unknown') for rel in check.relationshipDetails if rel.get('clientName')]
                 if client_names:
@@ -272,6 +352,7 @@ def generate_clean_check(check):
                 y -= 12
 
 
+            draw_ytd(y)
             c.setFont("Helvetica-Bold", 9)
             c.drawString(left, y, "Description")
             c.drawRightString(5.5 * inch, y, "Amount")
@@ -281,62 +362,62 @@ def generate_clean_check(check):
             has_breakdown = False
 
             # Only show generic hours if NO relationship details are available
-            if not hasattr(check, 'relationshipDetails') or not check.relationshipDetails:
+            if not check.relationshipDetails:
                 if check.hours_worked and check.pay_rate:
-                    hours_worked = float(str(check.hours_worked))
-                    pay_rate = float(str(check.pay_rate))
+                    hours_worked = check.hours_worked
+                    pay_rate = check.pay_rate
                     c.drawString(left, y, f"Regular Hours ({hours_worked} × ${pay_rate:.2f})")
                     c.drawRightString(5.5 * inch, y, f"${hours_worked * pay_rate:.2f}")
                     y -= 12
 
             if check.overtime_hours and check.overtime_rate:
-                overtime_hours = float(str(check.overtime_hours))
-                overtime_rate = float(str(check.overtime_rate))
+                overtime_hours = check.overtime_hours
+                overtime_rate = check.overtime_rate
                 c.drawString(left, y, f"Overtime Hours ({overtime_hours} × ${overtime_rate:.2f})")
                 c.drawRightString(5.5 * inch, y, f"${overtime_hours * overtime_rate:.2f}")
                 y -= 12
 
             if check.holiday_hours and check.holiday_rate:
-                holiday_hours = float(str(check.holiday_hours))
-                holiday_rate = float(str(check.holiday_rate))
+                holiday_hours = check.holiday_hours
+                holiday_rate = check.holiday_rate
                 c.drawString(left, y, f"Holiday Hours ({holiday_hours} × ${holiday_rate:.2f})")
                 c.drawRightString(5.5 * inch, y, f"${holiday_hours * holiday_rate:.2f}")
                 y -= 12
 
             # ✅ Add per diem amount to breakdown (STANDALONE - not inside holiday block)
             # Only show generic per diem if NO relationship details are available
-            if not hasattr(check, 'relationshipDetails') or not check.relationshipDetails:
+            if not check.relationshipDetails:
                 perdiem_total = 0
-                if hasattr(check, 'perdiem_breakdown') and check.perdiem_breakdown:
+                if check.perdiem_breakdown:
                     # Calculate from daily breakdown - convert strings to floats
                     perdiem_total = (
-                        float(getattr(check, 'perdiem_monday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_tuesday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_wednesday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_thursday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_friday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_saturday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_sunday', 0) or 0)
+                        check.perdiem_monday + 
+                        check.perdiem_tuesday + 
+                        check.perdiem_wednesday + 
+                        check.perdiem_thursday + 
+                        check.perdiem_friday + 
+                        check.perdiem_saturday + 
+                        check.perdiem_sunday
                     )
                 else:
-                    perdiem_total = float(getattr(check, 'perdiem_amount', 0) or 0)
+                    perdiem_total = check.perdiem_amount
                 
                 if perdiem_total > 0:
-                    c.drawString(left, y, f"Per Diem Amount")
+                    c.drawString(left, y, "Per Diem Amount")
                     c.drawRightString(5.5 * inch, y, f"${perdiem_total:.2f}")
                     y -= 12
                     
                     # Add daily breakdown if using breakdown mode
-                    if hasattr(check, 'perdiem_breakdown') and check.perdiem_breakdown:
+                    if check.perdiem_breakdown:
                         c.setFont("Helvetica", 8)
                         daily_amounts = [
-                            ('Monday', getattr(check, 'perdiem_monday', 0)),
-                            ('Tuesday', getattr(check, 'perdiem_tuesday', 0)),
-                            ('Wednesday', getattr(check, 'perdiem_wednesday', 0)),
-                            ('Thursday', getattr(check, 'perdiem_thursday', 0)),
-                            ('Friday', getattr(check, 'perdiem_friday', 0)),
-                            ('Saturday', getattr(check, 'perdiem_saturday', 0)),
-                            ('Sunday', getattr(check, 'perdiem_sunday', 0))
+                            ('Monday', check.perdiem_monday),
+                            ('Tuesday', check.perdiem_tuesday),
+                            ('Wednesday', check.perdiem_wednesday),
+                            ('Thursday', check.perdiem_thursday),
+                            ('Friday', check.perdiem_friday),
+                            ('Saturday', check.perdiem_saturday),
+                            ('Sunday', check.perdiem_sunday)
                         ]
                         
                         for day, amount in daily_amounts:
@@ -348,105 +429,56 @@ def generate_clean_check(check):
                         y -= 2
 
             # Add relationship breakdown if available
-            # DEBUG: Print relationship data
-            print(f"🔍 PDF DEBUG: check.relationshipDetails: {getattr(check, 'relationshipDetails', 'NOT_FOUND')}")
-            print(f"🔍 PDF DEBUG: check.hours_worked: {getattr(check, 'hours_worked', 'NOT_FOUND')}")
-            print(f"🔍 PDF DEBUG: check.pay_rate: {getattr(check, 'pay_rate', 'NOT_FOUND')}")
-            print(f"🔍 PDF DEBUG: ALL check attributes: {[attr for attr in dir(check) if not attr.startswith('_')]}")
-            print(f"🔍 PDF DEBUG: check.relationshipHours: {getattr(check, 'relationshipHours', 'NOT_FOUND')}")
-            
-            if hasattr(check, 'relationshipDetails') and check.relationshipDetails and not has_breakdown:
+            if debug:
+                log.debug(
+                    "Check #%s stub: relationshipDetails=%s relationshipHours=%s hours=%s pay_rate=%s",
+                    check.check_number, check.relationshipDetails,
+                    check.relationshipHours, check.hours_worked, check.pay_rate,
+                )
+
+            if check.relationshipDetails and not has_breakdown:
                 has_breakdown = True
-                print(f"🔍 PDF DEBUG: Processing {len(check.relationshipDetails)} relationships")
-                
+
                 for rel in check.relationshipDetails:
-                    print(f"🔍 PDF DEBUG: Processing relationship: {rel}")
                     if rel.get('payType') == 'hourly':
                         # Use actual relationship hours if available
                         pay_rate = rel.get('payRate', 0)
                         relationship_id = rel.get('id')
                         
-                        # Try to get actual hours from relationship-specific fields first
-                        actual_hours = 0
-                        print(f"🔍 PDF DEBUG: Checking relationshipHours for {relationship_id}")
-                        print(f"🔍 PDF DEBUG: check.relationshipHours: {getattr(check, 'relationshipHours', 'NOT_FOUND')}")
-                        print(f"🔍 PDF DEBUG: relationship_id: {relationship_id}")
-                        
-                        # First try relationship-specific field (e.g., "1754920623462_hours")
-                        rel_hours_field = f"{relationship_id}_hours"
-                        if hasattr(check, rel_hours_field):
-                            actual_hours = getattr(check, rel_hours_field, 0)
-                            print(f"🔍 PDF DEBUG: Found relationship-specific hours in {rel_hours_field}: {actual_hours}")
-                        # Fallback to relationshipHours dict
-                        elif hasattr(check, 'relationshipHours') and check.relationshipHours and relationship_id:
-                            actual_hours = check.relationshipHours.get(relationship_id, 0)
-                            print(f"🔍 PDF DEBUG: Found actual_hours from relationshipHours: {actual_hours}")
-                        else:
-                            print(f"🔍 PDF DEBUG: No relationship hours found, using fallback")
-                        
+                        # Relationship hours ("<relId>_hours", relationshipPay or relationshipHours)
+                        actual_hours = _relationship_pay(check, relationship_id)[0]
+
                         if pay_rate > 0 and actual_hours > 0:
                             amount = actual_hours * pay_rate
-                            print(f"🔍 PDF DEBUG: Using ACTUAL hours: {actual_hours} × ${pay_rate:.2f} = ${amount:.2f}")
-                            c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Regular Hours ({actual_hours} × ${pay_rate:.2f})")
+                            c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Regular Hours ({actual_hours:g} × ${pay_rate:.2f})")
                             c.drawRightString(5.5 * inch, y, f"${amount:.2f}")
                             y -= 12
                         elif pay_rate > 0:
                             # Fallback for old checks without relationshipHours
                             estimated_hours = 20
                             amount = estimated_hours * pay_rate
-                            print(f"🔍 PDF DEBUG: Using FALLBACK hours: {estimated_hours} × ${pay_rate:.2f} = ${amount:.2f}")
+                            if debug:
+                                log.debug("Check #%s: no hours for relationship %s, using fallback of %s", check.check_number, relationship_id, estimated_hours)
                             c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Regular Hours ({estimated_hours} × ${pay_rate:.2f})")
                             c.drawRightString(5.5 * inch, y, f"${amount:.2f}")
                             y -= 12
                     elif rel.get('payType') == 'perdiem':
                         # For per diem relationships, show actual daily breakdown if available
                         relationship_id = rel.get('id')
-                        print(f"🔍 PDF DEBUG: Processing per diem relationship: {rel.get('clientName')}")
-                        print(f"🔍 PDF DEBUG: relationship_id: {relationship_id}")
-                        
-                        # Try relationship-specific per diem fields first
-                        rel_perdiem_amount_field = f"{relationship_id}_perdiemAmount"
-                        rel_perdiem_breakdown_field = f"{relationship_id}_perdiemBreakdown"
-                        
-                        perdiem_amount = 0
-                        perdiem_breakdown = False
-                        
-                        # Check for relationship-specific per diem amount
-                        if hasattr(check, rel_perdiem_amount_field):
-                            perdiem_amount = float(getattr(check, rel_perdiem_amount_field, 0) or 0)
-                            print(f"🔍 PDF DEBUG: Found relationship-specific per diem amount: {perdiem_amount}")
-                        else:
-                            # Fallback to general per diem amount
-                            perdiem_amount = float(getattr(check, 'perdiem_amount', 0) or 0)
-                            print(f"🔍 PDF DEBUG: Using general per diem amount: {perdiem_amount}")
-                        
-                        # Check for relationship-specific breakdown flag
-                        if hasattr(check, rel_perdiem_breakdown_field):
-                            perdiem_breakdown = getattr(check, rel_perdiem_breakdown_field, False)
-                            print(f"🔍 PDF DEBUG: Found relationship-specific breakdown flag: {perdiem_breakdown}")
-                        else:
-                            # Fallback to general breakdown flag
-                            perdiem_breakdown = getattr(check, 'perdiem_breakdown', False)
-                            print(f"🔍 PDF DEBUG: Using general breakdown flag: {perdiem_breakdown}")
-                        
+
+                        # Relationship per diem, falling back to the check-level fields
+                        perdiem_amount, perdiem_breakdown, daily = _relationship_pay(check, relationship_id)[1:]
+
                         if perdiem_breakdown:
-                            # Try to get relationship-specific daily amounts
                             daily_total = 0
                             daily_amounts = []
-                            
-                            for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']:
-                                rel_day_field = f"{relationship_id}_perdiem{day.capitalize()}"
-                                if hasattr(check, rel_day_field):
-                                    amount = float(getattr(check, rel_day_field, 0) or 0)
-                                else:
-                                    amount = float(getattr(check, f'perdiem_{day}', 0) or 0)
-                                
+
+                            for day, amount in daily:
                                 if amount > 0:
                                     daily_amounts.append((day.capitalize(), amount))
                                     daily_total += amount
                             
-                            print(f"🔍 PDF DEBUG: Daily breakdown total: ${daily_total:.2f}")
-                            
+
                             if daily_total > 0:
                                 c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Per Diem")
                                 c.drawRightString(5.5 * inch, y, f"${daily_total:.2f}")
@@ -462,7 +494,6 @@ def generate_clean_check(check):
                                 y -= 2
                         elif perdiem_amount > 0:
                             # Use per diem total amount (no daily breakdown)
-                            print(f"🔍 PDF DEBUG: Using per diem total: ${perdiem_amount:.2f}")
                             c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Per Diem")
                             c.drawRightString(5.5 * inch, y, f"${perdiem_amount:.2f}")
                             y -= 12
@@ -483,7 +514,7 @@ def generate_clean_check(check):
             c.drawString(left, y, check.employee.name)
             
             # Show client information from relationships or single client
-            if hasattr(check, 'relationshipDetails') and check.relationshipDetails:
+            if check.relationshipDetails:
                 # Multiple relationships - show combined client names with better formatting
                 client_names = [rel.get('clientName', 'Unknown') for rel in check.relationshipDetails if rel.get('clientName')]
                 if client_names:
@@ -510,6 +541,7 @@ def generate_clean_check(check):
                 c.drawString(left + 200, y, f"Client: {check.client.name}")
             y -= 16  # Back to original spacing for compact layout
 
+            draw_ytd(y)
             c.setFont("Helvetica-Bold", 9)
             c.drawString(left, y, "Description")
             c.drawRightString(5.5 * inch, y, "Amount")
@@ -517,62 +549,62 @@ def generate_clean_check(check):
             c.setFont("Helvetica", 9)
 
             # Only show generic hours if NO relationship details are available
-            if not hasattr(check, 'relationshipDetails') or not check.relationshipDetails:
+            if not check.relationshipDetails:
                 if check.hours_worked and check.pay_rate:
-                    hours_worked = float(str(check.hours_worked))
-                    pay_rate = float(str(check.pay_rate))
+                    hours_worked = check.hours_worked
+                    pay_rate = check.pay_rate
                     c.drawString(left, y, f"Regular Hours ({hours_worked} × ${pay_rate:.2f})")
                     c.drawRightString(5.5 * inch, y, f"${hours_worked * pay_rate:.2f}")
                     y -= 12
 
             if check.overtime_hours and check.overtime_rate:
-                overtime_hours = float(str(check.overtime_hours))
-                overtime_rate = float(str(check.overtime_rate))
+                overtime_hours = check.overtime_hours
+                overtime_rate = check.overtime_rate
                 c.drawString(left, y, f"Overtime Hours ({overtime_hours} × ${overtime_rate:.2f})")
                 c.drawRightString(5.5 * inch, y, f"${overtime_hours * overtime_rate:.2f}")
                 y -= 12
 
             if check.holiday_hours and check.holiday_rate:
-                holiday_hours = float(str(check.holiday_hours))
-                holiday_rate = float(str(check.holiday_rate))
+                holiday_hours = check.holiday_hours
+                holiday_rate = check.holiday_rate
                 c.drawString(left, y, f"Holiday Hours ({holiday_hours} × ${holiday_rate:.2f})")
                 c.drawRightString(5.5 * inch, y, f"${holiday_hours * holiday_rate:.2f}")
                 y -= 12
 
             # ✅ Add per diem amount to breakdown
             # Only show generic per diem if NO relationship details are available
-            if not hasattr(check, 'relationshipDetails') or not check.relationshipDetails:
+            if not check.relationshipDetails:
                 perdiem_total = 0
-                if hasattr(check, 'perdiem_breakdown') and check.perdiem_breakdown:
+                if check.perdiem_breakdown:
                     # Calculate from daily breakdown - convert strings to floats
                     perdiem_total = (
-                        float(getattr(check, 'perdiem_monday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_tuesday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_wednesday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_thursday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_friday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_saturday', 0) or 0) + 
-                        float(getattr(check, 'perdiem_sunday', 0) or 0)
+                        check.perdiem_monday + 
+                        check.perdiem_tuesday + 
+                        check.perdiem_wednesday + 
+                        check.perdiem_thursday + 
+                        check.perdiem_friday + 
+                        check.perdiem_saturday + 
+                        check.perdiem_sunday
                     )
                 else:
-                    perdiem_total = float(getattr(check, 'perdiem_amount', 0) or 0)
+                    perdiem_total = check.perdiem_amount
                 
                 if perdiem_total > 0:
-                    c.drawString(left, y, f"Per Diem Amount")
+                    c.drawString(left, y, "Per Diem Amount")
                     c.drawRightString(5.5 * inch, y, f"${perdiem_total:.2f}")
                     y -= 12
                     
                     # Add daily breakdown if using breakdown mode
-                    if hasattr(check, 'perdiem_breakdown') and check.perdiem_breakdown:
+                    if check.perdiem_breakdown:
                         c.setFont("Helvetica", 8)
                         daily_amounts = [
-                            ('Monday', getattr(check, 'perdiem_monday', 0)),
-                            ('Tuesday', getattr(check, 'perdiem_tuesday', 0)),
-                            ('Wednesday', getattr(check, 'perdiem_wednesday', 0)),
-                            ('Thursday', getattr(check, 'perdiem_thursday', 0)),
-                            ('Friday', getattr(check, 'perdiem_friday', 0)),
-                            ('Saturday', getattr(check, 'perdiem_saturday', 0)),
-                            ('Sunday', getattr(check, 'perdiem_sunday', 0))
+                            ('Monday', check.perdiem_monday),
+                            ('Tuesday', check.perdiem_tuesday),
+                            ('Wednesday', check.perdiem_wednesday),
+                            ('Thursday', check.perdiem_thursday),
+                            ('Friday', check.perdiem_friday),
+                            ('Saturday', check.perdiem_saturday),
+                            ('Sunday', check.perdiem_sunday)
                         ]
                         
                         for day, amount in daily_amounts:
@@ -584,35 +616,25 @@ def generate_clean_check(check):
                         y -= 2
 
             # Add relationship breakdown if available
-            if hasattr(check, 'relationshipDetails') and check.relationshipDetails:
-                print(f"🔍 PDF DEBUG: Bottom section - Processing {len(check.relationshipDetails)} relationships")
+            if check.relationshipDetails:
                 for rel in check.relationshipDetails:
-                    print(f"🔍 PDF DEBUG: Bottom section - Processing relationship: {rel}")
-                    print(f"🔍 PDF DEBUG: Bottom section - rel.payType: {rel.get('payType')}")
                     if rel.get('payType') == 'hourly':
                         # For hourly relationships, use actual relationship hours if available
                         pay_rate = rel.get('payRate', 0)
                         relationship_id = rel.get('id')
                         
-                        # Try to get actual hours from relationship-specific fields first
-                        actual_hours = 0
-                        rel_hours_field = f"{relationship_id}_hours"
-                        if hasattr(check, rel_hours_field):
-                            actual_hours = getattr(check, rel_hours_field, 0)
-                        elif hasattr(check, 'relationshipHours') and check.relationshipHours and relationship_id:
-                            actual_hours = check.relationshipHours.get(relationship_id, 0)
-                        
+                        # Relationship hours ("<relId>_hours", relationshipPay or relationshipHours)
+                        actual_hours = _relationship_pay(check, relationship_id)[0]
+
                         if pay_rate > 0 and actual_hours > 0:
                             amount = actual_hours * pay_rate
-                            print(f"🔍 PDF DEBUG: Bottom section - Using ACTUAL hours: {actual_hours} × ${pay_rate:.2f} = ${amount:.2f}")
-                            c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Regular Hours ({actual_hours} × ${pay_rate:.2f})")
+                            c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Regular Hours ({actual_hours:g} × ${pay_rate:.2f})")
                             c.drawRightString(5.5 * inch, y, f"${amount:.2f}")
                             y -= 12
                         elif pay_rate > 0:
                             # Fallback for old checks without relationshipHours
                             estimated_hours = 20
                             amount = estimated_hours * pay_rate
-                            print(f"🔍 PDF DEBUG: Bottom section - Using FALLBACK hours: {estimated_hours} × ${pay_rate:.2f} = ${amount:.2f}")
                             c.drawString(left, y, f"{rel.get('clientName', 'Unknown')} - Regular Hours ({estimated_hours} × ${pay_rate:.2f})")
                             c.drawRightString(5.5 * inch, y, f"${amount:.2f}")
                             y -= 12
@@ -620,37 +642,14 @@ def generate_clean_check(check):
                         # For per diem relationships, show actual daily breakdown if available
                         relationship_id = rel.get('id')
                         
-                        # Try relationship-specific per diem fields first
-                        rel_perdiem_amount_field = f"{relationship_id}_perdiemAmount"
-                        rel_perdiem_breakdown_field = f"{relationship_id}_perdiemBreakdown"
-                        
-                        perdiem_amount = 0
-                        perdiem_breakdown = False
-                        
-                        # Check for relationship-specific per diem amount
-                        if hasattr(check, rel_perdiem_amount_field):
-                            perdiem_amount = float(getattr(check, rel_perdiem_amount_field, 0) or 0)
-                        else:
-                            perdiem_amount = float(getattr(check, 'perdiem_amount', 0) or 0)
-                        
-                        # Check for relationship-specific breakdown flag
-                        if hasattr(check, rel_perdiem_breakdown_field):
-                            perdiem_breakdown = getattr(check, rel_perdiem_breakdown_field, False)
-                        else:
-                            perdiem_breakdown = getattr(check, 'perdiem_breakdown', False)
-                        
+                        # Relationship per diem, falling back to the check-level fields
+                        perdiem_amount, perdiem_breakdown, daily = _relationship_pay(check, relationship_id)[1:]
+
                         if perdiem_breakdown:
-                            # Try to get relationship-specific daily amounts
                             daily_total = 0
                             daily_amounts = []
-                            
-                            for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']:
-                                rel_day_field = f"{relationship_id}_perdiem{day.capitalize()}"
-                                if hasattr(check, rel_day_field):
-                                    amount = float(getattr(check, rel_day_field, 0) or 0)
-                                else:
-                                    amount = float(getattr(check, f'perdiem_{day}', 0) or 0)
-                                
+
+                            for day, amount in daily:
                                 if amount > 0:
                                     daily_amounts.append((day.capitalize(), amount))
                                     daily_total += amount
@@ -681,8 +680,6 @@ def generate_clean_check(check):
             # === Additional Info (Optional)
             c.setFont("Helvetica-Oblique", 8)
             # Handle created_by as either string or object
-            print(f"🔍 PDF DEBUG: check.created_by = {check.created_by}")
-            print(f"🔍 PDF DEBUG: type(check.created_by) = {type(check.created_by)}")
             created_by = check.created_by.username if hasattr(check.created_by, 'username') else (check.created_by or "Unknown")
             
             # Try to get better user information
@@ -695,10 +692,10 @@ def generate_clean_check(check):
                 elif hasattr(check.created_by, 'displayName'):
                     created_by = check.created_by.displayName
             
-            print(f"🔍 PDF DEBUG: Final created_by = {created_by}")
             date_str = check.date.strftime('%Y-%m-%d') if check.date else "N/A"
             c.drawString(left, y, f"Check #{check.check_number} created by {created_by} on {date_str}")
-            print(f"🔍 PDF DEBUG: Drew creator line at y={y}: Check #{check.check_number} created by {created_by} on {date_str}")
+            if debug:
+                log.debug("Check #%s created by %s on %s", check.check_number, created_by, date_str)
 
 
 
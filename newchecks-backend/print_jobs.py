@@ -0,0 +1,266 @@
+from datetime import datetime
+from io import BytesIO
+
+from flask import send_file
+
+from check_models import Bank, Company, InvalidCheck, check_from_firestore
+from ledgers import attach_ytd
+from log import get_logger, sample_check
+from metrics import observe_checks, observe_output, stage
+from pdf_generator import generate_clean_check
+from reports import parse_date_range
+from weeks import week_checks
+
+log = get_logger("print_jobs")
+
+# --- Print jobs
+# Every print route is the same pipeline:
+#   selector        picks the check documents (one query or one get_all)
+#   headers         company and first bank, read once per company in the job
+#   names           employee names and creators missing from the checks,
+#                   each resolved with one get_all for the whole job
+#   models          check_models.check_from_firestore, then YTD (attach_ytd)
+#   render / merge  one PDF per check, merged into one file
+# A selector has company_id (None when the checks say), default_date (used
+# for checks without a date), filename, not_found and fetch(firestore_db).
+# Invalid arguments raise PrintJobError, which the routes turn into JSON; so
+# do checks that can't be printed (no valid checkNumber), listed by id.
+MAX_RANGE_CHECKS = 2000
+CREATOR_FIELDS = ["username", "name", "displayName", "email"]
+
+
+class PrintJobError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_week_key(week_key):
+    try:
+        return datetime.strptime(week_key, "%Y-%m-%d")
+    except ValueError:
+        log.warning("Failed to parse week_key: %r", week_key)
+        raise PrintJobError(f"Invalid weekKey: {week_key!r}. Must be in format YYYY-MM-DD.")
+
+
+class WeekSelector:
+    # The company's checks in week_key's week (weeks.week_checks)
+
+    def __init__(self, company_id, week_key, reviewed_only=False):
+        if not company_id or not week_key:
+            raise PrintJobError("Missing parameters")
+        self.company_id = company_id
+        self.week_key = week_key
+        self.reviewed_only = reviewed_only
+        self.default_date = parse_week_key(week_key)
+        prefix = "reviewed_checks" if reviewed_only else "checks"
+        self.filename = f"{prefix}_{week_key}.pdf"
+        self.not_found = "No reviewed checks found" if reviewed_only else "No checks found"
+
+    def fetch(self, firestore_db):
+        return week_checks(firestore_db, self.company_id, self.week_key, reviewed_only=self.reviewed_only)
+
+
+class CheckIdSelector:
+    # The given checks, in the order asked for
+
+    def __init__(self, check_ids, week_key=None):
+        if not check_ids or not isinstance(check_ids, list):
+            raise PrintJobError("Missing or invalid checkIds")
+        self.check_ids = check_ids
+        self.company_id = None
+        self.default_date = None
+        self.filename = f"selected_checks_{week_key or 'checks'}.pdf"
+        self.not_found = "No checks found for provided IDs"
+
+    def fetch(self, firestore_db):
+        refs = [firestore_db.collection("checks").document(cid) for cid in dict.fromkeys(self.check_ids)]
+        found = {snap.id: snap for snap in firestore_db.get_all(refs) if snap.exists}
+        return [found[cid] for cid in self.check_ids if cid in found]
+
+
+class DateRangeSelector:
+    # The company's checks dated from start_day through end_day
+
+    def __init__(self, company_id, start_day, end_day, reviewed_only=False):
+        if not company_id or not start_day or not end_day:
+            raise PrintJobError("companyId, startDate and endDate are required")
+        self.company_id = company_id
+        self.start, self.end = _date_range(start_day, end_day)
+        if self.end <= self.start:
+            raise PrintJobError("startDate must not be after endDate")
+        self.reviewed_only = reviewed_only
+        self.default_date = self.start
+        self.filename = f"checks_{start_day}_{end_day}.pdf"
+        self.not_found = "No checks found"
+
+    def fetch(self, firestore_db):
+        query = (
+            firestore_db.collection("checks")
+            .where("companyId", "==", self.company_id)
+            .where("date", ">=", self.start)
+            .where("date", "<", self.end)
+        )
+        if self.reviewed_only:
+            query = query.where("reviewed", "==", True)
+        return _capped(query)
+
+
+class EmployeeSelector:
+    # One employee's checks with the company, optionally within a date range
+
+    def __init__(self, company_id, employee_id, start_day=None, end_day=None):
+        if not company_id or not employee_id:
+            raise PrintJobError("companyId and employeeId are required")
+        self.company_id = company_id
+        self.employee_id = employee_id
+        self.start, self.end = _date_range(start_day, end_day)
+        self.default_date = None
+        self.filename = f"employee_{employee_id}_checks.pdf"
+        self.not_found = "No checks found for this employee"
+
+    def fetch(self, firestore_db):
+        # The companyId + employeeId + date index
+        query = (
+            firestore_db.collection("checks")
+            .where("companyId", "==", self.company_id)
+            .where("employeeId", "==", self.employee_id)
+        )
+        if self.start:
+            query = query.where("date", ">=", self.start)
+        if self.end:
+            query = query.where("date", "<", self.end)
+        return _capped(query.order_by("date"))
+
+
+def _date_range(start_day, end_day):
+    try:
+        return parse_date_range(start_day, end_day)
+    except ValueError:
+        raise PrintJobError("startDate and endDate must be in format YYYY-MM-DD")
+
+
+def _capped(query):
+    docs = list(query.limit(MAX_RANGE_CHECKS + 1).stream())
+    if len(docs) > MAX_RANGE_CHECKS:
+        raise PrintJobError(f"More than {MAX_RANGE_CHECKS} checks; narrow the range")
+    return docs
+
+
+def load_headers(firestore_db, company_id):
+    # (Company, Bank) for a company; the bank is its first one
+    company_doc = firestore_db.collection("companies").document(company_id).get()
+    company = Company.from_firestore(company_doc.to_dict() if company_doc.exists else {})
+    log.debug("Company %s logo: %d bytes", company.name, len(company.logo))
+    bank_data = {}
+    for snap in firestore_db.collection("banks").where("companyId", "==", company_id).limit(1).stream():
+        bank_data = snap.to_dict()
+    return company, Bank.from_firestore(bank_data)
+
+
+def _creator_name(check):
+    return check.get("madeByName") or check.get("createdByUserName") or check.get("created_by")
+
+
+def _get_all(firestore_db, collection, ids, fields):
+    refs = [firestore_db.collection(collection).document(i) for i in dict.fromkeys(ids)]
+    if not refs:
+        return {}
+    return {snap.id: snap.to_dict() or {} for snap in firestore_db.get_all(refs, field_paths=fields) if snap.exists}
+
+
+def resolve_names(firestore_db, checks):
+    # ({employeeId: name}, {uid: creator}) for checks that don't carry them
+    employees = _get_all(
+        firestore_db, "employees",
+        [c["employeeId"] for c in checks if c.get("employeeId") and not c.get("employeeName")],
+        ["name"],
+    )
+    creator_ids = [c["createdBy"] for c in checks if c.get("createdBy") and not _creator_name(c)]
+    users = _get_all(firestore_db, "users", creator_ids, CREATOR_FIELDS)
+    creators = {}
+    for uid in dict.fromkeys(creator_ids):
+        user = users.get(uid)
+        if user is None:
+            log.info("User %s not found for a printed check", uid)
+        creators[uid] = next((user[f] for f in CREATOR_FIELDS if user and user.get(f)), "Unknown")
+    return {i: e.get("name", "") for i, e in employees.items()}, creators
+
+
+def build_checks(firestore_db, selector, check_docs):
+    checks = [doc.to_dict() or {} for doc in check_docs]
+    with stage("reference_lookup"):
+        employee_names, creators = resolve_names(firestore_db, checks)
+
+    headers = {}
+    check_objects = []
+    invalid = []
+    for doc, d in zip(check_docs, checks):
+        check_debug = sample_check(log)
+        if check_debug:
+            log.debug("Check %s from Firestore", doc.id, extra={"fields": {"check": d}})
+        company_id = selector.company_id or d.get("companyId")
+        if company_id not in headers:
+            with stage("reference_lookup"):
+                headers[company_id] = load_headers(firestore_db, company_id)
+        company, bank = headers[company_id]
+        emp_name = d.get("employeeName") or employee_names.get(d.get("employeeId"), "")
+        created_by = _creator_name(d) or creators.get(d.get("createdBy"))
+        with stage("model_build"):
+            try:
+                check_obj = check_from_firestore(
+                    d, company, bank, emp_name, created_by, default_date=selector.default_date,
+                )
+            except InvalidCheck as e:
+                log.warning("Check %s can't be printed: %s", doc.id, e)
+                invalid.append(doc.id)
+                continue
+        if check_debug:
+            log.debug(
+                "Built check %s for %s: hours=%s pay_rate=%s ot_hours=%s holiday_hours=%s",
+                doc.id, emp_name, check_obj.hours_worked, check_obj.pay_rate,
+                check_obj.overtime_hours, check_obj.holiday_hours,
+            )
+        check_objects.append(check_obj)
+    if invalid:
+        raise PrintJobError(f"Checks without a valid checkNumber: {', '.join(invalid)}", 422)
+
+    # YTD figures for the stubs, one batched read for the whole job
+    with stage("reference_lookup"):
+        attach_ytd(firestore_db, check_docs, check_objects)
+    return check_objects
+
+
+def render_checks(check_objects):
+    from PyPDF2 import PdfMerger
+
+    observe_checks(len(check_objects))
+    merger = PdfMerger()
+    for check in check_objects:
+        with stage("render"):
+            pdf_data = generate_clean_check(check)
+        with stage("merge"):
+            merger.append(BytesIO(pdf_data))
+    output = BytesIO()
+    with stage("merge"):
+        merger.write(output)
+        merger.close()
+    output.seek(0)
+    observe_output(output.getbuffer().nbytes)
+    return output
+
+
+def run_print_job(firestore_db, selector):
+    # The merged PDF for the selector's checks, as a send_file response
+    with stage("firestore_query"):
+        check_docs = selector.fetch(firestore_db)
+    if not check_docs:
+        raise PrintJobError(selector.not_found, 404)
+    output = render_checks(build_checks(firestore_db, selector, check_docs))
+    return send_file(
+        output,
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=selector.filename,
+    )
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from functools import wraps
+
+from flask import jsonify, make_response, request, send_file
+
+from auth import current_user, is_admin
+from log import get_logger
+
+log = get_logger("profiling")
+
+# --- On-demand request profiling
+# An admin adds "?profile=1" or an "X-Profile: 1" header to a print request.
+# The request then runs under pyinstrument (sampling) plus tracemalloc; the
+# speedscope profile and an allocation summary are written to PROFILE_DIR and
+# the response carries X-Profile-Id / X-Profile-Url headers pointing at them.
+# Without the flag the wrapped view is called directly; nothing is imported
+# or started.
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR", os.path.join(os.path.dirname(__file__), "instance", "profiles")
+)
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.001"))
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 30
+
+
+def _profile_requested():
+    return request.headers.get("X-Profile") == "1" or request.args.get("profile") == "1"
+
+
+def _profile_path(profile_id, kind):
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{kind}.json")
+
+
+def _allocation_summary(snapshot, peak_bytes, duration):
+    stats = snapshot.statistics("lineno")
+    return {
+        "durationSeconds": round(duration, 4),
+        "peakBytes": peak_bytes,
+        "totalBytes": sum(s.size for s in stats),
+        "top": [
+            {
+                "location": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                "bytes": s.size,
+                "count": s.count,
+            }
+            for s in stats[:TOP_ALLOCATIONS]
+        ],
+    }
+
+
+def _run_profiled(view, args, kwargs):
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    profile_id = uuid.uuid4().hex
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+
+    profiler = Profiler(interval=SAMPLE_INTERVAL)
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        response = make_response(view(*args, **kwargs))
+    finally:
+        profiler.stop()
+        duration = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        if not already_tracing:
+            tracemalloc.stop()
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_profile_path(profile_id, "speedscope"), "w") as f:
+        f.write(profiler.output(renderer=SpeedscopeRenderer()))
+    summary = _allocation_summary(snapshot, peak_bytes, duration)
+    summary.update({"path": request.full_path, "method": request.method})
+    with open(_profile_path(profile_id, "allocations"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    log.info(
+        "Profiled %s in %.3fs",
+        request.path, duration,
+        extra={"fields": {"profile_id": profile_id, "peak_bytes": peak_bytes}},
+    )
+    response.headers["X-Profile-Id"] = profile_id
+    response.headers["X-Profile-Url"] = f"/api/profiles/{profile_id}"
+    response.headers["Access-Control-Expose-Headers"] = "X-Profile-Id, X-Profile-Url"
+    return response
+
+
+def profiled(firestore_db):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _profile_requested():
+                return view(*args, **kwargs)
+            if not is_admin(current_user(firestore_db)):
+                return jsonify({"error": "Profiling is only available to admins"}), 403
+            return _run_profiled(view, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def configure_profiling_routes(app, firestore_db):
+
+    def _send_profile(profile_id, kind):
+        if not is_admin(current_user(firestore_db)):
+            return jsonify({"error": "Admin only"}), 403
+        # profile ids are uuid4 hex; reject anything else so the id can't escape PROFILE_DIR
+        if len(profile_id) != 32 or not all(ch in "0123456789abcdef" for ch in profile_id):
+            return jsonify({"error": "Invalid profile id"}), 400
+        path = _profile_path(profile_id, kind)
+        if not os.path.exists(path):
+            return jsonify({"error": "Profile not found"}), 404
+        return send_file(path, mimetype="application/json")
+
+    @app.route("/api/profiles/<profile_id>", methods=["GET"])
+    def get_profile(profile_id):
+        # Open in https://www.speedscope.app
+        return _send_profile(profile_id, "speedscope")
+
+    @app.route("/api/profiles/<profile_id>/allocations", methods=["GET"])
+    def get_profile_allocations(profile_id):
+        return _send_profile(profile_id, "allocations")
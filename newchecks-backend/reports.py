@@ -0,0 +1,275 @@
+from datetime import datetime, timedelta
+
+from flask import jsonify, request
+
+from auth import can_access_company, current_user, is_admin
+from bulk_query import IN_CHUNK_SIZE, IN_QUERY_PARALLELISM, chunked
+from check_fields import to_number
+from firestore_accounting import stream_concurrently
+from log import get_logger
+from metrics import stage
+
+log = get_logger("reports")
+
+# --- Server-side report aggregation (backs Report.tsx)
+# GET /api/reports?companyId=&startDate=YYYY-MM-DD&endDate=YYYY-MM-DD
+#                 &includeUnpaid=true&includeUnreviewed=true
+#                 &breakdowns=company,client,employee
+#
+# Filters are pushed into an indexed Firestore query (companyId / paid /
+# reviewed equality + date range, see firestore.indexes.json). The matching
+# checks are streamed with a field projection and reduced here with
+# to_number, so every breakdown and the totals agree whatever type the
+# amounts were stored as; only the summary rows are returned.
+#
+# Requires a signed-in user. Admins may report on any or all companies;
+# everyone else only on their companyIds (one "in" query per
+# IN_CHUNK_SIZE companies when no companyId is given).
+
+BREAKDOWNS = ("company", "client", "employee")
+
+REPORT_FIELDS = [
+    "companyId", "employeeId", "clientId", "payType", "amount",
+    "hours", "payRate", "overtimeHours", "overtimeRate", "holidayHours", "holidayRate",
+    "perdiemAmount", "perdiemBreakdown",
+    "perdiemMonday", "perdiemTuesday", "perdiemWednesday", "perdiemThursday",
+    "perdiemFriday", "perdiemSaturday", "perdiemSunday",
+    "relationshipDetails",
+]
+PERDIEM_DAYS = (
+    "perdiemMonday", "perdiemTuesday", "perdiemWednesday", "perdiemThursday",
+    "perdiemFriday", "perdiemSaturday", "perdiemSunday",
+)
+
+
+def parse_bool(value, default):
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+def parse_date_range(start_str, end_str):
+    # endDate is inclusive of the whole day
+    start = datetime.strptime(start_str, "%Y-%m-%d") if start_str else None
+    end = datetime.strptime(end_str, "%Y-%m-%d") + timedelta(days=1) if end_str else None
+    return start, end
+
+
+def hourly_amount(d):
+    if d.get("payType") not in ("hourly", "mixed"):
+        return 0.0
+    return (
+        to_number(d.get("hours")) * to_number(d.get("payRate"))
+        + to_number(d.get("overtimeHours")) * to_number(d.get("overtimeRate"))
+        + to_number(d.get("holidayHours")) * to_number(d.get("holidayRate"))
+    )
+
+
+def perdiem_amount(d):
+    if d.get("payType") not in ("perdiem", "mixed"):
+        return 0.0
+    if d.get("perdiemBreakdown"):
+        return sum(to_number(d.get(day)) for day in PERDIEM_DAYS)
+    return to_number(d.get("perdiemAmount"))
+
+
+def build_checks_query(firestore_db, company_id=None, start=None, end=None,
+                       include_unpaid=True, include_unreviewed=True):
+    query = firestore_db.collection("checks")
+    if company_id:
+        query = query.where("companyId", "==", company_id)
+    if not include_unpaid:
+        query = query.where("paid", "==", True)
+    if not include_unreviewed:
+        query = query.where("reviewed", "==", True)
+    if start:
+        query = query.where("date", ">=", start)
+    if end:
+        query = query.where("date", "<", end)
+    return query
+
+
+def _new_row(**fields):
+    row = {"totalChecks": 0, "totalAmount": 0.0, "hourlyAmount": 0.0, "perdiemAmount": 0.0}
+    row.update(fields)
+    return row
+
+
+def _add(row, amount, hourly, perdiem):
+    row["totalChecks"] += 1
+    row["totalAmount"] += amount
+    row["hourlyAmount"] += hourly
+    row["perdiemAmount"] += perdiem
+
+
+def _rounded(row):
+    for key in ("totalAmount", "hourlyAmount", "perdiemAmount"):
+        row[key] = round(row[key], 2)
+    return row
+
+
+def _names(firestore_db, collection, ids):
+    if not ids:
+        return {}
+    refs = [firestore_db.collection(collection).document(i) for i in ids]
+    return {
+        snap.id: (snap.to_dict() or {}).get("name", "")
+        for snap in firestore_db.get_all(refs, field_paths=["name"])
+        if snap.exists
+    }
+
+
+def build_report(companies, checks):
+    company_rows = {}
+    client_rows = {}
+    employee_rows = {}
+    legacy_client_ids = set()
+
+    for d in checks:
+        amount = to_number(d.get("amount"))
+        hourly = hourly_amount(d)
+        perdiem = perdiem_amount(d)
+        company_id = d.get("companyId")
+
+        company = company_rows.get(company_id)
+        if company is None:
+            company = company_rows[company_id] = _new_row(
+                companyId=company_id, companyName=companies.get(company_id, ""), clients={}
+            )
+        _add(company, amount, hourly, perdiem)
+
+        # Per-company client grouping mirrors Report.tsx: a multi-relationship
+        # check is grouped under the joined set of its clients.
+        relationships = d.get("relationshipDetails") or []
+        if relationships:
+            group_id = ",".join(rel.get("clientId", "") for rel in relationships)
+            group_name = ", ".join(rel.get("clientName", "") for rel in relationships)
+            client_ids = {rel.get("clientId"): rel.get("clientName", "") for rel in relationships}
+        else:
+            group_id = d.get("clientId")
+            group_name = None
+            client_ids = {group_id: None} if group_id else {}
+            if group_id:
+                legacy_client_ids.add(group_id)
+        group = company["clients"].get(group_id)
+        if group is None:
+            group = company["clients"][group_id] = _new_row(clientId=group_id, clientName=group_name)
+        _add(group, amount, hourly, perdiem)
+
+        # Client summary: each check counts once for every client it touches
+        for client_id, client_name in client_ids.items():
+            row = client_rows.get(client_id)
+            if row is None:
+                row = client_rows[client_id] = _new_row(clientId=client_id, clientName=client_name, companyId=company_id)
+            _add(row, amount, hourly, perdiem)
+
+        employee_id = d.get("employeeId")
+        row = employee_rows.get(employee_id)
+        if row is None:
+            row = employee_rows[employee_id] = _new_row(employeeId=employee_id, companyId=company_id)
+        _add(row, amount, hourly, perdiem)
+
+    return company_rows, client_rows, employee_rows, legacy_client_ids
+
+
+def configure_report_routes(app, firestore_db):
+
+    @app.route("/api/reports", methods=["GET"])
+    def get_report():
+        try:
+            user = current_user(firestore_db)
+            if not user:
+                return jsonify({"error": "Sign-in required"}), 401
+            company_id = request.args.get("companyId") or None
+            if company_id and not can_access_company(user, company_id):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            try:
+                start, end = parse_date_range(request.args.get("startDate"), request.args.get("endDate"))
+            except ValueError:
+                return jsonify({"error": "startDate/endDate must be in format YYYY-MM-DD"}), 400
+            filters = {
+                "start": start,
+                "end": end,
+                "include_unpaid": parse_bool(request.args.get("includeUnpaid"), True),
+                "include_unreviewed": parse_bool(request.args.get("includeUnreviewed"), True),
+            }
+            requested = request.args.get("breakdowns")
+            breakdowns = [b for b in requested.split(",") if b in BREAKDOWNS] if requested else list(BREAKDOWNS)
+
+            with stage("reference_lookup"):
+                if company_id:
+                    companies = _names(firestore_db, "companies", [company_id])
+                    companies.setdefault(company_id, "")
+                elif is_admin(user):
+                    companies = {
+                        snap.id: (snap.to_dict() or {}).get("name", "")
+                        for snap in firestore_db.collection("companies").select(["name"]).stream()
+                    }
+                else:
+                    own = sorted(set(user.get("companyIds") or []))
+                    companies = {c: "" for c in own}
+                    companies.update(_names(firestore_db, "companies", own))
+
+            response = {
+                "filters": {
+                    "companyId": company_id,
+                    "startDate": request.args.get("startDate"),
+                    "endDate": request.args.get("endDate"),
+                    "includeUnpaid": filters["include_unpaid"],
+                    "includeUnreviewed": filters["include_unreviewed"],
+                },
+            }
+
+            if company_id or is_admin(user):
+                queries = [build_checks_query(firestore_db, company_id=company_id, **filters)]
+            else:
+                base = build_checks_query(firestore_db, **filters)
+                queries = [base.where("companyId", "in", chunk) for chunk in chunked(list(companies), IN_CHUNK_SIZE)]
+            with stage("firestore_query"):
+                results = stream_concurrently([q.select(REPORT_FIELDS) for q in queries], IN_QUERY_PARALLELISM)
+                checks = [snap.to_dict() for snapshots in results for snap in snapshots]
+            with stage("model_build"):
+                company_rows, client_rows, employee_rows, legacy_client_ids = build_report(companies, checks)
+
+            with stage("reference_lookup"):
+                client_names = _names(firestore_db, "clients", [c for c in legacy_client_ids if c])
+                employee_names = _names(firestore_db, "employees", [e for e in employee_rows if e])
+
+            totals = _new_row()
+            for company in company_rows.values():
+                for key in ("totalChecks", "totalAmount", "hourlyAmount", "perdiemAmount"):
+                    totals[key] += company[key]
+            response["totals"] = _rounded(totals)
+
+            if "company" in breakdowns:
+                companies_out = []
+                for company in company_rows.values():
+                    groups = company.pop("clients")
+                    for group in groups.values():
+                        if group["clientName"] is None:
+                            group["clientName"] = client_names.get(group["clientId"], "Unknown Client")
+                    company["clientBreakdown"] = [_rounded(g) for g in groups.values()]
+                    companies_out.append(_rounded(company))
+                companies_out.sort(key=lambda r: r["totalAmount"], reverse=True)
+                response["companies"] = companies_out
+            if "client" in breakdowns:
+                for row in client_rows.values():
+                    if row["clientName"] is None:
+                        row["clientName"] = client_names.get(row["clientId"], "Unknown Client")
+                    row["companyName"] = companies.get(row["companyId"], "")
+                response["clients"] = sorted(
+                    (_rounded(r) for r in client_rows.values()), key=lambda r: r["totalAmount"], reverse=True
+                )
+            if "employee" in breakdowns:
+                for row in employee_rows.values():
+                    row["employeeName"] = employee_names.get(row["employeeId"], "")
+                    row["companyName"] = companies.get(row["companyId"], "")
+                response["employees"] = sorted(
+                    (_rounded(r) for r in employee_rows.values()), key=lambda r: r["totalAmount"], reverse=True
+                )
+
+            return jsonify(response)
+
+        except Exception as e:
+            log.exception("Report request failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,298 @@
+from flask import jsonify, request
+
+from auth import can_access_company, current_user, is_admin
+from bulk_query import IN_CHUNK_SIZE, IN_QUERY_PARALLELISM, chunked
+from check_projections import Deltas, project_check, stage_check_update, stage_stamp, with_stored_stamps
+from firestore_accounting import stream_concurrently
+from log import get_logger
+from metrics import observe_checks, stage
+from weeks import DEFAULT_RULE, load_week_rules, week_checks
+
+log = get_logger("reviews")
+
+# --- Review state transitions
+# POST /api/checks/transition
+#   {"action": "send_for_review" | "reviewed" | "paid",
+#    "checkIds": [...]}  or  {"companyId": ..., "weekKey": "YYYY-MM-DD"}
+#
+#   send_for_review  creates a pending reviewRequest/{checkId} for every
+#                    unreviewed check that has no open request
+#   reviewed         (admin) sets checks.reviewed and closes the check's
+#                    reviewRequest docs, creating one if none exists
+#   paid             (admin) sets checks.paid on reviewed checks
+#
+# The check flags, their projection increments and the reviewRequest docs
+# for a group of checks go into one WriteBatch, so the flags and requests
+# never disagree. Groups are cut by write count (check and request writes
+# plus the derived documents their increments touch) to stay within
+# MAX_BATCH_WRITES. Every write is preconditioned on the update time of
+# the snapshot it was planned from (new requests are creates), so a check
+# or request changed since it was read fails the batch instead of being
+# overwritten; the group is then re-read and planned again, up to
+# TRANSITION_ATTEMPTS times. Checks already in the target state are skipped.
+#
+# Reviewing a whole week (companyId + weekKey) also closes the week-level
+# reviewRequests the React app files (companyId + weekKey, no checkId) once
+# every check of the week is reviewed.
+ACTIONS = ("send_for_review", "reviewed", "paid")
+ADMIN_ACTIONS = ("reviewed", "paid")
+REVIEW_COLLECTION = "reviewRequest"
+MAX_CHECKS = 2000
+MAX_BATCH_WRITES = 500
+TRANSITION_ATTEMPTS = 3
+
+
+def load_checks(firestore_db, body):
+    if body.get("checkIds"):
+        ids = list(dict.fromkeys(body["checkIds"]))[:MAX_CHECKS]
+        refs = [firestore_db.collection("checks").document(i) for i in ids]
+        return [snap for snap in firestore_db.get_all(refs) if snap.exists]
+    return week_checks(firestore_db, body["companyId"], body["weekKey"], limit=MAX_CHECKS)
+
+
+def load_review_requests(firestore_db, check_ids):
+    # {checkId: [snapshot, ...]}
+    queries = [
+        firestore_db.collection(REVIEW_COLLECTION).where("checkId", "in", chunk)
+        for chunk in chunked(check_ids, IN_CHUNK_SIZE)
+    ]
+    by_check = {}
+    for snapshots in stream_concurrently(queries, IN_QUERY_PARALLELISM):
+        for snap in snapshots:
+            by_check.setdefault(snap.get("checkId"), []).append(snap)
+    return by_check
+
+
+def needs_transition(action, check, requests):
+    if action == "send_for_review":
+        if check.get("reviewed"):
+            return False, "already reviewed"
+        if any(r.get("status") == "pending" for r in requests):
+            return False, "already sent for review"
+        return True, None
+    if action == "reviewed":
+        if check.get("reviewed") and all(r.get("reviewed") for r in requests):
+            return False, "already reviewed"
+        return True, None
+    if check.get("paid"):
+        return False, "already paid"
+    if not check.get("reviewed"):
+        return False, "not reviewed"
+    return True, None
+
+
+class Transition:
+    # One check's planned writes: the check changes and request writes, each
+    # (ref, data, snapshot) where snapshot is None for a create and the
+    # precondition otherwise, and the derived documents its increments touch
+    __slots__ = ("snapshot", "check", "changes", "request_writes", "derived")
+
+    def __init__(self, snapshot, check, changes, request_writes, derived):
+        self.snapshot = snapshot
+        self.check = check
+        self.changes = changes
+        self.request_writes = request_writes
+        self.derived = derived
+
+    @property
+    def writes(self):
+        return len(self.request_writes) + (1 if self.changes else 0)
+
+
+def plan_transition(firestore_db, action, user, snapshot, check, requests, week):
+    # check: the snapshot's data, with its stored stamp restored
+    from google.cloud.firestore import DELETE_FIELD, SERVER_TIMESTAMP
+
+    collection = firestore_db.collection(REVIEW_COLLECTION)
+    changes = {}
+    writes = []
+    if action == "send_for_review":
+        pending = {
+            "checkId": snapshot.id,
+            "createdBy": user["uid"],
+            "createdAt": SERVER_TIMESTAMP,
+            "companyId": check.get("companyId"),
+            "weekKey": week,
+            "status": "pending",
+            "reviewed": False,
+        }
+        existing = next((r for r in requests if r.id == snapshot.id), None)
+        if existing is not None:
+            pending.update(reviewedBy=DELETE_FIELD, reviewedAt=DELETE_FIELD)
+        writes.append((collection.document(snapshot.id), pending, existing))
+    elif action == "reviewed":
+        if not check.get("reviewed"):
+            changes["reviewed"] = True
+        closed = {"reviewed": True, "status": "reviewed",
+                  "reviewedBy": user["uid"], "reviewedAt": SERVER_TIMESTAMP}
+        if requests:
+            writes.extend((collection.document(r.id), closed, r) for r in requests if not r.get("reviewed"))
+        else:
+            writes.append((collection.document(snapshot.id), dict(
+                closed,
+                checkId=snapshot.id,
+                createdBy=check.get("createdBy") or user["uid"],
+                createdAt=SERVER_TIMESTAMP,
+                companyId=check.get("companyId"),
+                weekKey=week,
+            ), None))
+    else:
+        changes["paid"] = True
+
+    derived = Deltas()
+    if changes:
+        project_check(derived, check, dict(check, **changes))
+        stage_stamp(derived, snapshot.id, {})
+    return Transition(snapshot, check, changes, writes, derived.documents())
+
+
+def write_groups(transitions):
+    # Splits the transitions into WriteBatch-sized groups
+    group, writes, derived = [], 0, set()
+    for transition in transitions:
+        touched = derived | transition.derived
+        if group and writes + transition.writes + len(touched) > MAX_BATCH_WRITES:
+            yield group
+            group, writes, touched = [], 0, set(transition.derived)
+        group.append(transition)
+        writes += transition.writes
+        derived = touched
+    if group:
+        yield group
+
+
+def commit_group(firestore_db, group):
+    batch = firestore_db.batch()
+    deltas = Deltas()
+    for transition in group:
+        if transition.changes:
+            option = firestore_db.write_option(last_update_time=transition.snapshot.update_time)
+            ref = firestore_db.collection("checks").document(transition.snapshot.id)
+            stage_check_update(deltas, batch, ref, transition.check, transition.changes, option=option)
+        for ref, data, precondition in transition.request_writes:
+            if precondition is None:
+                batch.create(ref, data)
+            else:
+                batch.update(ref, data, option=firestore_db.write_option(last_update_time=precondition.update_time))
+    deltas.flush(firestore_db, batch)
+    batch.commit()
+
+
+def run_transition(firestore_db, action, user, snapshots, rules):
+    # (moved check ids, skipped [{"id", "reason"}])
+    from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+
+    moved = []
+    skipped = []
+    conflicts = []
+    for attempt in range(TRANSITION_ATTEMPTS):
+        if attempt:
+            with stage("firestore_query"):
+                refs = [firestore_db.collection("checks").document(i) for i in conflicts]
+                found = {snap.id: snap for snap in firestore_db.get_all(refs) if snap.exists}
+            skipped.extend({"id": i, "reason": "not found"} for i in conflicts if i not in found)
+            snapshots = list(found.values())
+        with stage("reference_lookup"):
+            requests_by_check = load_review_requests(firestore_db, [s.id for s in snapshots]) if snapshots else {}
+            checks = with_stored_stamps(firestore_db, firestore_db, {snap.id: snap.to_dict() for snap in snapshots})
+
+        transitions = []
+        for snap in snapshots:
+            check = checks[snap.id]
+            requests = requests_by_check.get(snap.id, [])
+            ok, reason = needs_transition(action, check, requests)
+            if not ok:
+                skipped.append({"id": snap.id, "reason": reason})
+                continue
+            rule = rules.get(check.get("companyId"), DEFAULT_RULE)
+            week = rule.key(check.get("date")) or check.get("weekKey") or "global"
+            transitions.append(plan_transition(firestore_db, action, user, snap, check, requests, week))
+
+        conflicts = []
+        with stage("firestore_write"):
+            for group in write_groups(transitions):
+                try:
+                    commit_group(firestore_db, group)
+                except (AlreadyExists, FailedPrecondition) as e:
+                    log.info("Transition %s: %d checks changed concurrently (%s)", action, len(group), e)
+                    conflicts.extend(t.snapshot.id for t in group)
+                else:
+                    moved.extend(t.snapshot.id for t in group)
+        if not conflicts:
+            break
+    else:
+        skipped.extend({"id": i, "reason": "changed during the transition, try again"} for i in conflicts)
+    return moved, skipped
+
+
+def close_week_requests(firestore_db, user, company_id, week_keys):
+    # Closes the open week-level reviewRequests of a company's week
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    query = (
+        firestore_db.collection(REVIEW_COLLECTION)
+        .where("companyId", "==", company_id)
+        .where("weekKey", "in", list(dict.fromkeys(week_keys)))
+    )
+    with stage("reference_lookup"):
+        open_requests = [
+            snap for snap in query.stream()
+            if not (snap.to_dict() or {}).get("checkId") and not (snap.to_dict() or {}).get("reviewed")
+        ]
+    if not open_requests:
+        return []
+    closed = {"reviewed": True, "status": "reviewed", "reviewedBy": user["uid"], "reviewedAt": SERVER_TIMESTAMP}
+    batch = firestore_db.batch()
+    for snap in open_requests:
+        batch.update(firestore_db.collection(REVIEW_COLLECTION).document(snap.id), closed)
+    with stage("firestore_write"):
+        batch.commit()
+    return [snap.id for snap in open_requests]
+
+
+def configure_review_routes(app, firestore_db):
+
+    @app.route("/api/checks/transition", methods=["POST"])
+    def transition_checks():
+        try:
+            user = current_user(firestore_db)
+            if not user:
+                return jsonify({"error": "Sign-in required"}), 401
+            body = request.get_json() or {}
+            action = body.get("action")
+            if action not in ACTIONS:
+                return jsonify({"error": f"action must be one of {', '.join(ACTIONS)}"}), 400
+            if action in ADMIN_ACTIONS and not is_admin(user):
+                return jsonify({"error": "Admin only"}), 403
+            if not body.get("checkIds") and not (body.get("companyId") and body.get("weekKey")):
+                return jsonify({"error": "Send checkIds or companyId and weekKey"}), 400
+
+            with stage("firestore_query"):
+                try:
+                    snapshots = load_checks(firestore_db, body)
+                except ValueError:
+                    return jsonify({"error": "weekKey must be in format YYYY-MM-DD"}), 400
+            company_ids = {snap.get("companyId") for snap in snapshots}
+            if not body.get("checkIds"):
+                company_ids.add(body["companyId"])
+            if not all(can_access_company(user, c) for c in company_ids):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            with stage("reference_lookup"):
+                rules = load_week_rules(firestore_db, company_ids)
+
+            moved, skipped = run_transition(firestore_db, action, user, snapshots, rules)
+            response = {"action": action, "updated": moved, "skipped": skipped}
+            if action == "reviewed" and not body.get("checkIds"):
+                if all(s["reason"] == "already reviewed" for s in skipped):
+                    rule = rules.get(body["companyId"], DEFAULT_RULE)
+                    response["closedWeekRequests"] = close_week_requests(
+                        firestore_db, user, body["companyId"], [rule.normalize(body["weekKey"]), body["weekKey"]],
+                    )
+
+            observe_checks(len(moved))
+            log.info("Transition %s: %d moved, %d skipped", action, len(moved), len(skipped))
+            return jsonify(response)
+
+        except Exception as e:
+            log.exception("Check transition failed")
+            return jsonify({"error": str(e)}), 500
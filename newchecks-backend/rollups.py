@@ -0,0 +1,157 @@
+from flask import jsonify, request
+
+from auth import can_access_company, current_user
+from check_fields import PAY_KINDS, amount_cents, check_status, pay_cents_by_client
+from check_projections import delete_collection, register
+from log import get_logger
+from metrics import stage
+from weeks import check_week_key, week_rule_for
+
+log = get_logger("rollups")
+
+# --- Weekly rollups
+# One document per (company, week) in weeklyRollups/{companyId}_{weekKey},
+# maintained by the "weeklyRollups" check projection:
+#   companyId, weekKey
+#   count, grossCents, hourlyCents, overtimeCents, holidayCents, perdiemCents
+#   byStatus.<status>   {count, grossCents}          pending / reviewed / paid
+#   byClient.<clientId> {count, grossCents, hourlyCents, ...}
+#   byCreator.<uid>     {count, grossCents}          who wrote the checks
+# A client's gross is the whole check amount when the check pays one client
+# and the sum of that client's relationship lines otherwise. Screens that need "company X,
+# week W, split by client and pay type" read these instead of the checks.
+ROLLUP_COLLECTION = "weeklyRollups"
+MAX_WEEKS = 104
+
+
+def rollup_id(company_id, week):
+    return f"{company_id}_{week}"
+
+
+def rollup_contribution(check):
+    company_id = check.get("companyId")
+    week = check_week_key(check)
+    if not company_id or not week:
+        return None
+    by_client = pay_cents_by_client(check)
+    cents = amount_cents(check.get("amount"))
+    clients = {
+        client_id: dict(parts, grossCents=cents if len(by_client) == 1 else sum(parts.values()))
+        for client_id, parts in by_client.items()
+    }
+    contribution = {
+        "companyId": company_id,
+        "week": week,
+        "status": check_status(check),
+        "createdBy": check.get("createdBy"),
+        "grossCents": cents,
+        "clients": clients,
+    }
+    for kind in PAY_KINDS:
+        contribution[f"{kind}Cents"] = sum(parts[kind] for parts in by_client.values())
+    return contribution
+
+
+def apply_rollup(deltas, contribution, sign):
+    doc_id = rollup_id(contribution["companyId"], contribution["week"])
+
+    def add(path, value):
+        deltas.increment(ROLLUP_COLLECTION, doc_id, path, sign * value)
+
+    deltas.put(ROLLUP_COLLECTION, doc_id, "companyId", contribution["companyId"])
+    deltas.put(ROLLUP_COLLECTION, doc_id, "weekKey", contribution["week"])
+    add(("count",), 1)
+    add(("grossCents",), contribution["grossCents"])
+    for kind in PAY_KINDS:
+        add((f"{kind}Cents",), contribution[f"{kind}Cents"])
+    add(("byStatus", contribution["status"], "count"), 1)
+    add(("byStatus", contribution["status"], "grossCents"), contribution["grossCents"])
+    if contribution.get("createdBy"):
+        add(("byCreator", contribution["createdBy"], "count"), 1)
+        add(("byCreator", contribution["createdBy"], "grossCents"), contribution["grossCents"])
+    for client_id, parts in contribution["clients"].items():
+        add(("byClient", client_id, "count"), 1)
+        for field, value in parts.items():
+            if field != "grossCents":
+                field = f"{field}Cents"
+            add(("byClient", client_id, field), value)
+
+
+def reset_rollups(firestore_db):
+    delete_collection(firestore_db, ROLLUP_COLLECTION)
+
+
+register("weeklyRollups", rollup_contribution, apply_rollup, reset_rollups)
+
+
+def _dollars(counter):
+    counter = counter or {}
+    row = {
+        "count": int(counter.get("count", 0)),
+        "gross": round(counter.get("grossCents", 0) / 100, 2),
+    }
+    for kind in PAY_KINDS:
+        if f"{kind}Cents" in counter:
+            row[kind] = round(counter[f"{kind}Cents"] / 100, 2)
+    return row
+
+
+def configure_rollup_routes(app, firestore_db):
+
+    # GET /api/rollups?companyId=&startWeek=YYYY-MM-DD&endWeek=YYYY-MM-DD
+    @app.route("/api/rollups", methods=["GET"])
+    def get_rollups():
+        try:
+            company_id = request.args.get("companyId")
+            if not company_id:
+                return jsonify({"error": "companyId is required"}), 400
+            if not can_access_company(current_user(firestore_db), company_id):
+                return jsonify({"error": "Not allowed for this company"}), 403
+            rule = week_rule_for(firestore_db, company_id)
+            try:
+                start_week = rule.normalize(request.args["startWeek"]) if request.args.get("startWeek") else None
+                end_week = rule.normalize(request.args["endWeek"]) if request.args.get("endWeek") else None
+            except ValueError:
+                return jsonify({"error": "startWeek and endWeek must be in format YYYY-MM-DD"}), 400
+
+            query = firestore_db.collection(ROLLUP_COLLECTION).where("companyId", "==", company_id)
+            if start_week:
+                query = query.where("weekKey", ">=", start_week)
+            if end_week:
+                query = query.where("weekKey", "<=", end_week)
+            query = query.order_by("weekKey", direction="DESCENDING").limit(MAX_WEEKS)
+            with stage("firestore_query"):
+                rollups = [snap.to_dict() for snap in query.stream()]
+                rollups = [r for r in rollups if r.get("count")]
+
+            client_ids = {c for r in rollups for c in (r.get("byClient") or {}) if c != "unassigned"}
+            with stage("reference_lookup"):
+                refs = [firestore_db.collection("clients").document(c) for c in client_ids]
+                client_names = {
+                    snap.id: (snap.to_dict() or {}).get("name", "")
+                    for snap in (firestore_db.get_all(refs, field_paths=["name"]) if refs else [])
+                    if snap.exists
+                }
+
+            weeks = []
+            for rollup in rollups:
+                week = _dollars(rollup)
+                week["weekKey"] = rollup.get("weekKey")
+                week["byStatus"] = {
+                    status: _dollars((rollup.get("byStatus") or {}).get(status))
+                    for status in ("pending", "reviewed", "paid")
+                }
+                clients = [
+                    dict(_dollars(counter), clientId=client_id, clientName=client_names.get(client_id, ""))
+                    for client_id, counter in (rollup.get("byClient") or {}).items()
+                    if counter.get("count")
+                ]
+                clients.sort(key=lambda row: row["gross"], reverse=True)
+                week["clients"] = clients
+                weeks.append(week)
+
+            return jsonify({"companyId": company_id, "weeks": weeks})
+
+        except Exception as e:
+            log.exception("Rollup request failed")
+            return jsonify({"error": str(e)}), 500
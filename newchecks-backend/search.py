@@ -0,0 +1,369 @@
+import bisect
+import itertools
+import re
+import threading
+import time
+
+from flask import jsonify, request
+
+from auth import current_user, is_admin
+from log import get_logger
+from startup import add_warmup_task
+import mirror
+
+log = get_logger("search")
+
+# --- Search over employees, clients and checks
+# An in-memory inverted index built from the SQLite mirror (mirror.py) and
+# kept current by its change feed, so searching never reads Firestore.
+#
+#   postings   token -> {doc key}           exact and prefix lookups; the
+#   tokens     sorted list of all tokens    prefix range comes from bisect
+#   variants   deletion variant -> {token}  typo tolerance
+#
+# Names, memos, client names and check numbers are tokenized. Every word of
+# the query must match a token by prefix ("garc" -> garcia) or, for words of
+# FUZZY_MIN_LENGTH letters or more, within one edit ("garica" -> garcia).
+# Variants are the one-letter deletions of each token's first FUZZY_PREFIX
+# letters (the symmetric-delete scheme), so a typo lookup is a few dict hits
+# instead of a scan. Numbers only match by prefix.
+#
+# The index is built by the warmup thread (startup.py) and remembers the
+# mirror_sync_state.version of each collection it covers. Changes made in
+# this process arrive through the mirror's change feed; when mirror-sync or
+# the mirror listener changes the tables from another process, the
+# versions move past the index's and the next search (checking at most
+# every INDEX_CHECK_SECONDS) rebuilds it from SQLite.
+INDEXED_COLLECTIONS = {"employees": "employee", "clients": "client", "checks": "check"}
+INDEX_CHECK_SECONDS = 5
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+FUZZY_PREFIX = 6
+FUZZY_MIN_LENGTH = 4
+MAX_PREFIX_TOKENS = 500
+RANK_LIMIT = 5000
+TYPES = ("check", "employee", "client")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_EMPTY = frozenset()
+
+
+def tokenize(*texts):
+    tokens = set()
+    for text in texts:
+        if text is None or text == "":
+            continue
+        tokens.update(_TOKEN_RE.findall(str(text).lower()))
+    return tokens
+
+
+def deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def within_one_edit(a, b):
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or (
+            i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+        )
+    return a[i:] == b[i + 1:]
+
+
+class SearchIndex:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = {}
+        self.tokens = []
+        self.variants = {}
+        self.docs = {}
+        self.by_type = {}
+        self.by_company = {}
+        self.client_names = {}
+        self.built_at = None
+        self.versions = {}
+        self.checked_at = 0.0
+        # While rebuilding, new tokens are appended and sorted once at the end
+        self._bulk = False
+
+    # --- Maintenance
+
+    def _add_token(self, token, key):
+        posting = self.postings.get(token)
+        if posting is None:
+            posting = self.postings[token] = set()
+            if self._bulk:
+                self.tokens.append(token)
+            else:
+                bisect.insort(self.tokens, token)
+            if not token.isdigit():
+                head = token[:FUZZY_PREFIX]
+                for variant in deletes(head) | {head}:
+                    self.variants.setdefault(variant, set()).add(token)
+        posting.add(key)
+
+    def _remove_token(self, token, key):
+        posting = self.postings.get(token)
+        if posting is None:
+            return
+        posting.discard(key)
+        if posting:
+            return
+        del self.postings[token]
+        del self.tokens[bisect.bisect_left(self.tokens, token)]
+        if not token.isdigit():
+            head = token[:FUZZY_PREFIX]
+            for variant in deletes(head) | {head}:
+                holders = self.variants.get(variant)
+                if holders is not None:
+                    holders.discard(token)
+                    if not holders:
+                        del self.variants[variant]
+
+    def remove(self, key):
+        with self.lock:
+            doc = self.docs.pop(key, None)
+            if doc:
+                for token in doc["tokens"]:
+                    self._remove_token(token, key)
+                self.by_type[doc["type"]].discard(key)
+                for company_id in doc["companyIds"]:
+                    self.by_company[company_id].discard(key)
+
+    def put(self, key, doc, tokens):
+        with self.lock:
+            self.remove(key)
+            doc["tokens"] = tokens
+            self.docs[key] = doc
+            for token in tokens:
+                self._add_token(token, key)
+            self.by_type.setdefault(doc["type"], set()).add(key)
+            for company_id in doc["companyIds"]:
+                self.by_company.setdefault(company_id, set()).add(key)
+
+    def put_document(self, collection, doc_id, data):
+        if collection == "employees":
+            self.put(("employee", doc_id), {
+                "type": "employee",
+                "id": doc_id,
+                "title": data.get("name", ""),
+                "subtitle": data.get("position") or data.get("address") or "",
+                "companyIds": _company_ids(data),
+            }, tokenize(data.get("name")))
+        elif collection == "clients":
+            self.client_names[doc_id] = data.get("name", "")
+            self.put(("client", doc_id), {
+                "type": "client",
+                "id": doc_id,
+                "title": data.get("name", ""),
+                "subtitle": data.get("contactPerson") or data.get("address") or "",
+                "companyIds": _company_ids(data),
+            }, tokenize(data.get("name")))
+        elif collection == "checks":
+            client_names = [rel.get("clientName") for rel in data.get("relationshipDetails") or []]
+            if not client_names and data.get("clientId"):
+                client_names = [self.client_names.get(data["clientId"])]
+            self.put(("check", doc_id), {
+                "type": "check",
+                "id": doc_id,
+                "title": f"#{data.get('checkNumber', '')} {data.get('employeeName', '')}".strip(),
+                "subtitle": ", ".join(n for n in client_names if n) or data.get("memo") or "",
+                "companyIds": _company_ids(data),
+                "date": data.get("date"),
+                "amount": data.get("amount"),
+            }, tokenize(data.get("employeeName"), data.get("checkNumber"), data.get("memo"), *client_names))
+
+    def apply_mirror_change(self, collection, upserted, removed, version):
+        kind = INDEXED_COLLECTIONS.get(collection)
+        if kind is None or self.built_at is None:
+            return
+        with self.lock:
+            for doc_id, data in upserted:
+                self.put_document(collection, doc_id, data)
+            for doc_id in removed:
+                self.remove((kind, doc_id))
+            # A gap means another process changed the table in between;
+            # the version stays behind so the next check rebuilds
+            if self.versions.get(collection, 0) + 1 == version:
+                self.versions[collection] = version
+
+    def behind(self, versions):
+        return any(versions.get(c, 0) > self.versions.get(c, 0) for c in INDEXED_COLLECTIONS)
+
+    def rebuild(self, versions):
+        from models import MirrorCheck, MirrorClient, MirrorEmployee
+
+        fresh = SearchIndex()
+        fresh.built_at = time.time()
+        fresh.versions = dict(versions)
+        fresh._bulk = True
+        # Clients first so legacy single-client checks can name theirs
+        for collection, model in (("clients", MirrorClient), ("employees", MirrorEmployee), ("checks", MirrorCheck)):
+            for row in model.query.yield_per(2000):
+                fresh.put_document(collection, row.id, row.data or {})
+        fresh.tokens.sort()
+        with self.lock:
+            for name in ("postings", "tokens", "variants", "docs", "by_type", "by_company", "client_names",
+                         "built_at", "versions"):
+                setattr(self, name, getattr(fresh, name))
+        log.info("Search index built", extra={"fields": {"documents": len(self.docs), "tokens": len(self.tokens)}})
+
+    # --- Lookup
+
+    def _matches(self, word):
+        # Posting sets matching one query word, as (exact, [prefix], [typo]).
+        # The index's own sets are returned, never copied or modified.
+        exact = self.postings.get(word, _EMPTY)
+        prefix = []
+        start = bisect.bisect_left(self.tokens, word)
+        for token in self.tokens[start:start + MAX_PREFIX_TOKENS]:
+            if not token.startswith(word):
+                break
+            if token != word:
+                prefix.append(self.postings[token])
+        typo = []
+        if len(word) >= FUZZY_MIN_LENGTH and not word.isdigit():
+            head = word[:FUZZY_PREFIX]
+            candidates = set()
+            for variant in deletes(head) | {head}:
+                candidates |= self.variants.get(variant, _EMPTY)
+            n = len(word)
+            for token in candidates:
+                if token.startswith(word):
+                    continue
+                # The typo may have added or dropped a letter of the prefix
+                if any(within_one_edit(word, token[:m]) for m in (n - 1, n, n + 1)):
+                    typo.append(self.postings[token])
+        return exact, prefix, typo
+
+    def search(self, query, types=TYPES, company_ids=None, limit=DEFAULT_LIMIT):
+        # Returns (results, total matches). A document scores 3 per query word
+        # it matches exactly, 2 by prefix and 1 with a typo. Up to RANK_LIMIT
+        # matches are fully ranked; beyond that the page is filled tier by
+        # tier from the longest word, so a common surname stays fast.
+        words = sorted(tokenize(query), key=len, reverse=True)
+        if not words:
+            return [], 0
+        with self.lock:
+            tiers = [self._matches(word) for word in words]
+            sets = [exact.union(*prefix, *typo) if prefix or typo else exact for exact, prefix, typo in tiers]
+            candidates = min(sets, key=len)
+            for matched in sets:
+                if matched is not candidates:
+                    candidates = candidates & matched
+            if set(types) != set(TYPES):
+                candidates = candidates & set().union(*(self.by_type.get(t, _EMPTY) for t in types))
+            if company_ids is not None:
+                candidates = candidates & set().union(*(self.by_company.get(c, _EMPTY) for c in company_ids))
+            total = len(candidates)
+
+            def score(key):
+                return sum(
+                    3 if key in exact else 2 if any(key in p for p in prefix) else 1
+                    for exact, prefix, _typo in tiers
+                )
+
+            if total <= RANK_LIMIT:
+                ranked = sorted(candidates, key=lambda key: (-score(key), TYPES.index(key[0]), self.docs[key]["title"]))
+                ranked = ranked[:limit]
+            else:
+                exact, prefix, typo = tiers[0]
+                ranked = []
+                for key in itertools.chain(exact, *prefix, *typo):
+                    if key in candidates and key not in ranked:
+                        ranked.append(key)
+                        if len(ranked) == limit:
+                            break
+            results = [
+                dict({k: v for k, v in self.docs[key].items() if k != "tokens"}, score=score(key))
+                for key in ranked
+            ]
+        return results, total
+
+
+def _company_ids(data):
+    company_id = data.get("companyId")
+    ids = company_id if isinstance(company_id, list) else [company_id]
+    return [c for c in ids + list(data.get("companyIds") or []) if c]
+
+
+SEARCH_INDEX = SearchIndex()
+_build_lock = threading.Lock()
+
+
+def _mirror_versions():
+    from models import MirrorSyncState
+
+    states = MirrorSyncState.query.filter(MirrorSyncState.collection.in_(list(INDEXED_COLLECTIONS))).all()
+    return {s.collection: s.version or 0 for s in states}
+
+
+def ensure_index():
+    # Builds the index if there is none, and rebuilds it when the mirror
+    # was changed by another process
+    built_at = SEARCH_INDEX.built_at
+    now = time.monotonic()
+    if built_at is not None and now - SEARCH_INDEX.checked_at < INDEX_CHECK_SECONDS:
+        return
+    SEARCH_INDEX.checked_at = now
+    # Read before the rows, so changes made during a rebuild trigger another
+    versions = _mirror_versions()
+    if built_at is not None and not SEARCH_INDEX.behind(versions):
+        return
+    with _build_lock:
+        if SEARCH_INDEX.built_at is built_at:
+            SEARCH_INDEX.rebuild(versions)
+
+
+def warm_index(app):
+    with app.app_context():
+        try:
+            ensure_index()
+        except Exception:
+            # e.g. the mirror tables don't exist yet (flask --app app mirror-init)
+            log.exception("Search index warmup failed; it is built on the next search")
+
+
+def configure_search_routes(app, firestore_db):
+    mirror.subscribe(SEARCH_INDEX.apply_mirror_change)
+    add_warmup_task("search_index", lambda: warm_index(app))
+
+    # GET /api/search?q=garcia&types=check,employee&companyId=&limit=20
+    @app.route("/api/search", methods=["GET"])
+    def search():
+        try:
+            user = current_user(firestore_db)
+            if not user:
+                return jsonify({"error": "Sign-in required"}), 401
+            query = (request.args.get("q") or "").strip()
+            if not query:
+                return jsonify({"error": "q is required"}), 400
+            types = tuple(t for t in (request.args.get("types") or ",".join(TYPES)).split(",") if t in TYPES)
+            limit = min(int(request.args.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+            company_ids = None if is_admin(user) else set(user.get("companyIds") or [])
+            if request.args.get("companyId"):
+                wanted = {request.args["companyId"]}
+                company_ids = wanted if company_ids is None else company_ids & wanted
+
+            ensure_index()
+            started = time.perf_counter()
+            results, total = SEARCH_INDEX.search(query, types=types, company_ids=company_ids, limit=limit)
+            took_ms = round((time.perf_counter() - started) * 1000, 2)
+            return jsonify({
+                "query": query,
+                "results": results,
+                "total": total,
+                "tookMs": took_ms,
+                "indexedDocuments": len(SEARCH_INDEX.docs),
+            })
+
+        except Exception as e:
+            log.exception("Search failed")
+            return jsonify({"error": str(e)}), 500
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import jsonify
+
+from log import get_logger
+
+log = get_logger("startup")
+
+# --- Fast start
+# FAST_START=1 defers firebase_admin, the Firestore client, ReportLab,
+# num2words and the MICR font until first use; the warmup thread started by
+# configure_health_routes then loads them in the background. /readyz only
+# answers 200 once warmup has opened the Firestore channel and rendered a
+# dummy check, so traffic isn't routed to a container that would stall on
+# its first print. See bench_startup.py for the startup-time benchmark.
+FAST_START = os.environ.get("FAST_START") == "1"
+CREDENTIALS_PATH = os.path.join(
+    os.path.dirname(__file__), "checks-6fc3e-firebase-adminsdk-fbsvc-fd8e9f9a34.json"
+)
+
+READY = threading.Event()
+_state = {"phase": "starting", "error": None, "timings": {}}
+_process_start = time.perf_counter()
+# (name, task) run by the warmup after the dummy render, each timed under its name
+_warmup_tasks = []
+
+
+def add_warmup_task(name, task):
+    _warmup_tasks.append((name, task))
+
+
+def create_firestore_client():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(CREDENTIALS_PATH))
+    return firestore.client()
+
+
+class LazyFirestoreClient:
+    # Stands in for firestore.client() until the first attribute access
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    self._client = create_firestore_client()
+                    _state["timings"]["firestore_init"] = round(time.perf_counter() - started, 4)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+def _dummy_check():
+    from check_models import Bank, Company, check_from_firestore
+
+    company = Company("Warmup Company", "1 Main St")
+    bank = Bank("Warmup Bank", "000000000", "000000000")
+    data = {
+        "checkNumber": 1001,
+        "amount": 1234.56,
+        "date": datetime(2024, 1, 1),
+        "workWeek": "Work Week 01",
+        "hours": 40,
+        "payRate": 25,
+    }
+    return check_from_firestore(data, company, bank, "Warmup Employee", "warmup")
+
+
+def warmup(firestore_db):
+    from pdf_generator import generate_clean_check, load_resources
+
+    try:
+        _state["phase"] = "opening_firestore"
+        started = time.perf_counter()
+        # Any read opens the gRPC channel and authenticates
+        list(firestore_db.collection("companies").limit(1).stream())
+        _state["timings"]["firestore_channel"] = round(time.perf_counter() - started, 4)
+
+        _state["phase"] = "rendering"
+        started = time.perf_counter()
+        load_resources()
+        import PyPDF2  # loaded here so the first print doesn't pay for it
+        generate_clean_check(_dummy_check())
+        _state["timings"]["dummy_render"] = round(time.perf_counter() - started, 4)
+
+        for name, task in _warmup_tasks:
+            _state["phase"] = name
+            started = time.perf_counter()
+            task()
+            _state["timings"][name] = round(time.perf_counter() - started, 4)
+
+        _state["phase"] = "ready"
+        _state["timings"]["since_process_start"] = round(time.perf_counter() - _process_start, 4)
+        READY.set()
+        log.info("Warmup finished", extra={"fields": {"timings": _state["timings"]}})
+    except Exception as e:
+        _state["phase"] = "failed"
+        _state["error"] = str(e)
+        log.exception("Warmup failed")
+
+
+def start_warmup(firestore_db):
+    thread = threading.Thread(target=warmup, args=(firestore_db,), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def configure_health_routes(app, firestore_db):
+
+    @app.route("/healthz", methods=["GET"])
+    def healthz():
+        # Liveness: the process is up and serving requests
+        return jsonify({"status": "ok"})
+
+    @app.route("/readyz", methods=["GET"])
+    def readyz():
+        body = {
+            "ready": READY.is_set(),
+            "phase": _state["phase"],
+            "fastStart": FAST_START,
+            "timings": _state["timings"],
+        }
+        if _state["error"]:
+            body["error"] = _state["error"]
+        return jsonify(body), (200 if READY.is_set() else 503)
+
+    start_warmup(firestore_db)
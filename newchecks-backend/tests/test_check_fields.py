@@ -0,0 +1,46 @@
+from check_fields import hours_by_client, pay_cents_by_client
+
+
+def react_check(**fields):
+    # A single-client check as the React app writes it: one 'default'
+    # relationship, with hours, rate and per diem only at the top level
+    check = {
+        "clientId": "A",
+        "payType": "hourly",
+        "payRate": "20",
+        "hours": 40,
+        "otHours": 2,
+        "holidayHours": 1,
+        "relationshipDetails": [
+            {"id": "default", "clientId": "A", "clientName": "Client A", "payType": "hourly"},
+        ],
+    }
+    check.update(fields)
+    return check
+
+
+def test_default_relationship_reads_check_level_pay():
+    assert pay_cents_by_client(react_check()) == {
+        "A": {"hourly": 80000, "overtime": 6000, "holiday": 4000, "perdiem": 0},
+    }
+    assert hours_by_client(react_check()) == {
+        "A": {"hours": 40.0, "overtimeHours": 2.0, "holidayHours": 1.0},
+    }
+
+
+def test_default_relationship_reads_check_level_perdiem():
+    check = react_check(
+        clientId="B", payType="perdiem", hours=0, otHours=0, holidayHours=0,
+        perdiemBreakdown=True, perdiemMonday="50", perdiemFriday=25,
+        relationshipDetails=[{"id": "default", "clientId": "B", "clientName": "Client B", "payType": "perdiem"}],
+    )
+    assert pay_cents_by_client(check) == {"B": {"hourly": 0, "overtime": 0, "holiday": 0, "perdiem": 7500}}
+
+
+def test_relationship_values_win_over_check_level():
+    check = react_check(
+        default_hours=10,
+        relationshipDetails=[{"id": "default", "clientId": "A", "payType": "hourly", "payRate": 30}],
+    )
+    assert pay_cents_by_client(check)["A"]["hourly"] == 30000
+    assert hours_by_client(check)["A"]["hours"] == 10.0
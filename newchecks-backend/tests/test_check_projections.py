@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("click")
+
+import check_projections  # noqa: E402
+from check_projections import PROJECTION_FIELD, STAMPS, Deltas, Projection, project_check, with_stored_stamps  # noqa: E402
+
+
+class Ref:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+
+class Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Collection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id):
+        return Ref(self.name, doc_id)
+
+
+class FakeDb:
+    # Just enough of the client for with_stored_stamps: references and get_all
+    def __init__(self, documents):
+        self.documents = documents
+        self.reads = 0
+
+    def collection(self, name):
+        return Collection(name)
+
+    def get_all(self, refs):
+        self.reads += 1
+        return [Snapshot(ref.id, self.documents.get((ref.collection, ref.id))) for ref in refs]
+
+
+@pytest.fixture
+def amounts(monkeypatch):
+    # One projection counting the amount of each check
+    def contribution(check):
+        return {"cents": int(check["amount"] * 100)}
+
+    def apply(deltas, contribution, sign):
+        deltas.increment("totals", "all", ("cents",), sign * contribution["cents"])
+
+    monkeypatch.setattr(check_projections, "_projections", {"amounts": Projection("amounts", contribution, apply)})
+
+
+def test_dropped_stamp_is_restored_before_reprojecting(amounts):
+    stamp = {"amounts": {"cents": 1000}}
+    db = FakeDb({(STAMPS, "c1"): {PROJECTION_FIELD: stamp}})
+    # A React setDoc rewrote the check and dropped its stamp
+    checks = with_stored_stamps(db, db, {"c1": {"amount": 10}, "c2": {"amount": 5, PROJECTION_FIELD: {}}})
+    assert db.reads == 1
+    assert checks["c1"][PROJECTION_FIELD] == stamp
+
+    deltas = Deltas()
+    project_check(deltas, checks["c1"], dict(checks["c1"], amount=12))
+    assert deltas._increments == {("totals", "all"): {("cents",): 200}}
+
+
+def test_checks_with_stamps_are_not_read(amounts):
+    db = FakeDb({})
+    with_stored_stamps(db, db, {"c1": {"amount": 1, PROJECTION_FIELD: {}}})
+    assert db.reads == 0
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("flask")
+
+from duplicates import duplicate_key  # noqa: E402
+
+
+def react_check(client_id, pay_type):
+    return {
+        "companyId": "c1",
+        "employeeId": "e1",
+        "weekKey": "2025-03-03",
+        "clientId": client_id,
+        "relationshipDetails": [{"id": "default", "clientId": client_id, "payType": pay_type}],
+    }
+
+
+def test_default_relationships_key_by_client():
+    hourly = duplicate_key(react_check("A", "hourly"))
+    perdiem = duplicate_key(react_check("B", "perdiem"))
+    assert hourly[0] != perdiem[0]
+    assert hourly[1]["relationships"] == ["client:A"]
+
+
+def test_same_client_still_collides():
+    assert duplicate_key(react_check("A", "hourly"))[0] == duplicate_key(react_check("A", "hourly"))[0]
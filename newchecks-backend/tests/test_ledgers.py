@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("flask")
+
+from ledgers import ledger_contribution  # noqa: E402
+
+
+def test_default_relationship_ledger_matches_check_amount():
+    check = {
+        "employeeId": "e1",
+        "companyId": "c1",
+        "date": datetime(2025, 3, 7, 15, tzinfo=timezone.utc),
+        "amount": "850.00",
+        "clientId": "A",
+        "payRate": "20",
+        "hours": 40,
+        "otHours": 1,
+        "relationshipDetails": [
+            {"id": "default", "clientId": "A", "clientName": "Client A", "payType": "hourly"},
+        ],
+    }
+    contribution = ledger_contribution(check)
+    assert contribution["hours"] == 40.0
+    assert contribution["overtimeHours"] == 1.0
+    assert contribution["hourlyCents"] + contribution["overtimeCents"] == 83000
+    assert contribution["clients"]["A"]["hourly"] == 80000
+    assert contribution["clients"]["A"]["grossCents"] == 85000
@@ -0,0 +1,183 @@
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from check_fields import as_datetime, as_utc
+from check_projections import register_check_field
+from firestore_accounting import stream_concurrently
+from log import get_logger
+
+log = get_logger("weeks")
+
+# --- Week keys
+# A week is identified by the ISO date of its Sunday, the same key the React
+# app derives with `d.setDate(d.getDate() - d.getDay())`.
+
+
+def week_start(day):
+    return day - timedelta(days=(day.weekday() + 1) % 7)
+
+
+def week_key_for(raw_date):
+    dt = as_utc(as_datetime(raw_date))
+    if dt is None:
+        return None
+    return week_start(dt.date()).isoformat()
+
+
+# --- Canonical weekKey on checks
+# Every check carries weekKey: the ISO date of the first day of its week
+# under its company's rule,
+#   companies/{id}.weekStartDay   "Sunday" .. "Saturday"   (default Sunday)
+#   companies/{id}.timeZone       IANA name, e.g. "America/Chicago" (default UTC)
+# so a week's checks can be found by companyId + weekKey regardless of the
+# time of day they were dated. The default rule gives the same keys as
+# week_key_for.
+#
+# The backend sets weekKey on every check it writes; the checks listener
+# (CHECK_LISTENER=1) fills it in for checks the React app writes, and
+# `flask --app app backfill-week-keys` sets it on older checks and after a
+# company changes its rule. Until every writer sets it, week_checks also
+# runs the date-range query over the rule's bounds. Rules are cached for
+# WEEK_RULE_TTL seconds.
+WEEK_KEY_FIELD = "weekKey"
+WEEK_DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+DEFAULT_WEEK_START = "Sunday"
+DEFAULT_TIME_ZONE = "UTC"
+RULE_FIELDS = ["weekStartDay", "timeZone"]
+WEEK_RULE_TTL = 300
+
+
+class WeekRule:
+    __slots__ = ("start_weekday", "tz")
+
+    def __init__(self, start_weekday=WEEK_DAYS.index(DEFAULT_WEEK_START), tz=timezone.utc):
+        self.start_weekday = start_weekday
+        self.tz = tz
+
+    def first_day(self, day):
+        return day - timedelta(days=(day.weekday() - self.start_weekday) % 7)
+
+    def key(self, raw_date):
+        dt = as_datetime(raw_date)
+        if dt is None:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return self.first_day(dt.astimezone(self.tz).date()).isoformat()
+
+    def normalize(self, week_key):
+        # Any YYYY-MM-DD in the week -> that week's key; raises ValueError
+        return self.first_day(date.fromisoformat(week_key)).isoformat()
+
+    def bounds(self, week_key):
+        # (start, end) of a week as aware UTC datetimes, end exclusive
+        day = date.fromisoformat(week_key)
+        start = datetime(day.year, day.month, day.day, tzinfo=self.tz)
+        end_day = day + timedelta(days=7)
+        end = datetime(end_day.year, end_day.month, end_day.day, tzinfo=self.tz)
+        return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+DEFAULT_RULE = WeekRule()
+
+
+def week_rule(company):
+    # The WeekRule of a company document (dict); bad settings fall back to the defaults
+    company = company or {}
+    start = company.get("weekStartDay") or DEFAULT_WEEK_START
+    start_weekday = DEFAULT_RULE.start_weekday
+    if start in WEEK_DAYS:
+        start_weekday = WEEK_DAYS.index(start)
+    else:
+        log.warning("Unknown weekStartDay %r, using %s", start, DEFAULT_WEEK_START)
+    tz = DEFAULT_RULE.tz
+    name = company.get("timeZone")
+    if name and name != DEFAULT_TIME_ZONE:
+        from zoneinfo import ZoneInfo
+
+        try:
+            tz = ZoneInfo(name)
+        except (KeyError, ValueError):
+            log.warning("Unknown timeZone %r, using %s", name, DEFAULT_TIME_ZONE)
+    return WeekRule(start_weekday, tz)
+
+
+_rules = {}
+_rules_lock = threading.Lock()
+
+
+def load_week_rules(firestore_db, company_ids):
+    # {companyId: WeekRule}, reading only the companies not cached
+    now = time.monotonic()
+    wanted = [c for c in dict.fromkeys(company_ids) if c]
+    with _rules_lock:
+        rules = {c: _rules[c][1] for c in wanted if c in _rules and _rules[c][0] > now}
+    missing = [c for c in wanted if c not in rules]
+    if missing:
+        refs = [firestore_db.collection("companies").document(c) for c in missing]
+        found = {snap.id: snap.to_dict() for snap in firestore_db.get_all(refs, field_paths=RULE_FIELDS) if snap.exists}
+        with _rules_lock:
+            for company_id in missing:
+                rules[company_id] = week_rule(found.get(company_id))
+                _rules[company_id] = (now + WEEK_RULE_TTL, rules[company_id])
+    return rules
+
+
+def week_rule_for(firestore_db, company_id):
+    return load_week_rules(firestore_db, [company_id]).get(company_id, DEFAULT_RULE)
+
+
+def stamp_week_keys(firestore_db, checks):
+    # Sets weekKey on check dicts about to be written
+    rules = load_week_rules(firestore_db, [c.get("companyId") for c in checks])
+    for check in checks:
+        check[WEEK_KEY_FIELD] = rules.get(check.get("companyId"), DEFAULT_RULE).key(check.get("date"))
+    return checks
+
+
+def week_key_of(firestore_db, check):
+    return week_rule_for(firestore_db, check.get("companyId")).key(check.get("date"))
+
+
+def check_week_key(check):
+    # The week the projections count a check in. They can't read the
+    # company, so they take the stored weekKey, which the backend and the
+    # listener set from the company rule; checks not keyed yet fall back
+    # to the default rule until the listener or backfill reaches them.
+    return check.get(WEEK_KEY_FIELD) or DEFAULT_RULE.key(check.get("date"))
+
+
+register_check_field(WEEK_KEY_FIELD, week_key_of)
+
+
+def week_checks(firestore_db, company_id, week_key, reviewed_only=False, limit=None):
+    # The company's check snapshots for one week; week_key may be any day of
+    # the week. Raises ValueError for a malformed key.
+    #
+    # Checks written by the React app have no weekKey until the listener or
+    # the backfill sets it, so the companyId + weekKey query runs alongside
+    # the date range of the week and the two are merged by id. A check
+    # belongs to the week its date falls in under the rule; only undated
+    # checks are taken on their stored weekKey.
+    rule = week_rule_for(firestore_db, company_id)
+    key = rule.normalize(week_key)
+    start, end = rule.bounds(key)
+    checks = firestore_db.collection("checks").where("companyId", "==", company_id)
+    if reviewed_only:
+        checks = checks.where("reviewed", "==", True)
+    queries = [
+        checks.where(WEEK_KEY_FIELD, "==", key),
+        checks.where("date", ">=", start).where("date", "<", end),
+    ]
+    if limit:
+        queries = [q.limit(limit) for q in queries]
+
+    found = {}
+    for snapshots in stream_concurrently(queries, len(queries)):
+        for snap in snapshots:
+            data = snap.to_dict() or {}
+            if (rule.key(data.get("date")) or data.get(WEEK_KEY_FIELD)) == key:
+                found.setdefault(snap.id, snap)
+    checks = list(found.values())
+    return checks[:limit] if limit else checks